@@ -0,0 +1,5 @@
+"""
+Benchmarks of the scheduler's CPU-bound stages over synthetic calendar feeds.
+
+    cd app && python -m benchmarks --properties 200
+"""
@@ -0,0 +1,249 @@
+"""
+Stage benchmarks over a synthetic portfolio.
+
+Generates Airbnb/Booking.com-style feeds for --properties properties and
+times each stage of the pipeline separately (parsing, merging, changeover
+detection, diffing, CSV/ICS serialisation and the message builders),
+reporting throughput and the peak memory of a single call.
+
+Results are compared with the stored baseline for the same scenario; the
+exit status is 1 if a stage got slower or hungrier than --tolerance allows,
+so it can gate CI. Throughput is compared relative to a fixed calibration
+workload timed alongside the stages, so a baseline recorded on one machine
+still holds on a faster or slower one.
+
+    cd app
+    python -m benchmarks
+    python -m benchmarks --properties 10000 --density 0.9 --years 5 --backends fast
+    python -m benchmarks --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import tracemalloc
+from datetime import date
+from time import perf_counter
+
+from benchmarks.feeds import synthetic_portfolio
+from benchmarks.stages import StageRecorder, run_property, stage_unit
+from config.utils import load_config
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Differences in peak memory below this are noise, whatever the tolerance
+MIN_MEMORY_DELTA_KIB = 64
+
+
+def scenario_key(args) -> str:
+    return f"{args.properties}p-d{args.density}-y{args.years}-s{args.seed}"
+
+
+def run_pass(args, record: StageRecorder, count: int, merge_cfg: dict):
+    """
+    Runs every stage over the first 'count' properties of the portfolio.
+    """
+    with tempfile.TemporaryDirectory() as out_dir:
+        for prop in synthetic_portfolio(count, args.density, args.years, args.seed, args.today):
+            run_property(prop, record, out_dir, args.backends, merge_cfg)
+
+
+def calibrate(loops: int = 20000) -> float:
+    """
+    Speed of this machine and interpreter on a fixed pure-Python workload
+    (string splitting, dict and list work, like the stages), in loops/s.
+    """
+    started = perf_counter()
+    seen = {}
+    for i in range(loops):
+        line = f"DTSTART;VALUE=DATE:2025{i % 12 + 1:02d}{i % 28 + 1:02d}"
+        name, _, value = line.partition(":")
+        seen[value] = seen.get(value, 0) + len(name.split(";"))
+        if i % 64 == 0:
+            sorted(seen.items())
+    return loops / (perf_counter() - started)
+
+
+def run_benchmarks(args) -> tuple:
+    """
+    Returns ({ stage: { unit, calls, items, seconds, per_second, relative,
+    peak_kib } }, calibration loops/s). Seconds are the fastest of --repeat
+    timing passes, 'relative' is per_second per calibration loop/s (the
+    fastest calibration, timed before each pass); peak memory comes from
+    one extra pass over --memory-sample properties under tracemalloc.
+    """
+    merge_cfg = load_config().get("merge", {})
+
+    timings = []
+    calibration = 0.0
+    for i in range(max(1, args.repeat)):
+        calibration = max(calibration, calibrate())
+        record = StageRecorder()
+        run_pass(args, record, args.properties, merge_cfg)
+        timings.append(record.stats)
+        print(f"  → Timing pass {i + 1}/{args.repeat} done")
+
+    memory = {}
+    if args.memory_sample:
+        tracemalloc.start()
+        try:
+            record = StageRecorder(trace_memory=True)
+            run_pass(args, record, min(args.memory_sample, args.properties), merge_cfg)
+            memory = record.stats
+        finally:
+            tracemalloc.stop()
+        print("  → Memory pass done")
+
+    results = {}
+    for stage, stats in timings[0].items():
+        seconds = min(t[stage]["seconds"] for t in timings)
+        per_second = stats["items"] / seconds if seconds else None
+        results[stage] = {
+            "unit": stage_unit(stage),
+            "calls": stats["calls"],
+            "items": stats["items"],
+            "seconds": round(seconds, 6),
+            "per_second": round(per_second, 1) if per_second else None,
+            "relative": round(per_second / calibration, 6) if per_second else None,
+            "peak_kib": round(memory[stage]["peak_bytes"] / 1024, 1) if stage in memory else None,
+        }
+    return results, calibration
+
+
+def print_report(results: dict):
+    print(f"\n{'stage':<42} {'calls':>7} {'items':>9} {'total s':>9} {'items/s':>12} {'peak KiB':>9}")
+    for stage, r in results.items():
+        per_second = f"{r['per_second']:,.0f}" if r["per_second"] else "-"
+        peak = f"{r['peak_kib']:,.1f}" if r["peak_kib"] is not None else "-"
+        print(f"{stage:<42} {r['calls']:>7} {r['items']:>9} {r['seconds']:>9.3f} "
+              f"{per_second:>12} {peak:>9}  ({r['unit']})")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns the regressions against a baseline scenario: stages whose
+    throughput relative to the calibration workload fell, or whose peak
+    memory grew, by more than 'tolerance'.
+    """
+    regressions = []
+    for stage, r in results.items():
+        base = baseline.get(stage)
+        if not base:
+            continue
+
+        if r["relative"] and base.get("relative"):
+            ratio = r["relative"] / base["relative"]
+            if ratio < 1 - tolerance:
+                regressions.append(f"{stage}: {r['per_second']:,.0f} {r['unit']}/s, "
+                                   f"{(1 - ratio) * 100:.0f}% slower than the baseline "
+                                   f"relative to this machine's calibration")
+
+        if r["peak_kib"] is not None and base.get("peak_kib") is not None:
+            grown = r["peak_kib"] - base["peak_kib"]
+            if grown > MIN_MEMORY_DELTA_KIB and r["peak_kib"] > base["peak_kib"] * (1 + tolerance):
+                regressions.append(f"{stage}: peak {r['peak_kib']:,.1f} KiB, "
+                                   f"up from {base['peak_kib']:,.1f} KiB")
+    return regressions
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, key: str, results: dict, calibration: float):
+    baselines = load_baselines(path)
+    baselines[key] = {
+        "recorded": date.today().isoformat(),
+        "python": platform.python_version(),
+        # Absolute figures are for reference only; 'relative' is compared
+        "calibration_per_second": round(calibration, 1),
+        "stages": {
+            stage: {"per_second": r["per_second"], "relative": r["relative"], "peak_kib": r["peak_kib"]}
+            for stage, r in results.items()
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler's stages on synthetic feeds")
+    parser.add_argument("--properties", type=int, default=50,
+                        help="number of synthetic properties (10 to 10,000)")
+    parser.add_argument("--density", type=float, default=0.7,
+                        help="share of nights booked, 0..1")
+    parser.add_argument("--years", type=float, default=2,
+                        help="years of booking history in each feed")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="seed of the synthetic portfolio")
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="date the feeds are generated around (YYYY-MM-DD, default today)")
+    parser.add_argument("--backends", type=lambda s: tuple(s.split(",")), default=("fast", "icalendar"),
+                        help="parse_ical backends to time, comma-separated; "
+                             "the first one's bookings feed the later stages")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timing passes; the fastest is kept")
+    parser.add_argument("--memory-sample", type=int, default=20,
+                        help="properties traced for peak memory (0 to skip)")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown / memory growth before failing (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the scenario's baseline instead of comparing")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    key = scenario_key(args)
+
+    print(f"Benchmarking {key} (parse backends: {', '.join(args.backends)})")
+    started = perf_counter()
+    results, calibration = run_benchmarks(args)
+    print_report(results)
+
+    # ru_maxrss is in KiB on Linux
+    max_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nWall time {perf_counter() - started:.1f}s, max RSS {max_rss_mib:.0f} MiB, "
+          f"calibration {calibration:,.0f} loops/s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"scenario": key, "calibration_per_second": calibration, "stages": results}, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, key, results, calibration)
+        print(f"✅ Saved baseline for {key} to {args.baseline}")
+        return 0
+
+    baseline = load_baselines(args.baseline).get(key)
+    if baseline is None:
+        print(f"⚠️ No baseline for {key} in {args.baseline}; run with --save-baseline to record one")
+        return 0
+    if "calibration_per_second" not in baseline:
+        print(f"⚠️ The {key} baseline has no relative throughput, so only peak memory is compared; "
+              f"re-record it with --save-baseline")
+
+    regressions = compare(results, baseline["stages"], args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against the {baseline['recorded']} baseline:")
+        for regression in regressions:
+            print(f"  → {regression}")
+        return 1
+
+    print(f"\n✅ No stage regressed more than {args.tolerance:.0%} against the {baseline['recorded']} baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
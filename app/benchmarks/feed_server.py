@@ -0,0 +1,171 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.feeds import add_reservation, synthetic_portfolio
+
+
+class FeedServer:
+    """
+    Local HTTP server standing in for the Airbnb / Booking.com iCal exports.
+
+    Serves a synthetic portfolio from files under 'feed_dir' with ETag and
+    Last-Modified validators, so an unchanged feed answers 304 to the
+    scheduler's conditional GETs. Every request is delayed by a random
+    latency in 'latency_ms' (min, max), and a 'failure_rate' share of
+    requests fail with 503.
+
+    Counts requests by status and the body bytes sent.
+    """
+
+    def __init__(self, feed_dir: str, latency_ms=(0, 0), failure_rate: float = 0.0, seed: int = 1):
+        self.feed_dir = feed_dir
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._feeds = {}  # url path -> (etag, last modified)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "not_modified": 0, "failed": 0, "bytes_sent": 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "FeedServer":
+        feeds = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the real feed hosts allow
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                feeds._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="feed-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def counters_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _count(self, key: str, sent: int = 0):
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters[key] += 1
+            self.counters["bytes_sent"] += sent
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        with self._lock:
+            delay = self._rng.uniform(*self.latency_ms) / 1000
+            fail = self._rng.random() < self.failure_rate
+            validators = self._feeds.get(request.path.split("?")[0])
+
+        if delay:
+            time.sleep(delay)
+
+        if fail or validators is None:
+            self._count("failed")
+            request.send_response(503 if fail else 404)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        etag, last_modified = validators
+        if request.headers.get("If-None-Match") == etag:
+            self._count("not_modified")
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        with open(self._file(request.path.split("?")[0]), "rb") as f:
+            body = f.read()
+
+        self._count("ok", len(body))
+        request.send_response(200)
+        request.send_header("Content-Type", "text/calendar; charset=utf-8")
+        request.send_header("ETag", etag)
+        request.send_header("Last-Modified", last_modified)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _file(self, path: str) -> str:
+        return os.path.join(self.feed_dir, path.lstrip("/"))
+
+    def _write(self, path: str, text: str):
+        file_path = self._file(path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        data = text.encode("utf-8")
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self._feeds[path] = (etag, formatdate(usegmt=True))
+
+    def publish_portfolio(self, count: int, density: float = 0.7, years: float = 2,
+                          seed: int = 1, today: date = None) -> list:
+        """
+        Writes a synthetic portfolio's feeds and returns its config.yaml
+        'properties' entries, with calendar URLs pointing at this server.
+        """
+        properties = []
+        for index, prop in enumerate(synthetic_portfolio(count, density, years, seed, today)):
+            urls = []
+            for n, text in enumerate(prop["calendar_texts"]):
+                path = f"/feeds/{index}/{n}.ics"
+                self._write(path, text)
+                urls.append(f"{self.base_url}{path}")
+
+            properties.append({
+                "id": index + 1,
+                "name": prop["name"],
+                "property_management_company": f"Load Test {index % 10}",
+                "calendars": urls,
+                "cleaners": prop["cleaners"],
+            })
+        return properties
+
+    def change_feeds(self, properties: list, rate: float, today: date) -> int:
+        """
+        Simulates bookings arriving between two ticks: a 'rate' share of the
+        properties gets a new one-night stay within the next week in its
+        first feed. The other feeds keep answering 304.
+        Returns the number of feeds changed.
+        """
+        changed = 0
+        for prop in properties:
+            if self._rng.random() >= rate:
+                continue
+
+            path = prop["calendars"][0][len(self.base_url):]
+            with open(self._file(path), "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+
+            start = today + timedelta(days=self._rng.randint(1, 6))
+            uid = f"{self._rng.getrandbits(64):016x}@load-test"
+            self._write(path, add_reservation(text, start, start + timedelta(days=1), uid))
+            changed += 1
+        return changed
@@ -0,0 +1,192 @@
+import random
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+# Average stay length in nights; gaps are sized from it to hit the booking density
+MEAN_STAY_NIGHTS = 3.5
+MAX_STAY_NIGHTS = 14
+
+# Days of future bookings on top of the history
+DAYS_AHEAD = 180
+
+CLEANERS = ["Alex", "Bea", "Chris", "Dana", "Eli"]
+
+
+def synthetic_stays(rng: random.Random, first: date, last: date,
+                    density: float) -> List[Tuple[date, date]]:
+    """
+    Returns sorted, non-overlapping (check-in, check-out) pairs between
+    first and last, booking roughly 'density' (0..1) of the nights.
+    Back-to-back stays (same-day changeovers) come up naturally.
+    """
+    density = min(max(density, 0.01), 0.99)
+    mean_gap = MEAN_STAY_NIGHTS * (1 - density) / density
+
+    stays = []
+    day = first
+    while day < last:
+        day += timedelta(days=int(rng.expovariate(1 / mean_gap)) if mean_gap else 0)
+        nights = min(MAX_STAY_NIGHTS, 1 + int(rng.expovariate(1 / (MEAN_STAY_NIGHTS - 1))))
+        if day + timedelta(days=nights) > last:
+            break
+        stays.append((day, day + timedelta(days=nights)))
+        day += timedelta(days=nights)
+    return stays
+
+
+def _fold(line: str) -> List[str]:
+    """
+    Folds a content line at 75 characters, as Airbnb does (RFC 5545).
+    """
+    parts = [line[:75]]
+    for i in range(75, len(line), 74):
+        parts.append(" " + line[i:i + 74])
+    return parts
+
+
+def _code(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789") for _ in range(length))
+
+
+def airbnb_feed(rng: random.Random, reserved: list, blocked: list, stamp: str) -> str:
+    """
+    Airbnb-style export: CRLF line endings, a DTSTAMP on every event,
+    "Reserved" stays with a folded, escaped DESCRIPTION, and
+    "Airbnb (Not available)" blocks for nights sold on other channels.
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "PRODID:-//Airbnb Inc//Hosting Calendar 1.0//EN",
+        "CALSCALE:GREGORIAN",
+        "VERSION:2.0",
+    ]
+    events = [(stay, True) for stay in reserved] + [(stay, False) for stay in blocked]
+    events.sort(key=lambda e: e[0][0])
+
+    for (start, end), is_reserved in events:
+        lines += [
+            "BEGIN:VEVENT",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{end:%Y%m%d}",
+            f"SUMMARY:{'Reserved' if is_reserved else 'Airbnb (Not available)'}",
+            f"UID:{rng.getrandbits(48):012x}-{rng.getrandbits(128):032x}@airbnb.com",
+        ]
+        if is_reserved:
+            lines += _fold(
+                "DESCRIPTION:Reservation URL: https://www.airbnb.com/hosting/reservations/"
+                f"details/HM{_code(rng, 8)}\\nPhone Number (Last 4 Digits): {rng.randint(0, 9999):04d}"
+            )
+        lines.append("END:VEVENT")
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def booking_feed(rng: random.Random, reserved: list, closed: list) -> str:
+    """
+    Booking.com-style export: LF line endings, a VTIMEZONE block, events in
+    no particular order, "CLOSED - Not available" for every booked or
+    blocked night, and some stays given as TZID date-times instead of dates.
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//admin.booking.com//EN",
+        "METHOD:PUBLISH",
+        "BEGIN:VTIMEZONE",
+        "TZID:Europe/London",
+        "BEGIN:STANDARD",
+        "DTSTART:19701025T020000",
+        "TZOFFSETFROM:+0100",
+        "TZOFFSETTO:+0000",
+        "END:STANDARD",
+        "END:VTIMEZONE",
+    ]
+    events = list(reserved) + list(closed)
+    rng.shuffle(events)
+
+    for start, end in events:
+        lines.append("BEGIN:VEVENT")
+        if rng.random() < 0.2:
+            lines += [
+                f'DTSTART;TZID="Europe/London":{start:%Y%m%d}T150000',
+                f'DTEND;TZID="Europe/London":{end:%Y%m%d}T110000',
+            ]
+        else:
+            lines += [
+                f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+                f"DTEND;VALUE=DATE:{end:%Y%m%d}",
+            ]
+        lines += [
+            f"UID:{rng.getrandbits(160):040x}@booking.com",
+            "SUMMARY:CLOSED - Not available",
+            "END:VEVENT",
+        ]
+
+    lines.append("END:VCALENDAR")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_property(index: int, density: float = 0.7, years: float = 2,
+                       seed: int = 1, today: date = None) -> dict:
+    """
+    Builds one synthetic property: { name, cleaners, calendar_texts }.
+
+    Stays run from 'years' ago to DAYS_AHEAD days from today and are split
+    between Airbnb and Booking.com, each channel blocking the other's nights
+    as a channel manager would. Every fourth property is Airbnb-only.
+    The same (index, seed) always gives the same property.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    today = today or date.today()
+    first = today - timedelta(days=int(years * 365))
+    stays = synthetic_stays(rng, first, today + timedelta(days=DAYS_AHEAD), density)
+
+    stamp = f"{today:%Y%m%d}T{rng.randint(0, 235959):06d}Z"
+    name = f"Property {index:05d}"
+    cleaners = [CLEANERS[index % len(CLEANERS)]]
+
+    if index % 4 == 3:
+        return {"name": name, "cleaners": cleaners, "calendar_texts": [airbnb_feed(rng, stays, [], stamp)]}
+
+    airbnb, booking = [], []
+    for stay in stays:
+        (airbnb if rng.random() < 0.6 else booking).append(stay)
+
+    return {
+        "name": name,
+        "cleaners": cleaners,
+        "calendar_texts": [
+            airbnb_feed(rng, airbnb, booking, stamp),
+            booking_feed(rng, booking, airbnb),
+        ],
+    }
+
+
+def synthetic_portfolio(count: int, density: float = 0.7, years: float = 2,
+                        seed: int = 1, today: date = None) -> Iterator[dict]:
+    """
+    Yields 'count' synthetic properties, generated one at a time so large
+    portfolios (10,000 properties) never sit in memory at once.
+    """
+    for index in range(count):
+        yield synthetic_property(index, density, years, seed, today)
+
+
+def add_reservation(ical_text: str, start: date, end: date, uid: str) -> str:
+    """
+    Returns the feed with one more all-day "Reserved" event, e.g. to
+    simulate a new booking arriving between two polls.
+    """
+    newline = "\r\n" if "\r\n" in ical_text else "\n"
+    event = newline.join([
+        "BEGIN:VEVENT",
+        f"DTSTART;VALUE=DATE:{start:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{end:%Y%m%d}",
+        "SUMMARY:Reserved",
+        f"UID:{uid}",
+        "END:VEVENT",
+    ])
+    head, _, _ = ical_text.rpartition("END:VCALENDAR")
+    return f"{head}{event}{newline}END:VCALENDAR{newline}"
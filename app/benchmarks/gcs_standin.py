@@ -0,0 +1,162 @@
+import base64
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+
+class LocalStorageClient:
+    """
+    Stand-in for google.cloud.storage.Client covering what the scheduler
+    uses: bucket().blob() uploads/downloads with generation preconditions,
+    get_blob() with md5_hash, list_blobs() and delete().
+
+    Objects are kept in memory, or as files under 'root' if given (for
+    portfolios too big to hold in memory). Counts every transfer so a load
+    test can report requests and bytes. Install it with
+    utils.gcs.set_client(LocalStorageClient()).
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root
+        self._objects = {}  # (bucket, name) -> {generation, md5, updated, data}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.counters = {"uploads": 0, "bytes_uploaded": 0, "downloads": 0,
+                         "bytes_downloaded": 0, "conflicts": 0}
+
+    def bucket(self, name: str) -> "LocalBucket":
+        return LocalBucket(self, name)
+
+    def list_blobs(self, bucket, prefix: str = None) -> list:
+        bucket_name = getattr(bucket, "name", bucket)
+        with self._lock:
+            names = sorted(
+                name for b, name in self._objects
+                if b == bucket_name and name.startswith(prefix or "")
+            )
+        return [self.bucket(bucket_name).get_blob(name) for name in names]
+
+    def counters_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _path(self, bucket: str, name: str) -> str:
+        return os.path.join(self.root, bucket, name)
+
+    def _put(self, bucket: str, name: str, data: bytes, if_generation_match=None) -> dict:
+        from google.api_core.exceptions import PreconditionFailed
+
+        with self._lock:
+            current = self._objects.get((bucket, name))
+            if if_generation_match is not None and (current["generation"] if current else 0) != if_generation_match:
+                self.counters["conflicts"] += 1
+                raise PreconditionFailed(f"{bucket}/{name}: generation does not match")
+
+            self._generation += 1
+            meta = {
+                "generation": self._generation,
+                "md5": base64.b64encode(hashlib.md5(data).digest()).decode(),
+                "updated": datetime.now(timezone.utc),
+                "data": None if self.root else data,
+            }
+            if self.root:
+                path = self._path(bucket, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+
+            self._objects[(bucket, name)] = meta
+            self.counters["uploads"] += 1
+            self.counters["bytes_uploaded"] += len(data)
+            return meta
+
+    def _get(self, bucket: str, name: str):
+        """
+        Returns (data, metadata) of an object. Raises NotFound.
+        """
+        from google.api_core.exceptions import NotFound
+
+        with self._lock:
+            meta = self._objects.get((bucket, name))
+            if meta is None:
+                raise NotFound(f"{bucket}/{name}")
+
+            data = meta["data"]
+            if data is None:
+                with open(self._path(bucket, name), "rb") as f:
+                    data = f.read()
+
+            self.counters["downloads"] += 1
+            self.counters["bytes_downloaded"] += len(data)
+            return data, meta
+
+    def _delete(self, bucket: str, name: str):
+        from google.api_core.exceptions import NotFound
+
+        with self._lock:
+            if self._objects.pop((bucket, name), None) is None:
+                raise NotFound(f"{bucket}/{name}")
+            if self.root:
+                os.remove(self._path(bucket, name))
+
+
+class LocalBucket:
+    def __init__(self, client: LocalStorageClient, name: str):
+        self.client = client
+        self.name = name
+
+    def blob(self, name: str) -> "LocalBlob":
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str):
+        """
+        Returns the blob with its metadata loaded, or None if it does not exist.
+        """
+        with self.client._lock:
+            meta = self.client._objects.get((self.name, name))
+        if meta is None:
+            return None
+
+        blob = LocalBlob(self, name)
+        blob._set_meta(meta)
+        return blob
+
+
+class LocalBlob:
+    def __init__(self, bucket: LocalBucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+        self.md5_hash = None
+        self.updated = None
+
+    def _set_meta(self, meta: dict):
+        self.generation = meta["generation"]
+        self.md5_hash = meta["md5"]
+        self.updated = meta["updated"]
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match: int = None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._set_meta(self.bucket.client._put(self.bucket.name, self.name, data, if_generation_match))
+
+    def upload_from_filename(self, filename: str, content_type: str = None, if_generation_match: int = None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type, if_generation_match)
+
+    def download_as_bytes(self) -> bytes:
+        data, meta = self.bucket.client._get(self.bucket.name, self.name)
+        self._set_meta(meta)
+        return data
+
+    def download_as_text(self) -> str:
+        return self.download_as_bytes().decode("utf-8")
+
+    def download_to_filename(self, filename: str):
+        data = self.download_as_bytes()
+        with open(filename, "wb") as f:
+            f.write(data)
+
+    def delete(self):
+        self.bucket.client._delete(self.bucket.name, self.name)
@@ -0,0 +1,258 @@
+"""
+End-to-end load test of run.main.
+
+Runs full ticks over a synthetic portfolio with every external service
+replaced by a local stand-in:
+- calendar feeds: benchmarks.feed_server (ETag/304s, injectable latency and failures)
+- GCS: benchmarks.gcs_standin (in memory, or files with --gcs-dir)
+- Gmail SMTP: benchmarks.smtp_sink
+
+Between ticks a --change-rate share of properties gets a new booking;
+all other feeds answer 304. Ticks are spaced --interval-minutes apart in
+simulated time, so the poll planner behaves as in production. Reports
+per-tick wall time, feed requests, bytes fetched and uploaded, and emails.
+
+    cd app
+    python -m benchmarks.load_harness --properties 1000 --ticks 5
+    python -m benchmarks.load_harness --properties 10000 --latency-ms 50 300 --failure-rate 0.001
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from zoneinfo import ZoneInfo
+
+from benchmarks.feed_server import FeedServer
+from benchmarks.gcs_standin import LocalStorageClient
+from benchmarks.smtp_sink import SMTPSink
+from config.utils import load_config
+from utils.gcs import set_client
+
+UK = ZoneInfo("Europe/London")
+
+
+def harness_config(args, properties: list, smtp_port: int) -> dict:
+    """
+    config.yaml with the synthetic portfolio, the local SMTP sink and the
+    harness's choices of state backend, polling and processing mode.
+    Relative paths (cache, state, output files) end up in the work dir.
+    """
+    config = load_config()
+    config["properties"] = properties
+    config["email"] = {
+        **(config.get("email") or {}),
+        "recipients": ["cleaning@load-test.invalid"],
+        "smtp_host": "127.0.0.1",
+        "smtp_port": smtp_port,
+        "smtp_ssl": False,
+    }
+    config["state"] = {**(config.get("state") or {}), "backend": args.state_backend}
+    config["polling"] = {**(config.get("polling") or {}), "enabled": not args.no_polling}
+    config["processing"] = {**(config.get("processing") or {}), "mode": args.mode}
+    return config
+
+
+def fresh_container():
+    """
+    Drops local state as a new container would start without it: deletes
+    state/ and forgets the open state backend and outbox, so the next tick
+    restores both from the stand-in GCS.
+    """
+    from messaging import outbox
+    from schedule import state_manager
+
+    outbox.stop_delivery()
+    state_manager._backend_key = None
+    state_manager._cache = None
+    outbox._outbox = None
+    shutil.rmtree("state", ignore_errors=True)
+
+
+def _delta(after: dict, before: dict) -> dict:
+    return {key: after[key] - before.get(key, 0) for key in after}
+
+
+def run_load(args) -> list:
+    """
+    Runs --ticks ticks and returns one result dict per tick.
+    """
+    from run import main
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="load-harness-")
+    os.makedirs(work_dir, exist_ok=True)
+    previous_cwd = os.getcwd()
+
+    gcs = LocalStorageClient(root=args.gcs_dir)
+    feeds = FeedServer(os.path.join(work_dir, "feeds"), tuple(args.latency_ms),
+                       args.failure_rate, args.seed).start()
+    sink = SMTPSink().start()
+
+    # The sink accepts any login
+    os.environ["EMAIL_SENDER"] = "scheduler@load-test.invalid"
+    os.environ["EMAIL_APP_PASSWORD"] = "load-test"
+
+    started = args.start or datetime.now(timezone.utc)
+    results = []
+
+    try:
+        os.chdir(work_dir)
+        set_client(gcs)
+
+        print(f"Generating {args.properties} properties in {work_dir}...")
+        properties = feeds.publish_portfolio(args.properties, args.density, args.years,
+                                             args.seed, started.astimezone(UK).date())
+        config = harness_config(args, properties, sink.port)
+
+        for tick in range(args.ticks):
+            now_utc = started + timedelta(minutes=tick * args.interval_minutes)
+            changed = feeds.change_feeds(properties, args.change_rate, now_utc.astimezone(UK).date()) if tick else 0
+            if tick and args.fresh_state:
+                fresh_container()
+
+            before = (feeds.counters_snapshot(), gcs.counters_snapshot(), sink.counters_snapshot())
+            error = None
+            tick_started = perf_counter()
+            try:
+                with open(os.devnull, "w") as devnull, \
+                        contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                    main(config, now_utc=now_utc, weekly_summary=False, cache_state=args.cache_state,
+                         profile=args.profile)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if args.verbose:
+                    traceback.print_exc()
+            wall = perf_counter() - tick_started
+
+            feed, storage, smtp = (
+                _delta(after, b) for after, b in zip(
+                    (feeds.counters_snapshot(), gcs.counters_snapshot(), sink.counters_snapshot()), before
+                )
+            )
+            result = {
+                "tick": tick + 1,
+                "simulated_time": now_utc.isoformat(),
+                "wall_seconds": round(wall, 3),
+                "feeds_changed": changed,
+                "feed_requests": feed["requests"],
+                "feed_200": feed["ok"],
+                "feed_304": feed["not_modified"],
+                "feed_failed": feed["failed"],
+                "bytes_fetched": feed["bytes_sent"],
+                "gcs_uploads": storage["uploads"],
+                "bytes_uploaded": storage["bytes_uploaded"],
+                "gcs_downloads": storage["downloads"],
+                "gcs_conflicts": storage["conflicts"],
+                "emails_sent": smtp["emails"],
+                "error": error,
+            }
+            results.append(result)
+            print_tick(result)
+
+    finally:
+        os.chdir(previous_cwd)
+        set_client(None)
+        feeds.stop()
+        sink.stop()
+        if not args.work_dir and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def print_tick(r: dict):
+    if r["tick"] == 1:
+        print(f"\n{'tick':>4} {'wall s':>8} {'changed':>8} {'requests':>9} {'200':>6} {'304':>6} "
+              f"{'failed':>6} {'fetched KiB':>12} {'uploads':>8} {'uploaded KiB':>13} {'emails':>7}")
+    print(f"{r['tick']:>4} {r['wall_seconds']:>8.2f} {r['feeds_changed']:>8} {r['feed_requests']:>9} "
+          f"{r['feed_200']:>6} {r['feed_304']:>6} {r['feed_failed']:>6} {r['bytes_fetched'] / 1024:>12,.0f} "
+          f"{r['gcs_uploads']:>8} {r['bytes_uploaded'] / 1024:>13,.0f} {r['emails_sent']:>7}")
+    if r["error"]:
+        print(f"     ❌ Tick failed: {r['error']}")
+
+
+def print_summary(results: list, interval_minutes: float):
+    walls = sorted(r["wall_seconds"] for r in results)
+    budget = interval_minutes * 60
+    print(f"\nTicks: {len(results)}, wall time min {walls[0]:.2f}s / "
+          f"median {walls[len(walls) // 2]:.2f}s / max {walls[-1]:.2f}s")
+
+    failed = [r["tick"] for r in results if r["error"]]
+    if failed:
+        print(f"❌ {len(failed)} tick(s) failed: {', '.join(map(str, failed))}")
+    if walls[-1] > budget:
+        print(f"❌ Slowest tick took {walls[-1]:.0f}s, over the {budget:.0f}s tick interval: ticks would overlap")
+    elif not failed:
+        print(f"✅ Every tick finished within the {budget:.0f}s tick interval")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run full ticks against local stand-ins for feeds, GCS and SMTP")
+    parser.add_argument("--properties", type=int, default=200,
+                        help="number of synthetic properties")
+    parser.add_argument("--ticks", type=int, default=3,
+                        help="number of ticks to run")
+    parser.add_argument("--interval-minutes", type=float, default=10,
+                        help="simulated time between ticks")
+    parser.add_argument("--change-rate", type=float, default=0.05,
+                        help="share of properties getting a new booking before each tick after the first")
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(0, 0), metavar=("MIN", "MAX"),
+                        help="random latency added to every feed request")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="share of feed requests answered with 503")
+    parser.add_argument("--density", type=float, default=0.7,
+                        help="share of nights booked, 0..1")
+    parser.add_argument("--years", type=float, default=2,
+                        help="years of booking history in each feed")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="seed of the synthetic portfolio and of injected latency/failures")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="simulated time of the first tick (ISO, with offset; default now)")
+    parser.add_argument("--state-backend", choices=("sqlite", "gcs", "file"), default="sqlite",
+                        help="state backend to run with")
+    parser.add_argument("--mode", choices=("serial", "process"), default="serial",
+                        help="processing.mode to run with")
+    parser.add_argument("--no-polling", action="store_true",
+                        help="poll every feed every tick instead of using the poll planner")
+    parser.add_argument("--cache-state", action="store_true",
+                        help="keep state in memory between ticks, as the daemon does")
+    parser.add_argument("--fresh-state", action="store_true",
+                        help="delete local state (state/, open state backend and outbox) before every "
+                             "tick after the first, as a new container would start")
+    parser.add_argument("--gcs-dir",
+                        help="keep stand-in GCS objects as files here instead of in memory")
+    parser.add_argument("--work-dir",
+                        help="directory for feeds, cache, state and output files (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary work dir")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the per-tick results to this file")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every tick (reports under <work dir>/profiles)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show run.py's own output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.start and args.start.tzinfo is None:
+        args.start = args.start.replace(tzinfo=timezone.utc)
+
+    results = run_load(args)
+    print_summary(results, args.interval_minutes)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
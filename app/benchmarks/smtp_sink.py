@@ -0,0 +1,85 @@
+import socketserver
+import threading
+
+
+class SMTPSink:
+    """
+    Local SMTP server that accepts any login and every message, and only
+    counts them (messages, recipients, bytes). Point config.yaml's 'email'
+    section at it with smtp_ssl: false.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"connections": 0, "emails": 0, "recipients": 0, "bytes_received": 0}
+        self._server = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "SMTPSink":
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                sink._session(self.rfile, self.wfile)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def counters_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def _session(self, rfile, wfile):
+        def reply(*lines):
+            wfile.write("".join(f"{line}\r\n" for line in lines).encode("ascii"))
+            wfile.flush()
+
+        self._count(connections=1)
+        reply("220 smtp-sink ESMTP")
+        recipients = 0
+
+        for raw in rfile:
+            command = raw.decode("utf-8", "replace").strip().upper()
+
+            if command.startswith("EHLO"):
+                reply("250-smtp-sink", "250-AUTH PLAIN LOGIN", "250 8BITMIME")
+            elif command.startswith("AUTH"):
+                reply("235 2.7.0 Accepted")
+            elif command.startswith("MAIL"):
+                recipients = 0
+                reply("250 OK")
+            elif command.startswith("RCPT"):
+                recipients += 1
+                reply("250 OK")
+            elif command == "DATA":
+                reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for line in rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    size += len(line)
+                self._count(emails=1, recipients=recipients, bytes_received=size)
+                reply("250 OK")
+            elif command == "QUIT":
+                reply("221 Bye")
+                return
+            elif command.startswith(("HELO", "RSET", "NOOP")):
+                reply("250 OK")
+            else:
+                reply("502 Command not implemented")
@@ -0,0 +1,134 @@
+import os
+import random
+import tracemalloc
+from time import perf_counter
+
+from calendars.parse_ical import parse_ical
+from config.utils import merge_bookings
+from messaging.emailer import build_digest
+from messaging.message_builder import (
+    build_change_message, build_current_week_remaining_message, build_weekly_message,
+)
+from schedule.diff_events import diff_events
+from schedule.event_index import EventIndex
+from schedule.generate_ics import save_schedule_ics
+from schedule.generate_schedule import detect_changeovers, save_schedule_csv
+
+# What each stage's throughput is counted in
+STAGE_UNITS = {
+    "parse_ical": "bookings",
+    "merge_bookings": "bookings",
+    "detect_changeovers": "tasks",
+    "diff_events": "events",
+    "save_schedule_ics": "tasks",
+    "save_schedule_csv": "tasks",
+    "build_weekly_message": "messages",
+    "build_current_week_remaining_message": "messages",
+    "build_change_message": "messages",
+    "build_digest": "messages",
+}
+
+
+def stage_unit(stage: str) -> str:
+    # "parse_ical[fast]" is counted like "parse_ical"
+    return STAGE_UNITS[stage.split("[")[0]]
+
+
+class StageRecorder:
+    """
+    Runs stage calls and adds up, per stage: calls, items, seconds and,
+    with trace_memory (tracemalloc must be started), the peak memory
+    allocated by a single call.
+
+    Timing and memory are measured in separate passes, since tracing
+    allocations slows every call down.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stats = {}
+
+    def __call__(self, stage: str, count, fn, *args, **kwargs):
+        """
+        Calls fn(*args, **kwargs) as one call of 'stage' and returns its result.
+        count: the number of items processed, or a function of the result giving it.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        start = perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = perf_counter() - start
+
+        stats = self.stats.setdefault(stage, {"calls": 0, "items": 0, "seconds": 0.0, "peak_bytes": 0})
+        stats["calls"] += 1
+        stats["items"] += count(result) if callable(count) else count
+        stats["seconds"] += elapsed
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - before
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+
+        return result
+
+
+def previous_events(rng: random.Random, events: dict) -> dict:
+    """
+    Makes a plausible previous run's events from this run's: a few events
+    missing (added now), retyped or reassigned (changed) or extra (removed).
+    """
+    old = {}
+    for event_id, event in events.items():
+        roll = rng.random()
+        if roll < 0.03:
+            continue
+        if roll < 0.06:
+            event = type(event)(event.date, "Cleaning: Checkin Same Day", event.assigned_cleaner)
+        elif roll < 0.08:
+            event = type(event)(event.date, event.type, None)
+        elif roll < 0.10:
+            old[f"{event_id}-cancelled"] = event
+        old[event_id] = event
+    return old
+
+
+def run_property(prop: dict, record: StageRecorder, out_dir: str,
+                 parse_backends=("fast",), merge_cfg: dict = None):
+    """
+    Runs every benchmarked stage once for one synthetic property.
+    The bookings of the first parse backend feed the later stages.
+    """
+    merge_cfg = merge_cfg or {}
+    name, cleaners = prop["name"], prop["cleaners"]
+
+    bookings_lists = None
+    for backend in parse_backends:
+        parsed = [
+            record(f"parse_ical[{backend}]", len, parse_ical, text, backend=backend)
+            for text in prop["calendar_texts"]
+        ]
+        bookings_lists = bookings_lists or parsed
+
+    merged = record(
+        "merge_bookings", sum(len(lst) for lst in bookings_lists),
+        merge_bookings, bookings_lists,
+        coalesce_overlaps=merge_cfg.get("coalesce_overlaps", False),
+        tolerance_days=merge_cfg.get("tolerance_days", 1),
+    )
+    tasks = record("detect_changeovers", len, detect_changeovers, merged, name, cleaners)
+
+    record("save_schedule_csv", len(tasks), save_schedule_csv, tasks, path=os.path.join(out_dir, "schedule.csv"))
+    record("save_schedule_ics", len(tasks), save_schedule_ics,
+           tasks, name, path=os.path.join(out_dir, "schedule.ics"), cleaners=cleaners, upload=False)
+
+    new_events = {task.event_id(): task.to_event() for task in tasks}
+    old_events = previous_events(random.Random(name), new_events)
+    diff = record("diff_events", len(old_events) + len(new_events),
+                  diff_events, old_events, new_events, include_unchanged=False)
+
+    index = EventIndex(new_events)
+    weekly = record("build_weekly_message", 1, build_weekly_message, name, new_events, index)
+    record("build_current_week_remaining_message", 1,
+           build_current_week_remaining_message, name, new_events, index)
+    change = record("build_change_message", 1, build_change_message, name, new_events, diff, index)
+    record("build_digest", 2, build_digest, [{"body": weekly}, {"body": change}])
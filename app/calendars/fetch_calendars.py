@@ -1,23 +1,104 @@
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 
-def fetch_calendar(source: str) -> str:
+from calendars.http_cache import conditional_get, get_session, load_cached
+
+
+def fetch_calendar_result(source: str, cache_dir: str = None, cached_only: bool = False) -> dict:
     """
-    Fetches iCal data.
+    Fetches iCal data and reports where it came from.
     - If 'source' is a URL (starts with http), download it.
+      With a 'cache_dir', the download is a conditional GET against the
+      on-disk cache and a 304 serves the cached copy.
+      With 'cached_only', the cached copy is served without any request
+      (if there is one), e.g. for feeds the poll planner says are not due.
     - If it's a file path, read it from disk.
-    Returns raw ICS text.
+    Returns a dict: { text, cache_hit, bytes, skipped }.
     """
 
     # Case 1: URL mode
     if source.startswith("http://") or source.startswith("https://"):
-        response = requests.get(source, timeout=10)
+        if cache_dir and cached_only:
+            cached_body, _ = load_cached(source, cache_dir)
+            if cached_body is not None:
+                return {"text": cached_body, "cache_hit": True, "bytes": 0, "skipped": True}
+
+        if cache_dir:
+            return conditional_get(source, cache_dir, timeout=10)
+
+        response = get_session(source).get(source, timeout=10)
         response.raise_for_status()
-        return response.text
+        return {"text": response.text, "cache_hit": False, "bytes": len(response.content)}
 
     # Case 2: Local file mode
     if os.path.exists(source):
         with open(source, "r", encoding="utf-8") as f:
-            return f.read()
+            text = f.read()
+        return {"text": text, "cache_hit": False, "bytes": 0}
 
     raise FileNotFoundError(f"Could not fetch calendar from: {source}")
+
+
+def fetch_calendar(source: str, cache_dir: str = None) -> str:
+    """
+    Fetches iCal data.
+    - If 'source' is a URL (starts with http), download it.
+    - If it's a file path, read it from disk.
+    Returns raw ICS text.
+    """
+    return fetch_calendar_result(source, cache_dir)["text"]
+
+
+def _failed_fetch(source: str, cache_dir: str, error: Exception) -> dict:
+    """
+    Result for a feed that could not be fetched: the last cached copy if
+    there is one (marked 'stale'), else no text at all.
+    """
+    message = f"{type(error).__name__}: {error}"
+    if cache_dir and source.startswith(("http://", "https://")):
+        cached_body, _ = load_cached(source, cache_dir)
+        if cached_body is not None:
+            return {"text": cached_body, "cache_hit": True, "bytes": 0, "stale": True, "error": message}
+    return {"text": None, "cache_hit": False, "bytes": 0, "error": message}
+
+
+def _timed_fetch(source: str, cache_dir: str = None, cached_only: bool = False) -> dict:
+    start = perf_counter()
+    try:
+        result = fetch_calendar_result(source, cache_dir, cached_only)
+    except Exception as e:
+        # One broken feed must not take the whole tick down with it
+        result = _failed_fetch(source, cache_dir, e)
+    result["seconds"] = perf_counter() - start
+    return result
+
+
+def fetch_all_calendars(properties: list, max_workers: int = 8, cache_dir: str = None,
+                        not_due: set = None) -> dict:
+    """
+    Fetches every calendar of every property concurrently.
+    Uses a bounded thread pool so at most 'max_workers' downloads are in flight.
+    Sources in 'not_due' are served from the on-disk cache when possible.
+    Returns { property name: [fetch result, ...] } with results in the same
+    order as the property's 'calendars' list (see fetch_calendar_result);
+    each result also has the 'seconds' its fetch took.
+
+    A feed that fails does not raise: its result has an 'error' and either
+    the cached copy ('stale': True) or 'text' None when nothing is cached.
+    """
+    not_due = not_due or set()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            prop["name"]: [
+                pool.submit(_timed_fetch, cal, cache_dir, cal in not_due)
+                for cal in prop["calendars"]
+            ]
+            for prop in properties
+        }
+
+        return {
+            name: [f.result() for f in prop_futures]
+            for name, prop_futures in futures.items()
+        }
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+# Connections kept open per host (Airbnb / Booking.com feeds share a few hosts)
+POOL_MAXSIZE = 16
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str):
+    """
+    Returns the shared requests.Session for the URL's host.
+    One pooled session per host is created lazily and reused by every fetch
+    (and every thread) for the rest of the process.
+    requests is only imported once a feed is actually downloaded.
+    """
+    host = urlsplit(url).netloc
+
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+
+    return session
+
+
+def _cache_paths(cache_dir: str, url: str):
+    """
+    Returns (body path, metadata path) for a URL's cache entry.
+    """
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return (
+        os.path.join(cache_dir, f"{key}.ics"),
+        os.path.join(cache_dir, f"{key}.json"),
+    )
+
+
+def _write_atomic(path: str, text: str):
+    """
+    Writes text to path via a temp file, so a crash never leaves half a file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_cached(url: str, cache_dir: str):
+    """
+    Returns (body, metadata) of the cached copy of a URL,
+    or (None, {}) if nothing is cached yet.
+    """
+    body_path, meta_path = _cache_paths(cache_dir, url)
+
+    if not (os.path.exists(body_path) and os.path.exists(meta_path)):
+        return None, {}
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(body_path, "r", encoding="utf-8", newline="") as f:
+        body = f.read()
+
+    return body, meta
+
+
+def conditional_get(url: str, cache_dir: str, timeout: int = 10) -> dict:
+    """
+    Downloads a URL using the on-disk cache and HTTP validators.
+
+    Sends If-None-Match / If-Modified-Since from the cached response.
+    On 304 Not Modified the cached body is served.
+
+    Returns a dict:
+        text:      response body (fresh or cached)
+        cache_hit: True if the server answered 304 and the cached body was used
+        bytes:     number of body bytes transferred over the network
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_body, meta = load_cached(url, cache_dir)
+
+    headers = {}
+    if cached_body is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = get_session(url).get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and cached_body is not None:
+        return {"text": cached_body, "cache_hit": True, "bytes": 0}
+
+    response.raise_for_status()
+    text = response.text
+
+    # Store the fresh copy together with its validators
+    body_path, meta_path = _cache_paths(cache_dir, url)
+    _write_atomic(body_path, text)
+    _write_atomic(meta_path, json.dumps({
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }))
+
+    return {"text": text, "cache_hit": False, "bytes": len(response.content)}
@@ -0,0 +1,152 @@
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+
+from config.data_models import Booking
+
+
+def _unfolded_lines(ical_text: str) -> Iterator[str]:
+    """
+    Yields logical content lines one at a time.
+    Lines starting with a space or tab continue the previous line (RFC 5545 folding).
+    """
+    pending = None
+    pos = 0
+    length = len(ical_text)
+
+    while pos < length:
+        end = ical_text.find("\n", pos)
+        if end == -1:
+            end = length
+        line = ical_text[pos:end]
+        pos = end + 1
+
+        if line.endswith("\r"):
+            line = line[:-1]
+
+        if line[:1] in (" ", "\t"):
+            if pending is not None:
+                pending += line[1:]
+            continue
+
+        if pending is not None:
+            yield pending
+        pending = line
+
+    if pending is not None:
+        yield pending
+
+
+def _split_content_line(line: str) -> Tuple[str, str, str]:
+    """
+    Splits 'NAME;PARAM=...:VALUE' into (NAME, params, VALUE).
+    The name/value separator is the first colon outside double quotes,
+    so quoted parameters such as TZID="Europe/London" are handled.
+    """
+    i = line.find(":")
+    if i != -1 and '"' not in line[:i]:
+        head, value = line[:i], line[i + 1:]
+        name, _, params = head.partition(";")
+        return name.upper(), params, value
+
+    in_quotes = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ":" and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            name, _, params = head.partition(";")
+            return name.upper(), params, value
+
+    raise ValueError(f"Malformed iCal content line: {line!r}")
+
+
+def _parse_date(value: str) -> date:
+    """
+    Converts a DATE (20251126) or DATE-TIME (20251126T150000[Z]) value to a date.
+    A DATE-TIME is read in its own timezone (TZID, UTC or floating), which is
+    what icalendar's dt.date() returns, so only the date digits matter.
+    """
+    value = value.strip()
+    if len(value) < 8 or not value[:8].isdigit():
+        raise ValueError(f"Unsupported DTSTART/DTEND value: {value!r}")
+    return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+
+
+def _unescape_text(value: str) -> str:
+    """
+    Reverses RFC 5545 TEXT escaping, in the same order icalendar applies it.
+    """
+    return (
+        value.replace("\\N", "\\n")
+        .replace("\r\n", "\n")
+        .replace("\\n", "\n")
+        .replace("\\,", ",")
+        .replace("\\;", ";")
+        .replace("\\\\", "\\")
+    )
+
+
+def scan_vevents(ical_text: str, window: Optional[Tuple[date, date]] = None) -> List[Booking]:
+    """
+    Streaming alternative to building a full icalendar.Calendar.
+    Scans the unfolded lines once, keeps only DTSTART/DTEND/SUMMARY/UID of
+    each VEVENT and drops Airbnb blocked days as it goes.
+    With a (first, last) 'window', bookings that do not overlap it are dropped too.
+    Returns the same Bookings as parse_ical's icalendar path.
+    Raises ValueError on input it does not understand.
+    """
+    bookings = []
+    stack = []
+    event = None
+
+    for line in _unfolded_lines(ical_text):
+        if not line:
+            continue
+
+        name, _, value = _split_content_line(line)
+
+        if name == "BEGIN":
+            component = value.strip().upper()
+            stack.append(component)
+            if component == "VEVENT":
+                event = {}
+            continue
+
+        if name == "END":
+            component = value.strip().upper()
+            if not stack or stack[-1] != component:
+                raise ValueError(f"Unbalanced END:{component}")
+            stack.pop()
+
+            if component == "VEVENT":
+                if "DTSTART" not in event or "DTEND" not in event:
+                    raise ValueError("VEVENT without DTSTART/DTEND")
+
+                summary = event.get("SUMMARY", "")
+                in_window = window is None or (
+                    event["DTSTART"] <= window[1] and event["DTEND"] >= window[0]
+                )
+                # Skip Airbnb blocked days only
+                if in_window and summary.strip().lower() != "airbnb (not available)":
+                    bookings.append(Booking(
+                        start=event["DTSTART"],
+                        end=event["DTEND"],
+                        summary=summary,
+                        uid=event.get("UID", ""),
+                    ))
+                event = None
+            continue
+
+        # Only properties directly inside a VEVENT matter (not its VALARMs)
+        if not stack or stack[-1] != "VEVENT":
+            continue
+
+        if name in ("DTSTART", "DTEND"):
+            event.setdefault(name, _parse_date(value))
+        elif name in ("SUMMARY", "UID"):
+            event.setdefault(name, _unescape_text(value))
+
+    if stack:
+        raise ValueError(f"Unterminated component: {stack[-1]}")
+
+    return bookings
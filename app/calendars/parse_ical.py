@@ -1,13 +1,34 @@
-from icalendar import Calendar
 from datetime import date
-from typing import List
+from typing import List, Optional, Tuple
 
-def parse_ical(ical_text: str) -> List[dict]:
+from calendars.ical_scanner import scan_vevents
+from config.data_models import Booking
+
+
+def parse_ical(ical_text: str, backend: str = "icalendar",
+               window: Optional[Tuple[date, date]] = None) -> List[Booking]:
     """
     Parses raw iCal text and extracts booking events.
-    Returns a list of dicts, each representing one booking.
+    Returns a list of Bookings.
+
+    window: optional (first, last) dates; bookings that do not overlap it
+            (ending before 'first' or starting after 'last') are dropped.
+
+    backend:
+      - "icalendar": build a full icalendar.Calendar (default)
+      - "fast": streaming VEVENT scanner, falling back to icalendar
+                if the scanner cannot handle the feed
     """
 
+    if backend == "fast":
+        try:
+            return scan_vevents(ical_text, window)
+        except ValueError as e:
+            print(f"  → Fast iCal scanner failed ({e}), falling back to icalendar")
+
+    # Only loaded when this path is used (the fast scanner does not need it)
+    from icalendar import Calendar
+
     cal = Calendar.from_ical(ical_text)
     bookings = []
 
@@ -30,12 +51,16 @@ def parse_ical(ical_text: str) -> List[dict]:
         if summary.strip().lower() == "airbnb (not available)":
             continue
 
+        # Skip bookings outside the processing horizon
+        if window and (dtstart > window[1] or dtend < window[0]):
+            continue
+
 
-        bookings.append({
-            "start": dtstart,
-            "end": dtend,
-            "summary": summary,
-            "uid": uid,
-        })
+        bookings.append(Booking(
+            start=dtstart,
+            end=dtend,
+            summary=summary,
+            uid=uid,
+        ))
 
     return bookings
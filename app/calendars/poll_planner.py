@@ -0,0 +1,120 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from utils.fingerprint import calendar_digest
+
+# A feed due a few seconds after this tick is polled now rather than a tick later
+POLL_SLACK = timedelta(minutes=1)
+
+
+def is_remote(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+class PollPlanner:
+    """
+    Gives every calendar feed its own next-poll time.
+
+    A feed is polled at 'min_interval_minutes' while its property has a
+    cleaning task within 'urgent_hours' or the feed changed within
+    'recent_change_hours'. Otherwise every unchanged poll multiplies its
+    interval by 'backoff_factor', up to 'max_interval_minutes'.
+
+    The plan is kept in a JSON file:
+        { source: { next_poll, interval_minutes, last_polled, last_changed, digest } }
+    Only remote (http/https) feeds are planned; local files are always read.
+    """
+
+    def __init__(self, polling_cfg: dict = None):
+        cfg = polling_cfg or {}
+        self.enabled = cfg.get("enabled", False)
+        self.path = cfg.get("plan_path", "cache/poll_plan.json")
+        self.min_interval = timedelta(minutes=cfg.get("min_interval_minutes", 10))
+        self.max_interval = timedelta(minutes=cfg.get("max_interval_minutes", 240))
+        self.urgent_window = timedelta(hours=cfg.get("urgent_hours", 48))
+        self.recent_change = timedelta(hours=cfg.get("recent_change_hours", 24))
+        self.backoff_factor = cfg.get("backoff_factor", 2)
+        self._plan = self._load() if self.enabled else {}
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self):
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._plan, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def has_upcoming_task(self, events: dict, now_uk: datetime) -> bool:
+        """
+        True if any of a property's events ({ id: Event }) falls between
+        today and now_uk + urgent_hours (UK dates).
+        """
+        first, last = now_uk.date(), (now_uk + self.urgent_window).date()
+        return any(first <= event.date <= last for event in events.values())
+
+    def is_due(self, source: str, now: datetime, urgent: bool = False) -> bool:
+        """
+        Returns whether a feed should be downloaded on this tick.
+        Unknown feeds are always due; an urgent property's feeds are due
+        once 'min_interval_minutes' have passed since their last poll.
+        """
+        if not self.enabled or not is_remote(source):
+            return True
+
+        entry = self._plan.get(source)
+        if entry is None:
+            return True
+
+        if urgent:
+            next_poll = datetime.fromisoformat(entry["last_polled"]) + self.min_interval
+        else:
+            next_poll = datetime.fromisoformat(entry["next_poll"])
+
+        return now + POLL_SLACK >= next_poll
+
+    def record(self, source: str, ical_text: str, now: datetime, urgent: bool = False):
+        """
+        Records a fresh download of a feed and plans its next poll.
+        """
+        if not self.enabled or not is_remote(source):
+            return
+
+        entry = self._plan.get(source, {})
+        digest = calendar_digest(ical_text)
+
+        if "digest" not in entry:
+            # First poll: start backing off from the minimum
+            interval = self.min_interval
+        elif entry["digest"] != digest:
+            interval = self.min_interval
+            entry["last_changed"] = now.isoformat()
+        else:
+            interval = min(
+                timedelta(minutes=entry["interval_minutes"]) * self.backoff_factor,
+                self.max_interval,
+            )
+            interval = max(interval, self.min_interval)
+
+        last_changed = entry.get("last_changed")
+        recently_changed = (
+            last_changed is not None
+            and now - datetime.fromisoformat(last_changed) < self.recent_change
+        )
+        if urgent or recently_changed:
+            interval = self.min_interval
+
+        entry.update({
+            "digest": digest,
+            "interval_minutes": interval.total_seconds() / 60,
+            "last_polled": now.isoformat(),
+            "next_poll": (now + interval).isoformat(),
+        })
+        self._plan[source] = entry
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+# The one date format used at the output edges (CSV, state JSON, event IDs)
+DATE_FORMAT = "%d/%m/%Y"
+
+
+def parse_date(value) -> date:
+    """
+    Reads a date stored at an output edge.
+    Accepts a date, a day ordinal, "dd/mm/yyyy" (state files, CSV) or ISO "yyyy-mm-dd".
+    """
+    if isinstance(value, date):
+        return value
+    if isinstance(value, int):
+        return date.fromordinal(value)
+    if "/" in value:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    return date.fromisoformat(value)
+
+
+def format_date(value: date) -> str:
+    """
+    Formats a date as "dd/mm/yyyy" for CSV, state files and event IDs.
+    """
+    return value.strftime(DATE_FORMAT)
+
+
+@dataclass(frozen=True, slots=True)
+class Booking:
+    """
+    One reservation read from a calendar feed.
+    """
+    start: date
+    end: date
+    summary: str = ""
+    uid: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Task:
+    """
+    One cleaning task, due on a booking's checkout day.
+    """
+    id: str
+    date: date
+    property: str
+    type: str
+    assigned_cleaner: Optional[str]
+
+    def to_row(self) -> dict:
+        """
+        CSV row with the date formatted as "dd/mm/yyyy".
+        """
+        return {
+            "id": self.id,
+            "date": format_date(self.date),
+            "property": self.property,
+            "type": self.type,
+            "assigned_cleaner": self.assigned_cleaner,
+        }
+
+    def to_event(self) -> "Event":
+        return Event(self.date, self.type, self.assigned_cleaner)
+
+    def event_id(self) -> str:
+        """
+        Key of this task's event in the property state: "<Property Name>-dd/mm/yyyy".
+        """
+        return f"{self.property}-{format_date(self.date)}"
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """
+    A cleaning task as remembered in the property state and compared between runs.
+    """
+    date: date
+    type: str
+    assigned_cleaner: Optional[str]
+
+    def to_dict(self) -> dict:
+        return {
+            "date": format_date(self.date),
+            "type": self.type,
+            "assigned_cleaner": self.assigned_cleaner,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Event":
+        """
+        Builds an Event from a state file entry (any format parse_date accepts).
+        """
+        return cls(parse_date(data["date"]), data["type"], data.get("assigned_cleaner"))
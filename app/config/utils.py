@@ -1,48 +1,88 @@
+import heapq
 import os
 import yaml
 
-def load_config(path: str = "config.yaml") -> dict:
+def get_config_path(path: str = "config.yaml") -> str:
     """
-    Loads YAML configuration file and returns a dictionary.
+    Returns the absolute path of a config file living in app/.
     """
 
-    
     # Find directory containing THIS file (utils.py)
     base_dir = os.path.dirname(os.path.abspath(__file__))
 
     # Config file is one level above: app/config.yaml
-    config_path = os.path.abspath(os.path.join(base_dir, "..", path))
+    return os.path.abspath(os.path.join(base_dir, "..", path))
+
+
+def load_config(path: str = "config.yaml") -> dict:
+    """
+    Loads YAML configuration file and returns a dictionary.
+    """
 
-    with open(config_path, "r") as f:
+    with open(get_config_path(path), "r") as f:
         return yaml.safe_load(f)
     
 
-def merge_bookings(bookings_lists):
+def _is_sorted(bookings) -> bool:
+    return all(bookings[i].start <= bookings[i + 1].start for i in range(len(bookings) - 1))
+
+
+def _tagged(bookings, source: int):
+    for b in bookings:
+        yield b, source
+
+
+def merge_bookings(bookings_lists, coalesce_overlaps: bool = False, tolerance_days: int = 1):
     """
     Takes a list of booking lists (from multiple calendars)
     and merges them into one clean, sorted, deduplicated list.
-    """
 
-    merged = []
+    Feeds usually arrive sorted already, so the lists are k-way merged
+    (O(n log k)); only a list that is out of order gets sorted first.
 
-    # Combine everything into one list
-    for lst in bookings_lists:
-        merged.extend(lst)
+    A booking is dropped as a duplicate if its UID or its exact
+    (start, end) pair has already been seen.
 
-    # Sort by start date
-    merged.sort(key=lambda x: x["start"])
+    With coalesce_overlaps, a booking from another calendar that overlaps the
+    previous kept booking and whose start and end are each within
+    tolerance_days of it is treated as the same stay listed on two channels
+    (e.g. Airbnb and Booking.com); the first calendar's copy is kept.
+    """
+
+    # Sort only the lists that need it
+    sorted_lists = [
+        lst if _is_sorted(lst) else sorted(lst, key=lambda x: x.start)
+        for lst in bookings_lists
+    ]
+
+    # k-way merge by start date; ties keep calendar order (heapq.merge is stable)
+    merged = heapq.merge(
+        *[_tagged(lst, source) for source, lst in enumerate(sorted_lists)],
+        key=lambda tagged: tagged[0].start,
+    )
 
     # Deduplicate using UID (if available) OR start/end dates
     unique = []
-    seen = set()
+    seen_uids = set()
+    seen_dates = set()
+    last_source = None
 
-    for b in merged:
-        # Deduping key
-        key = (b["start"], b["end"])
+    for b, source in merged:
+        key = (b.start, b.end)
+        if key in seen_dates or (b.uid and b.uid in seen_uids):
+            continue
 
-        if key not in seen:
-            seen.add(key)
-            unique.append(b)
+        if coalesce_overlaps and unique and source != last_source:
+            last = unique[-1]
+            if (b.start < last.end
+                    and abs((b.start - last.start).days) <= tolerance_days
+                    and abs((b.end - last.end).days) <= tolerance_days):
+                continue
 
-    return unique
+        seen_dates.add(key)
+        if b.uid:
+            seen_uids.add(b.uid)
+        unique.append(b)
+        last_source = source
 
+    return unique
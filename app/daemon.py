@@ -0,0 +1,175 @@
+"""
+Long-running alternative to running app/run.py from cron every 10 minutes.
+
+The process stays resident and runs the same pipeline (run.main) on a fixed
+interval, so imports, HTTP sessions, the storage client, the calendar cache
+and the property state stay warm between ticks. The Sunday 14:00 (UK)
+weekly summary gets its own tick at exactly that time.
+
+    python app/daemon.py                       # run until SIGTERM / Ctrl+C
+    python app/daemon.py --once                # a single tick, then exit
+    python app/daemon.py --once --weekly       # a single weekly-summary tick
+    python app/daemon.py --interval-minutes 5
+    python app/daemon.py --profile --profile-every 6   # profile every 6th tick
+"""
+import argparse
+import os
+import signal
+import threading
+import traceback
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from config.utils import get_config_path, load_config
+from messaging.outbox import stop_delivery
+from run import main
+
+UK = ZoneInfo("Europe/London")
+
+# The weekly summary is sent on Sunday at this UK time
+WEEKLY_SLOT = time(14, 0)
+
+# A weekly tick that fails (or a daemon started shortly after 14:00) keeps
+# retrying the summary on the following ticks for this long
+WEEKLY_GRACE = timedelta(hours=1)
+
+
+def next_weekly_slot(after: datetime) -> datetime:
+    """
+    Returns the first Sunday 14:00 UK strictly after 'after' (as UTC).
+    """
+    after_uk = after.astimezone(UK)
+    days_ahead = (6 - after_uk.weekday()) % 7
+    slot = datetime.combine(after_uk.date() + timedelta(days=days_ahead), WEEKLY_SLOT, tzinfo=UK)
+    if slot <= after_uk:
+        slot = datetime.combine(slot.date() + timedelta(days=7), WEEKLY_SLOT, tzinfo=UK)
+    return slot.astimezone(timezone.utc)
+
+
+class ConfigReloader:
+    """
+    Keeps the parsed config.yaml and re-reads it only when the file changes.
+    """
+
+    def __init__(self, path: str = "config.yaml"):
+        self.path = path
+        self._mtime = None
+        self._config = None
+
+    def get(self) -> dict:
+        mtime = os.path.getmtime(get_config_path(self.path))
+        if mtime != self._mtime:
+            if self._config is not None:
+                print("🔄 config.yaml changed, reloading")
+            self._config = load_config(self.path)
+            self._mtime = mtime
+        return self._config
+
+
+def run_tick(config: dict, now_utc: datetime, weekly_summary, cache_state: bool,
+             profile: bool = False) -> bool:
+    """
+    Runs the pipeline once. Returns False (and logs) if it raised.
+    """
+    try:
+        main(config=config, now_utc=now_utc, weekly_summary=weekly_summary,
+             cache_state=cache_state, keep_delivery_worker=True, profile=profile)
+        return True
+    except Exception:
+        print("❌ Tick failed:")
+        traceback.print_exc()
+        return False
+
+
+def run_daemon(interval_minutes: float = None, stop: threading.Event = None,
+               profile_every: int = None):
+    """
+    Runs ticks every 'interval_minutes' (config.yaml 'daemon' section by default)
+    plus one at each Sunday 14:00 UK, until 'stop' is set.
+    A tick in progress always finishes before the daemon exits.
+    With 'profile_every', every Nth tick (starting with the first) is profiled.
+    """
+    stop = stop or threading.Event()
+    reloader = ConfigReloader()
+
+    now = datetime.now(timezone.utc)
+    weekly_slot = next_weekly_slot(now - WEEKLY_GRACE)
+    next_tick = now
+    ticks = 0
+
+    while not stop.is_set():
+        config = reloader.get()
+        daemon_cfg = config.get("daemon") or {}
+        interval = timedelta(minutes=interval_minutes or daemon_cfg.get("interval_minutes", 10))
+
+        now = datetime.now(timezone.utc)
+
+        # A weekly slot missed by more than the grace period is skipped
+        if now >= weekly_slot + WEEKLY_GRACE:
+            weekly_slot = next_weekly_slot(now)
+
+        weekly_due = now >= weekly_slot
+        tick_due = now >= next_tick
+        if tick_due or weekly_due:
+            print(f"\n⏱️  Tick at {now.astimezone(UK).strftime('%A %d %b %Y, %H:%M:%S')} (UK)"
+                  f"{' – weekly summary' if weekly_due else ''}")
+
+            profile = bool(profile_every) and ticks % profile_every == 0
+            ok = run_tick(config, now, weekly_due, daemon_cfg.get("cache_state", True), profile)
+            ticks += 1
+            if ok and weekly_due:
+                weekly_slot = next_weekly_slot(now)
+
+            # Keep to the interval grid; after an overrun, start again straight away
+            if tick_due:
+                next_tick = max(next_tick + interval, datetime.now(timezone.utc))
+
+        wake = min(next_tick, weekly_slot)
+        stop.wait(max((wake - datetime.now(timezone.utc)).total_seconds(), 0))
+
+    # Let the email delivery worker finish its current pass
+    stop_delivery()
+    print("👋 Daemon stopped.")
+
+
+def install_signal_handlers(stop: threading.Event):
+    """
+    SIGTERM / SIGINT ask the daemon to stop after the current tick.
+    """
+    def handle(signum, frame):
+        print(f"\n🛑 Received {signal.Signals(signum).name}, stopping after the current tick...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cleaning scheduler daemon")
+    parser.add_argument("--once", action="store_true",
+                        help="run a single tick and exit")
+    parser.add_argument("--weekly", action="store_true",
+                        help="with --once, treat the tick as the Sunday weekly summary")
+    parser.add_argument("--interval-minutes", type=float, default=None,
+                        help="minutes between ticks (default: config.yaml daemon.interval_minutes)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile CPU and memory per stage and property (see config.yaml 'profiling')")
+    parser.add_argument("--profile-every", type=int, default=None, metavar="N",
+                        help="with --profile, only profile every Nth tick "
+                             "(default: config.yaml profiling.every_n_runs)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.once:
+        # Without --weekly, the usual Sunday 14:00-14:09 window applies
+        main(weekly_summary=True if args.weekly else None, profile=args.profile)
+    else:
+        stop = threading.Event()
+        install_signal_handlers(stop)
+        profile_every = None
+        if args.profile:
+            profile_every = args.profile_every or (load_config().get("profiling") or {}).get("every_n_runs", 1)
+        run_daemon(args.interval_minutes, stop, profile_every)
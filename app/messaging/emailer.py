@@ -1,54 +1,247 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 
+# Used when config.yaml has no 'email.recipients'
+DEFAULT_RECIPIENTS = ["hassaan.vzpg@gmail.com"]
 
-def send_email(subject: str, body: str):
+
+class SMTPMailer:
+    """
+    One authenticated SMTP connection shared by every message of a run.
+
+    The connection is opened on the first send and reused until close().
+    If the server drops it (idle timeout, rate limiting), the next send
+    reconnects and logs in again once before giving up.
+
+    Use as a context manager:
+        with SMTPMailer.from_env(email_cfg) as mailer:
+            mailer.send(["a@example.com"], "Subject", "Body")
+    """
+
+    def __init__(self, sender: str, app_password: str,
+                 host: str = "smtp.gmail.com", port: int = 465, timeout: int = 30,
+                 use_ssl: bool = True):
+        self.sender = sender
+        self.app_password = app_password
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.use_ssl = use_ssl
+        self._smtp = None
+
+    @classmethod
+    def from_env(cls, email_cfg: dict = None) -> "SMTPMailer":
+        """
+        Builds a mailer from config.yaml's 'email' section and the
+        EMAIL_SENDER / EMAIL_APP_PASSWORD environment variables.
+
+        Raises:
+            ValueError: If required environment variables are missing
+        """
+        cfg = email_cfg or {}
+        sender = os.getenv("EMAIL_SENDER")
+        app_password = os.getenv("EMAIL_APP_PASSWORD")
+
+        if not sender or not app_password:
+            raise ValueError(
+                "Missing EMAIL_SENDER or EMAIL_APP_PASSWORD environment variables. "
+                "Please set these before running the script."
+            )
+
+        return cls(
+            sender,
+            app_password,
+            host=cfg.get("smtp_host", "smtp.gmail.com"),
+            port=cfg.get("smtp_port", 465),
+            use_ssl=cfg.get("smtp_ssl", True),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        # Loaded on first send; most runs never send an email
+        import smtplib
+
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            # Plain SMTP, e.g. a local sink (benchmarks.smtp_sink)
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.login(self.sender, self.app_password)
+        except smtplib.SMTPAuthenticationError as e:
+            smtp.close()
+            raise Exception(
+                f"SMTP authentication failed. Check your EMAIL_SENDER and EMAIL_APP_PASSWORD. "
+                f"Error: {str(e)}"
+            )
+        self._smtp = smtp
+
+    def send(self, recipients: list, subject: str, body: str) -> dict:
+        """
+        Sends one plain-text email over the shared connection.
+        Returns { recipient: error } for recipients the server refused
+        while accepting the others (empty if all were accepted).
+
+        Raises:
+            Exception: If the message could not be sent (after one reconnect)
+        """
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+
+        # Build email message
+        msg = MIMEMultipart()
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(recipients)
+        msg["Subject"] = subject
+
+        msg.attach(MIMEText(body, "plain"))
+
+        for attempt in (1, 2):
+            try:
+                if self._smtp is None:
+                    self._connect()
+                refused = self._smtp.send_message(msg) or {}
+                return {
+                    recipient: f"Recipient refused: {code} {response.decode('utf-8', 'replace')}"
+                    for recipient, (code, response) in refused.items()
+                }
+
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                # Connection dropped: reconnect once, then give up
+                self._smtp = None
+                if attempt == 2:
+                    raise Exception(f"Failed to send email: {str(e)}")
+
+            except smtplib.SMTPException as e:
+                raise Exception(f"SMTP error occurred: {str(e)}")
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            # Already disconnected
+            pass
+        self._smtp = None
+
+
+def recipients_for(prop: dict, email_cfg: dict = None) -> list:
+    """
+    Returns who gets a property's emails: the property's own 'email_recipients'
+    if set, otherwise config.yaml's 'email.recipients'.
+    """
+    return (
+        prop.get("email_recipients")
+        or (email_cfg or {}).get("recipients")
+        or DEFAULT_RECIPIENTS
+    )
+
+
+def build_digest(messages: list) -> tuple:
+    """
+    Combines several property messages into one email.
+    Returns (subject, body).
+    """
+    subject = f"Cleaning Updates – {len(messages)} properties"
+    body = "\n\n\n".join(m["body"] for m in messages)
+    return subject, body
+
+
+def deliver_messages(messages: list, email_cfg: dict = None) -> dict:
+    """
+    Sends a batch of messages over a single SMTP connection.
+
+    messages: [{ key, subject, body, recipients }, ...]
+
+    With 'digest: true' in config.yaml's 'email' section, each recipient gets
+    one email combining all of their messages instead.
+
+    Returns { key: { recipient: error } } listing, per message, the
+    recipients it could not be delivered to (empty if it reached everyone).
+    In digest mode a message can reach some recipients and not others.
+    Failures are logged, not raised.
     """
-    Send an email using Gmail SMTP.
-    
+    if not messages:
+        return {}
+
+    cfg = email_cfg or {}
+
+    # (recipients, subject, body, message keys covered) per email to send
+    if cfg.get("digest"):
+        by_recipient = {}
+        for message in messages:
+            for recipient in message["recipients"]:
+                by_recipient.setdefault(recipient, []).append(message)
+
+        emails = []
+        for recipient, recipient_messages in by_recipient.items():
+            if len(recipient_messages) == 1:
+                subject, body = recipient_messages[0]["subject"], recipient_messages[0]["body"]
+            else:
+                subject, body = build_digest(recipient_messages)
+            emails.append(([recipient], subject, body, [m["key"] for m in recipient_messages]))
+    else:
+        emails = [
+            (m["recipients"], m["subject"], m["body"], [m["key"]])
+            for m in messages
+        ]
+
+    results = {m["key"]: {} for m in messages}
+
+    def failed(recipients: list, keys: list, error: str):
+        for key in keys:
+            for recipient in recipients:
+                results[key][recipient] = error
+
+    try:
+        with SMTPMailer.from_env(cfg) as mailer:
+            for i, (recipients, subject, body, keys) in enumerate(emails):
+                try:
+                    refused = mailer.send(recipients, subject, body)
+                    print(f"✅ Email sent to {', '.join(r for r in recipients if r not in refused)}: {subject}")
+                    for recipient, error in refused.items():
+                        print(f"❌ {recipient} refused ({subject}): {error}")
+                        failed([recipient], keys, error)
+                except Exception as e:
+                    print(f"❌ Email send failed ({subject}): {str(e)}")
+                    failed(recipients, keys, str(e))
+
+                    # No connection could be (re)established: don't hammer the server
+                    if mailer._smtp is None:
+                        for rest_recipients, _, _, rest_keys in emails[i + 1:]:
+                            failed(rest_recipients, rest_keys, str(e))
+                        break
+
+    except Exception as e:
+        print(f"❌ Email send failed: {str(e)}")
+        for message in messages:
+            failed(message["recipients"], [message["key"]], str(e))
+
+    return results
+
+
+def send_email(subject: str, body: str, recipients: list = None):
+    """
+    Send a single email using Gmail SMTP.
+
     Args:
         subject: Email subject line
         body: Email body text
-        
+        recipients: Addresses to send to (defaults to DEFAULT_RECIPIENTS)
+
     Raises:
         ValueError: If required environment variables are missing
-        smtplib.SMTPException: If email sending fails
-        
+        Exception: If email sending fails
+
     Environment variables required:
         EMAIL_SENDER: Gmail address to send from
         EMAIL_APP_PASSWORD: Gmail app-specific password
     """
-    sender = os.getenv("EMAIL_SENDER")
-    app_password = os.getenv("EMAIL_APP_PASSWORD")
-
-    if not sender or not app_password:
-        raise ValueError(
-            "Missing EMAIL_SENDER or EMAIL_APP_PASSWORD environment variables. "
-            "Please set these before running the script."
-        )
-
-    # Build email message
-    msg = MIMEMultipart()
-    msg["From"] = sender
-    msg["To"] = "hassaan.vzpg@gmail.com"
-    msg["Subject"] = subject
-
-    msg.attach(MIMEText(body, "plain"))
-
-    # Send email
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender, app_password)
-            smtp.send_message(msg)
-            
-    except smtplib.SMTPAuthenticationError as e:
-        raise Exception(
-            f"SMTP authentication failed. Check your EMAIL_SENDER and EMAIL_APP_PASSWORD. "
-            f"Error: {str(e)}"
-        )
-    except smtplib.SMTPException as e:
-        raise Exception(f"SMTP error occurred: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Failed to send email: {str(e)}")
\ No newline at end of file
+    with SMTPMailer.from_env() as mailer:
+        mailer.send(recipients or DEFAULT_RECIPIENTS, subject, body)
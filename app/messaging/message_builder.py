@@ -1,32 +1,37 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from config.data_models import Event
+from schedule.diff_events import change_mask, TYPE_CHANGED, CLEANER_CHANGED
+from schedule.event_index import EventIndex
 
-def format_event_line(event: dict) -> str:
+
+def format_event_line(event: Event) -> str:
     """
     Format a single cleaning event as a readable line.
     Example: "Tue 02 Dec – Cleaning: Checkin Not Same Day (CleanerA)"
     """
-    # Convert "dd/mm/yyyy" to datetime
-    dt = datetime.strptime(event["date"], "%d/%m/%Y")
-
-    date_str = dt.strftime("%a %d %b")  # e.g. "Tue 02 Dec"
-    cleaner = event.get("assigned_cleaner") or "Unassigned"
+    date_str = event.date.strftime("%a %d %b")  # e.g. "Tue 02 Dec"
+    cleaner = event.assigned_cleaner or "Unassigned"
 
-    return f"{date_str} – {event['type']} ({cleaner})"
+    return f"{date_str} – {event.type} ({cleaner})"
 
 
-def build_current_week_remaining_message(property_name: str, events: dict) -> str:
+def build_current_week_remaining_message(property_name: str, events: dict,
+                                         index: EventIndex = None, now_uk: datetime = None) -> str:
     """
     Show ALL remaining cleanings for THIS WEEK:
     - Starting from NOW (current time)
     - Ending at the upcoming Sunday 14:00 UK
     
     This is used for change notifications to show what's left in the current week.
+    Pass the property's EventIndex to reuse it; otherwise one is built from 'events'.
+    Pass the tick's UK time as 'now_uk'; it defaults to the current time.
     """
 
-    # Current UK time
-    now_uk = datetime.now(ZoneInfo("Europe/London"))
+    # Current UK time (the tick's time when given)
+    if now_uk is None:
+        now_uk = datetime.now(ZoneInfo("Europe/London"))
 
     # Compute the upcoming Sunday at 14:00 UK
     days_until_sunday = (6 - now_uk.weekday()) % 7
@@ -44,21 +49,10 @@ def build_current_week_remaining_message(property_name: str, events: dict) -> st
         hour=14, minute=0, second=0, microsecond=0
     )
 
-    def in_remaining_window(ev):
-        """Check if event falls between now and Sunday 14:00."""
-        dt = datetime.strptime(ev["date"], "%d/%m/%Y").replace(
-            tzinfo=ZoneInfo("Europe/London")
-        )
-        # Include events from now until Sunday 14:00
-        return now_uk.date() <= dt.date() <= sunday_2pm.date()
-
-    # Filter events
-    window_events = [ev for ev in events.values() if in_remaining_window(ev)]
-
-    # Sort chronologically
-    window_events.sort(
-        key=lambda e: datetime.strptime(e["date"], "%d/%m/%Y")
-    )
+    # Events from now until Sunday 14:00, already in date order
+    if index is None:
+        index = EventIndex(events)
+    window_events = index.events_between(now_uk.date(), sunday_2pm.date())
 
     lines = [
         f"Updated Cleaning Schedule – {property_name}",
@@ -75,16 +69,19 @@ def build_current_week_remaining_message(property_name: str, events: dict) -> st
     return "\n".join(lines)
 
 
-def build_weekly_message(property_name: str, events: dict) -> str:
+def build_weekly_message(property_name: str, events: dict, index: EventIndex = None,
+                         now_uk: datetime = None) -> str:
     """
     Build schedule for NEXT WEEK only (Monday → Sunday).
     This is sent on Sunday at 14:00 as a preview of the upcoming week.
     
     FIXED: Now uses UK timezone instead of naive datetime.
+    Pass the property's EventIndex to reuse it; otherwise one is built from 'events'.
+    Pass the tick's UK time as 'now_uk'; it defaults to the current time.
     """
 
     # Use UK timezone to ensure correct week calculation
-    today = datetime.now(ZoneInfo("Europe/London"))
+    today = now_uk or datetime.now(ZoneInfo("Europe/London"))
 
     # --- TEST OVERRIDE (uncomment to simulate specific dates) ---
     # Force the system to behave as if today is a specific date.
@@ -102,18 +99,10 @@ def build_weekly_message(property_name: str, events: dict) -> str:
     # Calculate next Sunday (end of next week)
     next_sunday = next_monday + timedelta(days=6)
 
-    def in_next_week(ev):
-        """Check if event falls in next week (Monday through Sunday)."""
-        dt = datetime.strptime(ev["date"], "%d/%m/%Y")
-        return next_monday.date() <= dt.date() <= next_sunday.date()
-
-    # Filter events into next week
-    next_week_events = [
-        ev for ev in events.values() if in_next_week(ev)
-    ]
-
-    # Sort chronologically
-    next_week_events.sort(key=lambda e: datetime.strptime(e["date"], "%d/%m/%Y"))
+    # Events in next week (Monday through Sunday), already in date order
+    if index is None:
+        index = EventIndex(events)
+    next_week_events = index.events_between(next_monday.date(), next_sunday.date())
 
     lines = [
         f"Weekly Cleaning Schedule – {property_name}",
@@ -130,15 +119,19 @@ def build_weekly_message(property_name: str, events: dict) -> str:
     return "\n".join(lines)
 
 
-def build_change_message(property_name: str, new_events: dict, diff: dict) -> str:
+def build_change_message(property_name: str, new_events: dict, diff: dict,
+                         index: EventIndex = None, now_uk: datetime = None) -> str:
     """
     Build a message showing the updated schedule + the changes.
     
     Args:
         property_name: Name of the property
         new_events: All current events (will be filtered by build_current_week_remaining_message)
-        diff: Dictionary with keys: added, removed, changed, unchanged
+        diff: Dictionary with keys: added, removed, changed
+              (changed entries may carry a 'fields' change mask)
               Should be pre-filtered to only include changes before the cutoff
+        index: Optional EventIndex of new_events, reused for the schedule section
+        now_uk: The tick's UK time (defaults to the current time)
     
     The message includes:
     1. Current week remaining schedule (now → Sunday 14:00)
@@ -146,24 +139,22 @@ def build_change_message(property_name: str, new_events: dict, diff: dict) -> st
     """
 
     # First show the updated schedule (automatically filtered to current week)
-    message = build_current_week_remaining_message(property_name, new_events)
+    message = build_current_week_remaining_message(property_name, new_events, index, now_uk)
     message += "\n\nChanges since last update:\n"
 
     # Handle added events
     if diff["added"]:
         for eid, event in diff["added"].items():
-            dt = datetime.strptime(event["date"], "%d/%m/%Y")
-            date_str = dt.strftime("%a %d %b")
-            cleaner = event.get("assigned_cleaner") or "Unassigned"
-            message += f"+ Added: {date_str} – {event['type']} ({cleaner})\n"
+            date_str = event.date.strftime("%a %d %b")
+            cleaner = event.assigned_cleaner or "Unassigned"
+            message += f"+ Added: {date_str} – {event.type} ({cleaner})\n"
 
     # Handle removed events
     if diff["removed"]:
         for eid, event in diff["removed"].items():
-            dt = datetime.strptime(event["date"], "%d/%m/%Y")
-            date_str = dt.strftime("%a %d %b")
-            cleaner = event.get("assigned_cleaner") or "Unassigned"
-            message += f"- Removed: {date_str} – {event['type']} ({cleaner})\n"
+            date_str = event.date.strftime("%a %d %b")
+            cleaner = event.assigned_cleaner or "Unassigned"
+            message += f"- Removed: {date_str} – {event.type} ({cleaner})\n"
 
     # Handle changed events
     if diff["changed"]:
@@ -171,16 +162,19 @@ def build_change_message(property_name: str, new_events: dict, diff: dict) -> st
             old = change["old"]
             new = change["new"]
 
-            dt = datetime.strptime(new["date"], "%d/%m/%Y")
-            date_str = dt.strftime("%a %d %b")
+            date_str = new.date.strftime("%a %d %b")
+
+            # Detect what changed (diff_events already worked out the mask)
+            fields = change.get("fields")
+            if fields is None:
+                fields = change_mask(old, new)
 
-            # Detect what changed
             changes = []
-            if old.get("type") != new.get("type"):
-                changes.append(f"type: {old.get('type')} → {new.get('type')}")
-            if old.get("assigned_cleaner") != new.get("assigned_cleaner"):
-                old_cleaner = old.get("assigned_cleaner") or "Unassigned"
-                new_cleaner = new.get("assigned_cleaner") or "Unassigned"
+            if fields & TYPE_CHANGED:
+                changes.append(f"type: {old.type} → {new.type}")
+            if fields & CLEANER_CHANGED:
+                old_cleaner = old.assigned_cleaner or "Unassigned"
+                new_cleaner = new.assigned_cleaner or "Unassigned"
                 changes.append(f"cleaner: {old_cleaner} → {new_cleaner}")
 
             change_details = ", ".join(changes) if changes else "details updated"
@@ -0,0 +1,467 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from messaging.emailer import deliver_messages
+from utils.gcs import get_client
+
+BUCKET_NAME = "cleaning-scheduler-bucket"
+
+# Outbox row status
+PENDING = "pending"
+SENT = "sent"
+DEAD = "dead"
+
+
+class Outbox:
+    """
+    Durable queue of outgoing emails, kept in a SQLite table.
+
+    Messages are enqueued under an idempotency key: enqueuing the same key
+    twice keeps the first message, so a retried run never queues a duplicate.
+    A failed delivery is retried with exponential backoff
+    ('backoff_base_seconds' doubling up to 'backoff_max_seconds'); after
+    'max_attempts' failures the message is dead-lettered and kept for
+    inspection. Sent messages are purged after 'retention_days'.
+
+    With a 'gcs_object', the database is copied to GCS by sync() (after
+    queuing and after every delivery pass) and restored from there when the
+    local file is missing, so a fresh container neither loses queued emails
+    nor sends delivered ones again. Uploads are conditional on the
+    generation last seen; if another process wrote the object in between,
+    its rows are merged in first, so shards and claiming workers can share
+    one object.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 8, backoff_base_seconds: int = 60,
+                 backoff_max_seconds: int = 3600, retention_days: int = 30, gcs_object: str = None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = timedelta(seconds=backoff_base_seconds)
+        self.backoff_max = timedelta(seconds=backoff_max_seconds)
+        self.retention_days = retention_days
+        self.gcs_object = gcs_object
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._generation = None
+        self._synced_changes = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if gcs_object and not os.path.exists(path):
+            self._restore()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS outbox (
+                key TEXT PRIMARY KEY,
+                property TEXT,
+                recipients TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                sent_at TEXT,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+        """)
+
+        if gcs_object:
+            if self._generation is None:
+                # Local copy kept from an earlier run: upload on top of the
+                # object as it is now (merging if it has moved on since)
+                blob = get_client().bucket(BUCKET_NAME).get_blob(gcs_object)
+                self._generation = blob.generation if blob else 0
+            else:
+                # Just restored: the object already holds everything
+                self._synced_changes = self._conn.total_changes
+
+    def enqueue(self, key: str, property_name: str, recipients: list,
+                subject: str, body: str, now: datetime = None) -> bool:
+        """
+        Queues a message for delivery.
+        Returns False if a message with this key was already queued.
+        """
+        now = (now or datetime.now(timezone.utc)).isoformat()
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(key, property, recipients, subject, body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, property_name, json.dumps(recipients), subject, body, PENDING, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def due(self, now: datetime = None, properties: set = None) -> list:
+        """
+        Returns the pending messages whose next attempt is due, oldest first.
+        With 'properties', only those properties' messages.
+        """
+        now = (now or datetime.now(timezone.utc)).isoformat()
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, property, recipients, subject, body, attempts FROM outbox "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at",
+                (PENDING, now),
+            ).fetchall()
+
+        if properties is not None:
+            rows = [row for row in rows if row[1] in properties]
+
+        return [
+            {
+                "key": key,
+                "property": property_name,
+                "recipients": json.loads(recipients),
+                "subject": subject,
+                "body": body,
+                "attempts": attempts,
+            }
+            for key, property_name, recipients, subject, body, attempts in rows
+        ]
+
+    def mark_sent(self, key: str, now: datetime = None):
+        now = (now or datetime.now(timezone.utc)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, sent_at = ?, attempts = attempts + 1, last_error = NULL "
+                "WHERE key = ?",
+                (SENT, now, key),
+            )
+
+    def mark_failed(self, key: str, attempts: int, error: str, now: datetime = None,
+                    recipients: list = None) -> bool:
+        """
+        Records a failed attempt and schedules the next one.
+        'attempts' is the number of attempts made before this one.
+        If the message reached some of its recipients, pass the ones it did
+        not reach as 'recipients': only they get the retries.
+        Returns True if the message was dead-lettered.
+        """
+        now = now or datetime.now(timezone.utc)
+        attempts += 1
+        dead = attempts >= self.max_attempts
+        delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "recipients = COALESCE(?, recipients) WHERE key = ?",
+                (DEAD if dead else PENDING, attempts, (now + delay).isoformat(), error,
+                 json.dumps(recipients) if recipients is not None else None, key),
+            )
+        return dead
+
+    def purge(self, now: datetime = None):
+        """
+        Drops sent messages older than 'retention_days'.
+        """
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=self.retention_days)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, cutoff))
+
+    def counts(self) -> dict:
+        """
+        Returns { status: number of messages }.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    # -- GCS copy --------------------------------------------------------
+
+    def sync(self) -> bool:
+        """
+        Uploads the outbox to its GCS object if it changed since the last
+        upload. Returns True if it uploaded.
+        """
+        if not self.gcs_object:
+            return False
+
+        from google.api_core.exceptions import PreconditionFailed
+
+        with self._sync_lock:
+            for _ in range(3):
+                changes = self._conn.total_changes
+                if changes == self._synced_changes:
+                    return False
+
+                blob = get_client().bucket(BUCKET_NAME).blob(self.gcs_object)
+                tmp_path = self._backup()
+                try:
+                    blob.upload_from_filename(
+                        tmp_path,
+                        content_type="application/x-sqlite3",
+                        if_generation_match=self._generation,
+                    )
+                except PreconditionFailed:
+                    # Another process wrote it: take its rows, then try again
+                    self._merge_remote()
+                    continue
+                finally:
+                    os.remove(tmp_path)
+
+                self._generation = blob.generation
+                self._synced_changes = changes
+                return True
+
+        print(f"⚠️  {self.gcs_object} keeps changing under this process; outbox not uploaded this time")
+        return False
+
+    def refresh(self):
+        """
+        Merges in rows other processes uploaded since this one last synced
+        (a metadata check when nothing changed).
+        """
+        if not self.gcs_object:
+            return
+        with self._sync_lock:
+            blob = get_client().bucket(BUCKET_NAME).get_blob(self.gcs_object)
+            if blob and blob.generation != self._generation:
+                in_sync = self._conn.total_changes == self._synced_changes
+                self._merge_remote()
+                if in_sync:
+                    # Only the remote rows are new, and GCS has them already
+                    self._synced_changes = self._conn.total_changes
+
+    def _backup(self) -> str:
+        fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        with self._lock:
+            backup = sqlite3.connect(tmp_path)
+            self._conn.backup(backup)
+            backup.close()
+        return tmp_path
+
+    def _restore(self):
+        from google.api_core.exceptions import NotFound
+
+        blob = get_client().bucket(BUCKET_NAME).blob(self.gcs_object)
+        try:
+            blob.download_to_filename(self.path)
+            self._generation = blob.generation
+            print(f"Restored outbox from {blob.name}")
+        except NotFound:
+            # Nothing queued anywhere yet
+            self._generation = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _merge_remote(self):
+        """
+        Merges the GCS copy into the local table. New keys are added; for
+        keys on both sides the further-along row wins (sent, then dead,
+        then more attempts), so a delivery recorded anywhere is kept.
+        """
+        from google.api_core.exceptions import NotFound
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        blob = get_client().bucket(BUCKET_NAME).blob(self.gcs_object)
+        try:
+            try:
+                blob.download_to_filename(tmp_path)
+            except NotFound:
+                self._generation = 0
+                return
+
+            columns = ("key, property, recipients, subject, body, status, attempts, "
+                       "next_attempt_at, created_at, sent_at, last_error")
+            progress = f"(CASE {{0}}.status WHEN '{SENT}' THEN 2 WHEN '{DEAD}' THEN 1 ELSE 0 END)"
+            with self._lock:
+                self._conn.execute("ATTACH DATABASE ? AS remote", (tmp_path,))
+                try:
+                    with self._conn:
+                        self._conn.execute(
+                            f"INSERT OR IGNORE INTO outbox ({columns}) SELECT {columns} FROM remote.outbox"
+                        )
+                        self._conn.execute(
+                            f"INSERT OR REPLACE INTO outbox ({columns}) "
+                            f"SELECT {', '.join('r.' + c.strip() for c in columns.split(','))} "
+                            f"FROM remote.outbox r JOIN outbox l ON l.key = r.key "
+                            f"WHERE {progress.format('r')} > {progress.format('l')} "
+                            f"OR ({progress.format('r')} = {progress.format('l')} AND r.attempts > l.attempts)"
+                        )
+                finally:
+                    self._conn.execute("DETACH DATABASE remote")
+            self._generation = blob.generation
+        finally:
+            os.remove(tmp_path)
+
+    def dead_letters(self) -> list:
+        """
+        Returns the dead-lettered messages: { key, property, subject, attempts, last_error }.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, property, subject, attempts, last_error FROM outbox "
+                "WHERE status = ? ORDER BY created_at",
+                (DEAD,),
+            ).fetchall()
+        return [
+            dict(zip(("key", "property", "subject", "attempts", "last_error"), row))
+            for row in rows
+        ]
+
+
+def deliver_due(outbox: Outbox, email_cfg: dict = None, now: datetime = None,
+                properties: set = None) -> int:
+    """
+    Sends every message that is due (only those of 'properties' if given),
+    over one SMTP connection, then syncs the outbox to GCS.
+    Returns the number of messages delivered.
+    """
+    messages = outbox.due(now, properties)
+    if not messages:
+        return 0
+
+    print(f"📨 Delivering {len(messages)} queued email(s)...")
+    results = deliver_messages(messages, email_cfg)
+
+    delivered = 0
+    for message in messages:
+        failed = results.get(message["key"]) or {}
+        if not failed:
+            outbox.mark_sent(message["key"], now)
+            delivered += 1
+            continue
+
+        # Recipients who already got the message are not sent it again
+        remaining = [r for r in message["recipients"] if r in failed]
+        error = "; ".join(sorted(set(failed.values())))
+        if outbox.mark_failed(message["key"], message["attempts"], error, now, remaining):
+            print(f"❌ Giving up on '{message['subject']}' after {message['attempts'] + 1} attempts "
+                  f"(dead-lettered)")
+        else:
+            print(f"  → '{message['subject']}' will be retried for {len(remaining)} of "
+                  f"{len(message['recipients'])} recipient(s)")
+
+    outbox.purge(now)
+    outbox.sync()
+    return delivered
+
+
+class OutboxWorker(threading.Thread):
+    """
+    Background thread delivering the outbox.
+
+    Runs a delivery pass straight away, then every 'poll_seconds' or as soon
+    as wake() is called. stop() lets the current pass finish, so a worker
+    started and stopped within one run still makes its first pass.
+    With 'properties', only those properties' messages are delivered.
+    'stats' adds up the passes made, their seconds and the emails delivered.
+    """
+
+    def __init__(self, outbox: Outbox, email_cfg: dict = None, poll_seconds: int = 30,
+                 properties: set = None):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.outbox = outbox
+        self.email_cfg = email_cfg
+        self.poll_seconds = poll_seconds
+        self.properties = properties
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self.stats = {"passes": 0, "seconds": 0.0, "delivered": 0}
+
+    def run(self):
+        while True:
+            self._wake.clear()
+            start = perf_counter()
+            try:
+                self.stats["delivered"] += deliver_due(self.outbox, self.email_cfg,
+                                                       properties=self.properties)
+            except Exception:
+                print("❌ Outbox delivery failed:")
+                traceback.print_exc()
+            self.stats["seconds"] += perf_counter() - start
+            self.stats["passes"] += 1
+
+            if self._stopping.is_set():
+                return
+            self._wake.wait(self.poll_seconds)
+            if self._stopping.is_set():
+                return
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = None):
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+
+
+_outbox = None
+_outbox_key = None
+_worker = None
+
+
+def get_outbox(outbox_cfg: dict = None, gcs_default: bool = False) -> Outbox:
+    """
+    Returns the process-wide Outbox for config.yaml's 'outbox' section,
+    reopening it only when the settings change.
+    'gcs_default' decides whether it is copied to GCS when the section's
+    'gcs_snapshot' is unset (run.py: whenever the state itself is in GCS).
+    """
+    global _outbox, _outbox_key
+    cfg = outbox_cfg or {}
+    gcs_snapshot = cfg.get("gcs_snapshot")
+    if gcs_snapshot is None:
+        gcs_snapshot = gcs_default
+    gcs_object = (cfg.get("gcs_object") or "outbox.sqlite3") if gcs_snapshot else None
+    key = json.dumps([cfg, gcs_object], sort_keys=True)
+
+    if _outbox is None or key != _outbox_key:
+        _outbox = Outbox(
+            cfg.get("path") or "state/outbox.sqlite3",
+            max_attempts=cfg.get("max_attempts", 8),
+            backoff_base_seconds=cfg.get("backoff_base_seconds", 60),
+            backoff_max_seconds=cfg.get("backoff_max_seconds", 3600),
+            retention_days=cfg.get("retention_days", 30),
+            gcs_object=gcs_object,
+        )
+        _outbox_key = key
+
+    return _outbox
+
+
+def start_delivery(outbox: Outbox, email_cfg: dict = None, poll_seconds: int = 30,
+                   properties: set = None) -> OutboxWorker:
+    """
+    Wakes the running delivery worker, or starts one.
+    """
+    global _worker
+
+    if _worker is not None and _worker.is_alive() and _worker.outbox is outbox:
+        _worker.email_cfg = email_cfg
+        _worker.properties = properties
+        _worker.wake()
+        return _worker
+
+    if _worker is not None and _worker.is_alive():
+        _worker.stop()
+
+    _worker = OutboxWorker(outbox, email_cfg, poll_seconds, properties)
+    _worker.start()
+    return _worker
+
+
+def stop_delivery(timeout: float = None):
+    """
+    Stops the delivery worker after its current pass.
+    """
+    global _worker
+    if _worker is not None:
+        _worker.stop(timeout)
+        _worker = None
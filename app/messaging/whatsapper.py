@@ -1,47 +1,215 @@
-import requests
-import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+# Statuses worth retrying: rate limited or a server-side problem
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-def send_whatsapp_message(to_number: str, message: str) -> bool:
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows 'rate' acquisitions per second on
+    average, with bursts of up to 'capacity'. acquire() blocks until a
+    token is available.
     """
-    Sends a WhatsApp message via the WhatsApp Cloud API.
-    
-    Args:
-      to_number (str): Recipient phone number in international format (e.g. "+447123456789")
-      message (str): The message body text
 
-    Returns:
-      bool: True if sent successfully, False otherwise
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class WhatsAppClient:
+    """
+    WhatsApp Cloud API client for sending many messages quickly.
+
+    - One pooled requests.Session shared by every send
+    - A token bucket keeps the send rate within the Cloud API quota
+      ('rate_per_second', bursts of 'burst')
+    - 429 and 5xx responses, and failures to connect, are retried up to
+      'max_retries' times with exponential backoff, honouring Retry-After.
+      Other errors (e.g. a read timeout) are not: the POST may already have
+      been accepted, and retrying it would send the message twice
+    - send_batch() sends to many recipients concurrently ('max_workers')
+
+    'base_url' can point at a local stub server for testing.
     """
 
-    # Load from environment variables
-    token = os.getenv("WHATSAPP_ACCESS_TOKEN")
-    phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+    def __init__(self, token: str, phone_number_id: str,
+                 base_url: str = "https://graph.facebook.com/v20.0",
+                 rate_per_second: float = 20, burst: int = 20, max_workers: int = 8,
+                 max_retries: int = 4, backoff_seconds: float = 1.0, timeout: int = 10):
+        # Only loaded when WhatsApp is actually used
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = f"{base_url.rstrip('/')}/{phone_number_id}/messages"
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_per_second, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_workers))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+
+    @classmethod
+    def from_env(cls, whatsapp_cfg: dict = None) -> "WhatsAppClient":
+        """
+        Builds a client from config.yaml's 'whatsapp' section and the
+        WHATSAPP_ACCESS_TOKEN / WHATSAPP_PHONE_NUMBER_ID environment variables.
+        """
+        token = os.getenv("WHATSAPP_ACCESS_TOKEN")
+        phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+
+        if not token or not phone_number_id:
+            raise ValueError("WHATSAPP_ACCESS_TOKEN and WHATSAPP_PHONE_NUMBER_ID must be set")
+
+        return cls(token, phone_number_id, **(whatsapp_cfg or {}))
 
-    if not token or not phone_number_id:
-        raise ValueError("WHATSAPP_ACCESS_TOKEN and WHATSAPP_PHONE_NUMBER_ID must be set")
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_seconds * (2 ** attempt)
 
-    url = f"https://graph.facebook.com/v20.0/{phone_number_id}/messages"
+    def send(self, to_number: str, message: str) -> bool:
+        """
+        Sends one text message.
+        Returns True if sent successfully, False otherwise.
+        """
+        import requests
 
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to_number,
-        "type": "text",
-        "text": {
-            "body": message
+        payload = {
+            "messaging_product": "whatsapp",
+            "to": to_number,
+            "type": "text",
+            "text": {
+                "body": message
+            }
         }
-    }
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                if not _is_connect_error(e) or attempt == self.max_retries:
+                    print(f"WhatsApp send error ({to_number}): {e}")
+                    return False
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code == 200:
+                return True
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                print("WhatsApp send error:", to_number, response.status_code, response.text)
+                return False
+
+            time.sleep(self._retry_delay(attempt, response))
+
+        return False
+
+    def send_batch(self, messages: list) -> list:
+        """
+        Sends many messages concurrently, within the rate limit.
+
+        messages: [(to_number, message), ...]
+        Returns one bool per message, in the same order.
+        """
+        if not messages:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(messages)))) as pool:
+            return list(pool.map(lambda m: self.send(*m), messages))
 
-    response = requests.post(url, headers=headers, json=payload)
+    def close(self):
+        self.session.close()
 
-    if response.status_code == 200:
+
+def _is_connect_error(error) -> bool:
+    """
+    True if the request failed before a connection was made, so the
+    message cannot have been sent.
+    """
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError
+
+    if isinstance(error, requests.ConnectTimeout):
         return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    # requests wraps urllib3's MaxRetryError; NewConnectionError (DNS
+    # failure, connection refused) is a ConnectTimeoutError
+    reason = getattr(error.args[0], "reason", None)
+    return isinstance(reason, ConnectTimeoutError)
+
+
+_client = None
+_client_cfg = None
+_client_lock = threading.Lock()
+
 
-    print("WhatsApp send error:", response.status_code, response.text)
-    return False
+def get_whatsapp_client(whatsapp_cfg: dict = None) -> WhatsAppClient:
+    """
+    Returns the process-wide WhatsAppClient, creating it on first use and
+    rebuilding it when called with a different config.
+    """
+    global _client, _client_cfg
+
+    cfg = dict(whatsapp_cfg or {})
+    with _client_lock:
+        if _client is None or cfg != _client_cfg:
+            if _client is not None:
+                _client.close()
+            _client = WhatsAppClient.from_env(cfg)
+            _client_cfg = cfg
+
+    return _client
+
+
+def send_whatsapp_message(to_number: str, message: str, whatsapp_cfg: dict = None) -> bool:
+    """
+    Sends a WhatsApp message via the WhatsApp Cloud API.
+
+    Args:
+      to_number (str): Recipient phone number in international format (e.g. "+447123456789")
+      message (str): The message body text
+      whatsapp_cfg (dict): config.yaml's 'whatsapp' section
+
+    Returns:
+      bool: True if sent successfully, False otherwise
+    """
+    return get_whatsapp_client(whatsapp_cfg).send(to_number, message)
+
+
+def send_whatsapp_messages(messages: list, whatsapp_cfg: dict = None) -> list:
+    """
+    Sends many WhatsApp messages ([(to_number, message), ...]) concurrently.
+    Returns one bool per message, in the same order.
+    """
+    return get_whatsapp_client(whatsapp_cfg).send_batch(messages)
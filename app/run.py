@@ -1,74 +1,131 @@
-from config.utils import load_config, merge_bookings
-from calendars.fetch_calendars import fetch_calendar
-from calendars.parse_ical import parse_ical
-from utils.save_ics_index import append_ics_index
-from schedule.generate_schedule import detect_changeovers, save_schedule_csv
-from schedule.generate_ics import save_schedule_ics, upload_to_gcs
-from schedule.state_manager import load_previous_state, save_state
-from schedule.diff_events import diff_events
+from config.utils import load_config
+from calendars.fetch_calendars import fetch_all_calendars
+from calendars.poll_planner import PollPlanner
+from utils.save_ics_index import write_ics_index
+from schedule.generate_schedule import save_schedule_csv
+from schedule.pipeline import build_all_tasks, processing_horizon
+from schedule.generate_ics import save_schedule_ics, public_url_for
+from schedule.publisher import (
+    load_manifest, save_manifest, update_manifest, publish_file, publish_index,
+    shard_manifest_object, publish_index_fragment, merge_index_fragments
+)
+from schedule.sharding import (
+    parse_shard, select_shard, shard_tag, shard_state_config, tick_id, claim_properties,
+    CLAIM_SHARD
+)
+from schedule.state_manager import (
+    configure_state_backend, load_previous_states, save_state_changes, archive_events
+)
+from utils.gcs import run_transfers
+from schedule.diff_events import diff_events, first_change_between
+from schedule.event_index import EventIndex
+from utils.fingerprint import property_fingerprint
+from utils.metrics import RunMetrics, write_metrics
 
 from messaging.message_builder import build_weekly_message, build_change_message
 
-from datetime import datetime, timezone, timedelta
+import argparse
+import json
+import os
+import socket
+from datetime import datetime, time, timezone, timedelta
 from zoneinfo import ZoneInfo
 
-from messaging.emailer import send_email
-
-open("ics_index.txt", "w").close()   # clear the file for fresh run
+from messaging.emailer import recipients_for
+from messaging.outbox import get_outbox, start_delivery, stop_delivery
 
 
 def event_dt(e):
-    """Convert event dict to datetime object in UK timezone."""
-    return datetime.strptime(e["date"], "%d/%m/%Y").replace(
-        tzinfo=ZoneInfo("Europe/London")
-    )
+    """Convert an Event to a datetime (midnight of its date) in UK timezone."""
+    return datetime.combine(e.date, time(), tzinfo=ZoneInfo("Europe/London"))
+
+
+def cutoff_window(now_uk, cutoff):
+    """
+    Returns the (first, last) event dates, both inclusive, whose midnight
+    falls in the window now_uk <= event_dt(e) < cutoff.
+    """
+    tz = ZoneInfo("Europe/London")
+
+    first = now_uk.date()
+    if datetime.combine(first, time(), tzinfo=tz) < now_uk:
+        first += timedelta(days=1)
+
+    last = cutoff.date()
+    if datetime.combine(last, time(), tzinfo=tz) >= cutoff:
+        last -= timedelta(days=1)
+
+    return first, last
 
 
-def change_before_cutoff(diff, cutoff, now_uk):
+def change_before_cutoff(diff, cutoff, now_uk, index=None, old_index=None):
     """
     Check if any changes exist that fall within the window: now -> cutoff.
     Returns True if there are any added/removed/changed events in this window.
+
+    index: EventIndex of the new events. Added/changed events are then looked
+    up in the window slice instead of scanning the whole diff.
+    old_index: EventIndex of the old events. With both indexes the two window
+    slices are merge-joined and the check stops at the first difference.
     """
-    # Check added events
-    for e in diff["added"].values():
-        if now_uk <= event_dt(e) < cutoff:
-            return True
-    
-    # Check removed events
+    first, last = cutoff_window(now_uk, cutoff)
+
+    if index is not None and old_index is not None:
+        return first_change_between(
+            old_index.between(first, last), index.between(first, last), first, last
+        ) is not None
+
+    # Check added & changed events
+    if index is not None:
+        for event_id, _ in index.between(first, last):
+            if event_id in diff["added"] or event_id in diff["changed"]:
+                return True
+    else:
+        for e in diff["added"].values():
+            if first <= e.date <= last:
+                return True
+        for c in diff["changed"].values():
+            if first <= c["new"].date <= last:
+                return True
+
+    # Check removed events (no longer in the new events, so not in the index)
     for e in diff["removed"].values():
-        if now_uk <= event_dt(e) < cutoff:
-            return True
-    
-    # Check changed events
-    for c in diff["changed"].values():
-        if now_uk <= event_dt(c["new"]) < cutoff:
+        if first <= e.date <= last:
             return True
-    
+
     return False
 
 
-def filter_diff_by_cutoff(diff, cutoff, now_uk):
+def filter_diff_by_cutoff(diff, cutoff, now_uk, index=None):
     """
     Filter the diff to only include changes that happen between now and cutoff.
     This ensures we only report on changes relevant to the current week.
+
+    index: EventIndex of the new events (see change_before_cutoff).
     """
     filtered = {"added": {}, "removed": {}, "changed": {}, "unchanged": {}}
-
-    # Filter added events
-    for k, e in diff["added"].items():
-        if now_uk <= event_dt(e) < cutoff:
-            filtered["added"][k] = e
+    first, last = cutoff_window(now_uk, cutoff)
+
+    # Filter added & changed events, in date order when the index is available
+    if index is not None:
+        for k, _ in index.between(first, last):
+            if k in diff["added"]:
+                filtered["added"][k] = diff["added"][k]
+            elif k in diff["changed"]:
+                filtered["changed"][k] = diff["changed"][k]
+    else:
+        for k, e in diff["added"].items():
+            if first <= e.date <= last:
+                filtered["added"][k] = e
+        for k, c in diff["changed"].items():
+            if first <= c["new"].date <= last:
+                filtered["changed"][k] = c
 
     # Filter removed events
     for k, e in diff["removed"].items():
-        if now_uk <= event_dt(e) < cutoff:
+        if first <= e.date <= last:
             filtered["removed"][k] = e
 
-    # Filter changed events
-    for k, c in diff["changed"].items():
-        if now_uk <= event_dt(c["new"]) < cutoff:
-            filtered["changed"][k] = c
-
     return filtered
 
 
@@ -86,6 +143,18 @@ def same_week(ts_iso: str, now: datetime) -> bool:
     return ts.isocalendar()[:2] == now.isocalendar()[:2]
 
 
+def in_weekly_summary_window(now_uk):
+    """
+    True on Sunday between 14:00 and 14:09 UK.
+    This narrow window matches the 10-minute cron schedule.
+    """
+    return (
+        now_uk.weekday() == 6 and  # Sunday
+        now_uk.hour == 14 and      # 2 PM hour
+        now_uk.minute < 10         # First 10 minutes only
+    )
+
+
 def calculate_next_sunday_cutoff(now_uk):
     """
     Calculate the next Sunday at 14:00 UK time from now.
@@ -114,12 +183,221 @@ def calculate_next_sunday_cutoff(now_uk):
     return cutoff
 
 
-def main():
-    config = load_config()
-
-    for prop in config["properties"]:
+def main(config=None, now_utc=None, weekly_summary=None, cache_state=False,
+         keep_delivery_worker=False, properties=None, shard=None, index_fragment=None,
+         profile=False):
+    """
+    Runs one tick of the pipeline for every property.
+
+    config: parsed config.yaml (loaded from disk if not given)
+    now_utc: time of the tick (defaults to now)
+    weekly_summary: True/False to say whether this is the Sunday summary
+        tick; None uses the cron window (Sunday 14:00-14:09 UK)
+    cache_state: keep property state in memory between ticks (daemon mode)
+    keep_delivery_worker: leave the email delivery worker running after
+        the tick (daemon mode) instead of waiting for it to finish
+    properties: only process these entries of config["properties"] (sharded runs)
+    shard: tag of a sharded run (CLAIM_SHARD for every work-claiming
+        worker); it gets its own manifest and metrics files, and with the
+        sqlite backend its own state database. The ICS index is then written
+        as a fragment ('index_fragment', default: the shard tag) for
+        merge_index_fragments() instead of as all_ics_links.txt.
+    profile: profile every stage of the run and of each property with
+        cProfile and tracemalloc (see utils.profiling); the reports go to
+        config.yaml's profiling.output_dir
+    """
+    if config is None:
+        config = load_config()
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    if properties is None:
+        properties = config["properties"]
+
+    # Stage timings and counters, written as a run report and Prometheus textfile
+    metrics = RunMetrics(now_utc, shard)
+    if not profile:
+        return run_pipeline(config, now_utc, weekly_summary, cache_state, keep_delivery_worker,
+                            properties, shard, index_fragment, metrics)
+
+    # Only loaded for profiled runs, so other runs pay nothing for it
+    from utils.profiling import RunProfiler
+
+    profiling_cfg = config.get("profiling") or {}
+    metrics.profiler = RunProfiler(
+        profiling_cfg.get("output_dir", "profiles"),
+        top_properties=profiling_cfg.get("top_properties", 20),
+        top_allocations=profiling_cfg.get("top_allocations", 25),
+        trace_memory=profiling_cfg.get("trace_memory", True),
+    )
+    try:
+        return run_pipeline(config, now_utc, weekly_summary, cache_state, keep_delivery_worker,
+                     properties, shard, index_fragment, metrics)
+    finally:
+        # Also written when the run failed: a failing slow tick is worth a look
+        tag = index_fragment or shard
+        label = now_utc.strftime("%Y%m%dT%H%M%S") + (f"-{tag}" if tag else "")
+        profile_dir = metrics.profiler.write(label)
+        metrics.profiler.close()
+        print(f"  → Profile written to {profile_dir}")
+
+
+def run_pipeline(config: dict, now_utc: datetime, weekly_summary, cache_state: bool,
+                 keep_delivery_worker: bool, properties: list, shard, index_fragment,
+                 metrics: RunMetrics):
+    """
+    The body of main(): one tick over 'properties', timed into 'metrics'.
+    """
+    fetch_cfg = config.get("fetch") or {}
+    parse_backend = (config.get("parse") or {}).get("backend", "icalendar")
+    tick_uk = now_utc.astimezone(ZoneInfo("Europe/London"))
+
+    # Load previous states (also used to plan which feeds to poll)
+    storage_workers = (config.get("storage") or {}).get("max_workers", 8)
+    state_cfg = shard_state_config(config.get("state"), shard)
+    with metrics.timer("state_load"):
+        configure_state_backend(state_cfg, max_workers=storage_workers, cache=cache_state)
+        prev_states = load_previous_states([prop["name"] for prop in properties])
+
+    # Each remote feed has its own next-poll time; feeds that are not due are
+    # served from the on-disk cache. The weekly summary always polls everything.
+    planner = PollPlanner(config.get("polling"))
+    weekly_tick = weekly_summary if weekly_summary is not None else in_weekly_summary_window(tick_uk)
+    urgent = {
+        prop["name"]: planner.has_upcoming_task(prev_states[prop["name"]].get("events", {}), tick_uk)
+        for prop in properties
+    }
+    not_due = set() if weekly_tick else {
+        cal
+        for prop in properties
+        for cal in prop["calendars"]
+        if not planner.is_due(cal, now_utc, urgent[prop["name"]])
+    }
+
+    # Download every calendar of every property up front, concurrently
+    print("Fetching calendars...")
+    with metrics.timer("fetch"):
+        fetched_calendars = fetch_all_calendars(
+            properties,
+            max_workers=fetch_cfg.get("max_workers", 8),
+            cache_dir=fetch_cfg.get("cache_dir"),
+            not_due=not_due,
+        )
+    skipped = 0
+    stale = 0
+    # Properties with a feed that failed and has no cached copy are left
+    # as they are this tick (state, ICS and emails) and retried next tick
+    failed_properties = set()
+    for prop in properties:
+        for cal, fetched in zip(prop["calendars"], fetched_calendars[prop["name"]]):
+            metrics.record("fetch", fetched["seconds"], prop["name"], run_total=False)
+            metrics.add("bytes_fetched", fetched["bytes"], prop["name"])
+            metrics.add("cache_hits", int(fetched["cache_hit"]), prop["name"])
+            if fetched.get("error"):
+                metrics.add("feeds_failed", 1, prop["name"])
+                if fetched["text"] is None:
+                    failed_properties.add(prop["name"])
+                    print(f"  ❌ {prop['name']}: could not fetch {cal} ({fetched['error']})")
+                else:
+                    stale += 1
+                    print(f"  ⚠️  {prop['name']}: could not fetch {cal} ({fetched['error']}), using cached copy")
+            elif fetched.get("skipped"):
+                skipped += 1
+            else:
+                planner.record(cal, fetched["text"], now_utc, urgent[prop["name"]])
+    cache_hits = sum(r["cache_hit"] for results in fetched_calendars.values() for r in results)
+    print(f"  → {skipped} calendar(s) not due for polling, served from cache.")
+    print(f"  → {cache_hits - skipped - stale} calendar(s) unchanged since last fetch (HTTP 304).")
+    if failed_properties:
+        print(f"  → {len(failed_properties)} property(ies) skipped this run: a calendar could not be fetched.")
+
+    # Only bookings/events inside the processing horizon are worked on
+    horizon_cfg = config.get("horizon") or {}
+    horizon = processing_horizon(horizon_cfg, tick_uk.date())
+    if horizon:
+        print(f"  → Processing horizon: {horizon[0]} → {horizon[1]}")
+
+    # Fingerprint the raw calendars + config entry.
+    # If nothing changed since the stored state, the tasks/CSV/ICS would
+    # come out identical and the property does not need rebuilding.
+    fingerprints = {
+        prop["name"]: property_fingerprint(
+            prop,
+            [fetched["text"] for fetched in fetched_calendars[prop["name"]]],
+            settings={
+                "merge": config.get("merge"),
+                # The horizon moves daily, so every property is rebuilt once a day
+                "horizon": [d.isoformat() for d in horizon] if horizon else None,
+            },
+        )
+        for prop in properties
+        if prop["name"] not in failed_properties
+    }
+
+    to_rebuild = [
+        prop for prop in properties
+        if prop["name"] in fingerprints
+        and prev_states[prop["name"]].get("fingerprint") != fingerprints[prop["name"]]
+    ]
+
+    # Parse + merge + detect changeovers (CPU only), optionally in a process pool
+    processing_cfg = config.get("processing") or {}
+    build_jobs = [
+        (
+            prop["name"],
+            prop.get("cleaners", []),
+            [fetched["text"] for fetched in fetched_calendars[prop["name"]]],
+            parse_backend,
+            config.get("merge"),
+            horizon,
+        )
+        for prop in to_rebuild
+    ]
+    build_timings = []
+    with metrics.timer("build"):
+        if metrics.profiler is None:
+            built_tasks = build_all_tasks(
+                build_jobs,
+                mode=processing_cfg.get("mode", "serial"),
+                max_workers=processing_cfg.get("max_workers"),
+                timings=build_timings,
+            )
+        else:
+            # Profiled runs build one property at a time in this process,
+            # so each property's parse/merge/detect gets its own profile
+            built_tasks = []
+            for prop, job in zip(to_rebuild, build_jobs):
+                with metrics.profiler.scope("build", prop["name"]):
+                    built_tasks += build_all_tasks([job], timings=build_timings)
+    tasks_by_property = {
+        prop["name"]: tasks for prop, tasks in zip(to_rebuild, built_tasks)
+    }
+    # Parse / merge / detect per property (summed over worker processes for the run)
+    for prop, timings in zip(to_rebuild, build_timings):
+        for stage, seconds in timings.items():
+            metrics.record(stage, seconds, prop["name"])
+        metrics.add("rebuilt", 1, prop["name"])
+
+    # Manifest of what is already published (content hash + URL per ICS)
+    manifest_object = shard_manifest_object(shard) if shard else None
+    manifest = load_manifest(manifest_object) if shard else load_manifest()
+    published_manifest = json.dumps(manifest, sort_keys=True)
+
+    # Emails go through a durable outbox, delivered in the background
+    # independently of the state (see messaging.outbox). It has its own GCS
+    # copy whenever the state is kept in GCS, synced on its own schedule.
+    state_in_gcs = state_cfg.get("backend", "gcs") == "gcs" or bool(state_cfg.get("gcs_snapshot"))
+    outbox = get_outbox(config.get("outbox"), gcs_default=state_in_gcs)
+    outbox.refresh()
+    email_cfg = config.get("email") or {}
+    queued_emails = 0
+
+    # ICS uploads and state saves are queued and sent together at the end
+    pending_uploads = []
+    index_entries = []
+    state_changes = {}
+
+    for prop in properties:
         name = prop["name"]
-        calendars = prop["calendars"]
         cleaners = prop.get("cleaners", [])
         pmc = prop.get("property_management_company")
 
@@ -127,59 +405,77 @@ def main():
         print(f"Processing property: {name}")
         print(f"{'='*60}")
 
-        # Fetch & parse each calendar
-        bookings_lists = []
-        for cal in calendars:
-            raw_ical = fetch_calendar(cal)
-            bookings = parse_ical(raw_ical)
-            bookings_lists.append(bookings)
+        safe_name = name.replace(" ", "")
+        csv_filename = f"{safe_name}.csv"
+        ics_filename = f"{safe_name}.ics"
 
-        # Merge into single list
-        merged_bookings = merge_bookings(bookings_lists)
+        if name in failed_properties:
+            print("  ⚠️  A calendar could not be fetched. Keeping the published schedule and state.")
+            published = manifest["objects"].get(ics_filename)
+            index_entries.append((pmc, name, published["url"] if published else public_url_for(ics_filename)))
+            continue
 
-        # Detect cleaning tasks
-        tasks = detect_changeovers(merged_bookings, name, cleaners)
-        print(f"  → {len(tasks)} cleaning tasks found.")
+        prev_state = prev_states[name]
+        old_events = prev_state.get("events", {})
+        fingerprint = fingerprints[name]
+        inputs_unchanged = name not in tasks_by_property
 
-        # Save CSV file for the property
-        safe_name = name.replace(" ", "")
-        csv_filename = f"{safe_name}.csv"
-        save_schedule_csv(tasks, path=csv_filename)
-        print(f"  → Saved CSV: {csv_filename}")
+        if inputs_unchanged:
+            print("  → Calendars and config unchanged. Skipping rebuild.")
+            new_events = old_events
+            published = manifest["objects"].get(ics_filename)
+            public_url = published["url"] if published else public_url_for(ics_filename)
 
-        # Save ICS file for the property
-        ics_filename = f"{safe_name}.ics"
-        public_url = save_schedule_ics(tasks, name, path=ics_filename, cleaners=cleaners)
-        append_ics_index(
-            company=prop["property_management_company"],
-            property_name=prop["name"],
-            public_url=public_url
-        )
-        print(f"  → Saved ICS: {ics_filename}")
+        else:
+            tasks = tasks_by_property[name]
+            print(f"  → {len(tasks)} cleaning tasks found.")
+
+            # Save CSV file for the property
+            with metrics.timer("csv", name):
+                save_schedule_csv(tasks, path=csv_filename)
+            print(f"  → Saved CSV: {csv_filename}")
+
+            # Save ICS file for the property
+            with metrics.timer("ics", name):
+                public_url = save_schedule_ics(
+                    tasks, name, path=ics_filename, cleaners=cleaners, upload=False
+                )
+            # Uploaded at the end only if its bytes differ from the published copy
+            pending_uploads.append((
+                metrics.timed(publish_file, "upload", name, run_total=False),
+                manifest, name, ics_filename, ics_filename,
+            ))
+            print(f"  → Saved ICS: {ics_filename}")
+
+            # Build dictionary of new events keyed by ID
+            new_events = {t.event_id(): t.to_event() for t in tasks}
+
+        index_entries.append((prop["property_management_company"], prop["name"], public_url))
 
         # -----------------------------------------------------------
         # EMAIL LOGIC
         # -----------------------------------------------------------
 
-        # Build dictionary of new events keyed by ID
-        new_events = {
-            f"{name}-{t['date']}": {
-                "date": t["date"],
-                "type": t["type"],
-                "assigned_cleaner": t["assigned_cleaner"]
-            }
-            for t in tasks
-        }
-
-        # Load previous state from GCS
-        prev_state = load_previous_state(name)
-        old_events = prev_state.get("events", {})
-
-        # Diff old vs new to detect changes
-        diff = diff_events(old_events, new_events)
-
-        # Get current UK time
-        now_utc = datetime.now(timezone.utc)
+        # Diff old vs new to detect changes (unchanged events are only counted)
+        with metrics.timer("diff", name):
+            diff = diff_events(old_events, new_events, include_unchanged=False)
+        metrics.add("events", len(new_events), name)
+        metrics.add("changes", len(diff["added"]) + len(diff["removed"]) + len(diff["changed"]), name)
+
+        # Events that fell out of the horizon show up as removed; they are
+        # in the past, so they never trigger a message, only get pruned
+        if horizon:
+            expired = {k: e for k, e in diff["removed"].items() if e.date < horizon[0]}
+            if expired:
+                print(f"  → Pruning {len(expired)} expired event(s) from state")
+                if horizon_cfg.get("archive_expired"):
+                    archive_events(name, expired, horizon_cfg.get("archive_path", "state/archive.jsonl"))
+
+        # Date-sorted index shared by the cutoff checks and message builders
+        index = EventIndex(new_events)
+        old_index = EventIndex(old_events)
+
+        # Current UK time (the tick's time)
         now_uk = now_utc.astimezone(ZoneInfo("Europe/London"))
 
         # ===== TESTING OVERRIDE (uncomment to simulate specific times) =====
@@ -195,13 +491,12 @@ def main():
         cutoff = calculate_next_sunday_cutoff(now_uk)
         print(f"  → Cutoff time (next Sunday 14:00): {cutoff.strftime('%A %d %b %Y, %H:%M')}")
 
-        # Check if it's Sunday summary time (Sunday between 14:00-14:09)
-        # This narrow window matches the 10-minute cron schedule
-        is_sunday_summary = (
-            now_uk.weekday() == 6 and  # Sunday
-            now_uk.hour == 14 and      # 2 PM hour
-            now_uk.minute < 10         # First 10 minutes only
-        )
+        # Check if it's Sunday summary time.
+        # The daemon triggers the 14:00 slot itself and says so explicitly.
+        if weekly_summary is not None:
+            is_sunday_summary = weekly_summary
+        else:
+            is_sunday_summary = in_weekly_summary_window(now_uk)
 
         print(f"  → Is Sunday summary time? {is_sunday_summary}")
 
@@ -210,7 +505,7 @@ def main():
         print(f"  → Changes detected? {changes_exist}")
 
         # Check if changes are relevant (happen before cutoff)
-        changes_before_cutoff = change_before_cutoff(diff, cutoff, now_uk)
+        changes_before_cutoff = change_before_cutoff(diff, cutoff, now_uk, index, old_index)
         print(f"  → Changes before cutoff? {changes_before_cutoff}")
 
         # -----------------------------------------------------------
@@ -218,8 +513,8 @@ def main():
         # -----------------------------------------------------------
 
         # Weekly summary – must only be sent ONCE per week
-        last_full = prev_state.get("last_full_message")
-        already_sent_weekly = last_full and same_week(last_full, now_uk)
+        last_full_message = prev_state.get("last_full_message")
+        already_sent_weekly = last_full_message and same_week(last_full_message, now_uk)
 
         should_send_weekly = is_sunday_summary and not already_sent_weekly
         should_send_change = (
@@ -238,41 +533,49 @@ def main():
         # -----------------------------------------------------------
 
         if should_send_email:
-            if is_sunday_summary:
-                # Build weekly summary for next 7 days
-                message = build_weekly_message(name, new_events)
-                message_type = "WEEKLY SUMMARY"
-            else:
-                # Build change message with remaining week schedule + changes
-                filtered_diff = filter_diff_by_cutoff(diff, cutoff, now_uk)
-                message = build_change_message(name, new_events, filtered_diff)
-                message_type = "CHANGE NOTIFICATION"
+            with metrics.timer("message_build", name):
+                if is_sunday_summary:
+                    # Build weekly summary for next 7 days
+                    message = build_weekly_message(name, new_events, index, now_uk)
+                    message_type = "WEEKLY SUMMARY"
+                else:
+                    # Build change message with remaining week schedule + changes
+                    filtered_diff = filter_diff_by_cutoff(diff, cutoff, now_uk, index)
+                    message = build_change_message(name, new_events, filtered_diff, index, now_uk)
+                    message_type = "CHANGE NOTIFICATION"
 
             print(f"\n--- {message_type} Message ---")
             print(message)
             print("---" + "-" * len(message_type) + "-----------")
 
             # -----------------------------------------------------------
-            # SEND EMAIL
+            # QUEUE EMAIL
             # -----------------------------------------------------------
 
-            print(f"\n📨 Attempting to send email...")
-            
-            try:
-                subject = f"Cleaning Update – {name}"
-                send_email(subject, message)
-                print("✅ Email sent successfully!")
+            # The outbox retries failed sends on its own, so the state is
+            # saved either way. The key stops a message being queued twice:
+            # a change is keyed by the revision of the state it moves away
+            # from, which only moves when a state is saved. A tick that
+            # fails before saving is redone under the same key, but the
+            # same message coming back later (booking added, cancelled,
+            # re-added) is not deduplicated.
+            if is_sunday_summary:
+                year, week, _ = now_uk.isocalendar()
+                key = f"weekly:{name}:{year}-W{week:02d}"
+            else:
+                key = f"change:{name}:{prev_state.get('revision', 0)}"
 
-                # Only update state after successful send
-                if should_send_weekly:
-                    prev_state["last_full_message"] = now_utc.isoformat()
-                    print("  → Marked weekly summary as sent")
+            if outbox.enqueue(key, name, recipients_for(prop, email_cfg),
+                              f"Cleaning Update – {name}", message):
+                queued_emails += 1
+                metrics.add("emails_queued", 1, name)
+                print("\n📨 Email queued for delivery")
+            else:
+                print("\n📨 Email already queued")
 
-            except Exception as e:
-                print(f"❌ Email send failed: {str(e)}")
-                print("  → State NOT saved. Will retry next run.")
-                # Don't save state, so we retry next time
-                continue
+            if should_send_weekly:
+                last_full_message = now_utc.isoformat()
+                print("  → Marked weekly summary as sent")
 
         else:
             print(f"\n⏭️  No email needed this run.")
@@ -290,21 +593,159 @@ def main():
         # SAVE STATE
         # -----------------------------------------------------------
 
-        # Save updated state back to GCS
+        # Queue the new state; only what differs from prev_state gets written
         new_state = {
             "events": new_events,
-            "last_full_message": prev_state.get("last_full_message")
+            "last_full_message": last_full_message,
+            "fingerprint": fingerprint,
         }
-        save_state(name, new_state)
-        print(f"  → State saved for {name}")
+        state_changes[name] = (prev_state, new_state, diff)
 
     print(f"\n{'='*60}")
     print("All properties processed.")
     print(f"{'='*60}\n")
-    
-    # Upload index of all ICS files
-    upload_to_gcs("ics_index.txt", "cleaning-scheduler-bucket", "all_ics_links.txt")
+
+    # Deliver queued emails (and due retries) in the background while
+    # the ICS files and state are saved. The queue reaches GCS before the
+    # state does, so a state that says "sent" always has its email queued.
+    print(f"📨 {queued_emails} email(s) queued this run.")
+    outbox.sync()
+    # Sharded runs only deliver their own properties' emails, so workers
+    # sharing the outbox never send the same one
+    worker = start_delivery(outbox, email_cfg,
+                            properties={prop["name"] for prop in properties} if shard else None)
+    delivery_before = dict(worker.stats)
+
+    try:
+        # Upload changed ICS files together. This happens before state is saved,
+        # so a failed upload is retried next run instead of being skipped.
+        print(f"Uploading {len(pending_uploads)} ICS file(s) to GCS if changed...")
+        with metrics.timer("upload"):
+            uploaded = run_transfers(pending_uploads, max_workers=storage_workers)
+        for job, was_uploaded in zip(pending_uploads, uploaded):
+            if was_uploaded:
+                metrics.add("bytes_uploaded", os.path.getsize(job[3]), job[2])
+        ics_uploaded = sum(uploaded)
+        metrics.add("ics_uploaded", ics_uploaded)
+        print(f"  → {ics_uploaded} ICS file(s) changed and uploaded.")
+
+        # Save every changed property's state in one go, skipping unchanged ones
+        with metrics.timer("state_save"):
+            written = save_state_changes(state_changes)
+        metrics.add("states_written", written)
+        print(f"  → State written for {written} of {len(state_changes)} property(ies).")
+
+        with metrics.timer("index"):
+            if shard:
+                # The merge step (run.py --merge-index) builds all_ics_links.txt
+                publish_index_fragment(index_fragment or shard, index_entries)
+                print(f"  → ICS index fragment '{index_fragment or shard}' uploaded.")
+            else:
+                # Rewrite the index of all ICS files only when an entry changed
+                index_text = write_ics_index(index_entries)
+                index_uploaded = publish_index(manifest, index_text)
+                print(f"  → ICS index {'uploaded' if index_uploaded else 'unchanged'}.")
+
+        if shard:
+            # Only this run's entries are saved: claiming workers share the manifest
+            published_objects = json.loads(published_manifest)["objects"]
+            changed = {
+                object_name: entry for object_name, entry in manifest["objects"].items()
+                if published_objects.get(object_name) != entry
+            }
+            if changed:
+                update_manifest(changed, manifest_object)
+        elif json.dumps(manifest, sort_keys=True) != published_manifest:
+            save_manifest(manifest)
+
+        planner.save()
+    finally:
+        if not keep_delivery_worker:
+            # Wait for this run's delivery pass, also when the tick failed, so
+            # no send is cut off; failures stay queued for a later run
+            stop_delivery()
+
+    counts = outbox.counts()
+    if counts.get("pending") or counts.get("dead"):
+        print(f"  → Outbox: {counts.get('pending', 0)} email(s) pending retry, "
+              f"{counts.get('dead', 0)} dead-lettered.")
+
+    # Delivery passes finished during this run (in daemon mode this tick's
+    # pass may still be running; it then counts towards the next tick)
+    metrics.record("send", worker.stats["seconds"] - delivery_before["seconds"])
+    metrics.add("emails_sent", worker.stats["delivered"] - delivery_before["delivered"])
+    metrics.add("properties", len(properties))
+    metrics.add("feeds_skipped", skipped)
+    metrics.add("properties_failed", len(failed_properties))
+
+    metrics.finish()
+    write_metrics(metrics, config.get("metrics"))
+    print(f"  → Run took {metrics.duration_seconds:.1f}s.")
+
+
+def run_claiming(config: dict, worker_id: str, profile: bool = False):
+    """
+    Work-claiming mode: claims batches of unprocessed properties for this
+    tick (see sharding.claim_properties) and runs them, until none are left
+    or the claim deadline passes. Any number of workers can run this at once.
+    """
+    if (config.get("state") or {}).get("backend", "gcs") != "gcs":
+        raise ValueError(
+            "Work-claiming mode needs state.backend 'gcs': properties move between "
+            "workers, so their state must live in per-property blobs"
+        )
+
+    sharding_cfg = config.get("sharding") or {}
+    storage_workers = (config.get("storage") or {}).get("max_workers", 8)
+    started = datetime.now(timezone.utc)
+    tick = tick_id(started, (config.get("daemon") or {}).get("interval_minutes", 10))
+    deadline = started + timedelta(seconds=sharding_cfg.get("claim_deadline_seconds", 540))
+
+    batch = 0
+    while datetime.now(timezone.utc) < deadline:
+        claimed = claim_properties(
+            config["properties"], tick, worker_id,
+            limit=sharding_cfg.get("claim_batch", 25),
+            max_workers=storage_workers,
+        )
+        if not claimed:
+            break
+
+        print(f"Worker {worker_id} claimed {len(claimed)} property(ies) (batch {batch})")
+        main(config, now_utc=started, properties=claimed, shard=CLAIM_SHARD,
+             index_fragment=f"{tick}-{worker_id}-{batch}", profile=profile)
+        batch += 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cleaning scheduler: one run over the properties")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--shard", metavar="i/N",
+                      help="only process shard i of N (properties split by a hash of their id)")
+    mode.add_argument("--claim", action="store_true",
+                      help="work-claiming mode: claim and process batches of properties until none are left")
+    mode.add_argument("--merge-index", action="store_true",
+                      help="build all_ics_links.txt from the sharded runs' index fragments")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="name of this worker in --claim mode")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile CPU and memory per stage and property (see config.yaml 'profiling')")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+
+    if args.shard:
+        index, count = parse_shard(args.shard)
+        config = load_config()
+        main(config, properties=select_shard(config["properties"], index, count),
+             shard=shard_tag(index, count), profile=args.profile)
+    elif args.claim:
+        run_claiming(load_config(), args.worker_id, args.profile)
+    elif args.merge_index:
+        config = load_config()
+        uploaded = merge_index_fragments(config["properties"])
+        print(f"ICS index {'uploaded' if uploaded else 'unchanged'}.")
+    else:
+        main(profile=args.profile)
\ No newline at end of file
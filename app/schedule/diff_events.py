@@ -1,39 +1,136 @@
-def diff_events(old_events: dict, new_events: dict) -> dict:
+from datetime import date
+from typing import Iterator, Optional, Sequence, Tuple
+
+from config.data_models import Event
+
+# Bits of a changed event's "fields" mask
+TYPE_CHANGED = 1
+CLEANER_CHANGED = 2
+DATE_CHANGED = 4
+
+
+def change_mask(old: Event, new: Event) -> int:
+    """
+    Returns which fields differ between two versions of an event
+    (TYPE_CHANGED | CLEANER_CHANGED | DATE_CHANGED), 0 if none.
+    Covers every field of Event, so 0 means the two are equal.
+    """
+    mask = 0
+    if old.type != new.type:
+        mask |= TYPE_CHANGED
+    if old.assigned_cleaner != new.assigned_cleaner:
+        mask |= CLEANER_CHANGED
+    if old.date != new.date:
+        mask |= DATE_CHANGED
+    return mask
+
+
+def _merge_join(old_items: Sequence, new_items: Sequence, key) -> Iterator[Tuple]:
+    """
+    Walks two sequences sorted by 'key' side by side.
+    Yields (old item, new item) pairs, with None for a side missing the key.
+    """
+    i = j = 0
+    n_old, n_new = len(old_items), len(new_items)
+
+    while i < n_old and j < n_new:
+        k_old, k_new = key(old_items[i]), key(new_items[j])
+        if k_old == k_new:
+            yield old_items[i], new_items[j]
+            i += 1
+            j += 1
+        elif k_old < k_new:
+            yield old_items[i], None
+            i += 1
+        else:
+            yield None, new_items[j]
+            j += 1
+
+    for k in range(i, n_old):
+        yield old_items[k], None
+    for k in range(j, n_new):
+        yield None, new_items[k]
+
+
+def diff_events(old_events: dict, new_events: dict, include_unchanged: bool = True) -> dict:
     """
     Compares old and new event dictionaries.
     Returns a dictionary describing added, removed, changed, and unchanged events.
 
-    old_events: { id: { date, type, assigned_cleaner } }
-    new_events: { id: { date, type, assigned_cleaner } }
-    """
+    old_events: { id: Event }
+    new_events: { id: Event }
 
+    Changed entries are { old, new, fields } where 'fields' is a change_mask.
+    Pass include_unchanged=False to only count unchanged events
+    ('unchanged_count') instead of copying them.
+    """
     added = {}
     removed = {}
     changed = {}
-    unchanged = {}
+    unchanged = {} if include_unchanged else None
+    unchanged_count = 0
 
-    # Check for added & changed
+    # Check for added & changed. The mask compares every field of an Event,
+    # so it doubles as the equality test (change_mask inlined: this loop
+    # runs once per event of every rebuilt property)
     for event_id, new_data in new_events.items():
-        if event_id not in old_events:
+        old_data = old_events.get(event_id)
+        if old_data is None:
             added[event_id] = new_data
+            continue
+
+        if old_data is new_data:
+            fields = 0
         else:
-            old_data = old_events[event_id]
-            if old_data == new_data:
+            fields = (
+                (old_data.type != new_data.type and TYPE_CHANGED)
+                | (old_data.assigned_cleaner != new_data.assigned_cleaner and CLEANER_CHANGED)
+                | (old_data.date != new_data.date and DATE_CHANGED)
+            )
+        if not fields:
+            unchanged_count += 1
+            if include_unchanged:
                 unchanged[event_id] = new_data
-            else:
-                changed[event_id] = {
-                    "old": old_data,
-                    "new": new_data
-                }
-
-    # Check for removed
-    for event_id, old_data in old_events.items():
-        if event_id not in new_events:
-            removed[event_id] = old_data
-
-    return {
+        else:
+            changed[event_id] = {
+                "old": old_data,
+                "new": new_data,
+                "fields": fields,
+            }
+
+    # Check for removed (only needed if some old event went unmatched)
+    if len(new_events) - len(added) < len(old_events):
+        for event_id, old_data in old_events.items():
+            if event_id not in new_events:
+                removed[event_id] = old_data
+
+    diff = {
         "added": added,
         "removed": removed,
         "changed": changed,
-        "unchanged": unchanged
+        "unchanged_count": unchanged_count,
     }
+    if include_unchanged:
+        diff["unchanged"] = unchanged
+    return diff
+
+
+def first_change_between(old_items: Sequence, new_items: Sequence,
+                         first: date, last: date) -> Optional[Tuple]:
+    """
+    Finds the first difference between two event sequences within first..last.
+
+    Both sequences are (event id, Event) pairs sorted by (date, id), e.g.
+    EventIndex.between() slices. Returns the first differing
+    (old item, new item) pair, with None for a missing side, or None if the
+    window is unchanged. Stops at the first difference.
+    """
+    def in_window(items):
+        return [item for item in items if first <= item[1].date <= last]
+
+    for old, new in _merge_join(in_window(old_items), in_window(new_items),
+                                key=lambda item: (item[1].date, item[0])):
+        if old is None or new is None or old[1] != new[1]:
+            return old, new
+
+    return None
@@ -0,0 +1,38 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import List, Tuple
+
+from config.data_models import Event
+
+
+class EventIndex:
+    """
+    A property's events sorted by (date, event id), answering date-window queries with a
+    bisect over day ordinals instead of scanning every event.
+    Build one per property per run and share it between the cutoff checks
+    and the message builders.
+    """
+
+    __slots__ = ("_ordinals", "_items")
+
+    def __init__(self, events: dict):
+        self._items = sorted(events.items(), key=lambda item: (item[1].date, item[0]))
+        self._ordinals = [event.date.toordinal() for _, event in self._items]
+
+    def __len__(self):
+        return len(self._items)
+
+    def between(self, first: date, last: date) -> List[Tuple[str, Event]]:
+        """
+        Returns (event id, Event) pairs dated first..last (both inclusive),
+        already in date order.
+        """
+        lo = bisect_left(self._ordinals, first.toordinal())
+        hi = bisect_right(self._ordinals, last.toordinal())
+        return self._items[lo:hi]
+
+    def events_between(self, first: date, last: date) -> List[Event]:
+        """
+        Same as between(), without the event ids.
+        """
+        return [event for _, event in self.between(first, last)]
@@ -1,15 +1,22 @@
-from icalendar import Calendar, Event
-from datetime import datetime
-from google.cloud import storage
+from utils.gcs import get_client
+
+BUCKET_NAME = "cleaning-scheduler-bucket"
+
+
+def public_url_for(object_name, bucket_name=BUCKET_NAME):
+    return f"https://storage.googleapis.com/{bucket_name}/{object_name}"
 
 def upload_to_gcs(local_path, bucket_name, object_name):
-    client = storage.Client()
+    client = get_client()
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(object_name)
     blob.upload_from_filename(local_path)
-    return f"https://storage.googleapis.com/{bucket_name}/{object_name}"
+    return public_url_for(object_name, bucket_name)
+
+def save_schedule_ics(tasks, property_name, path, cleaners = None, upload = True):
+    # Only loaded when an ICS file is actually rebuilt
+    from icalendar import Calendar, Event
 
-def save_schedule_ics(tasks, property_name, path, cleaners = None):
     cal = Calendar()
     cal.add("prodid", "-//Cleaning Schedule//EN")
     cal.add("version", "2.0")
@@ -21,11 +28,8 @@ def save_schedule_ics(tasks, property_name, path, cleaners = None):
     for task in tasks:
         event = Event()
 
-        # Convert "27 November 2025" → datetime object
-        date_obj = datetime.strptime(task["date"], "%d/%m/%Y").date()
-
-        event.add("uid", task["id"])
-        event.add("summary", f"{task['type']} – {task['property']}")
+        event.add("uid", task.id)
+        event.add("summary", f"{task.type} – {task.property}")
 
         if cleaners:
             if isinstance(cleaners, list):
@@ -35,8 +39,8 @@ def save_schedule_ics(tasks, property_name, path, cleaners = None):
 
             event.add("description", f"Cleaner: {clean_str}")
 
-        event.add("dtstart", date_obj)
-        event.add("dtend", date_obj)  # all-day event
+        event.add("dtstart", task.date)
+        event.add("dtend", task.date)  # all-day event
 
         cal.add_component(event)
 
@@ -44,10 +48,12 @@ def save_schedule_ics(tasks, property_name, path, cleaners = None):
     with open(path, "wb") as f:
         f.write(cal.to_ical())
 
-    # Upload to GCS
-    bucket_name = "cleaning-scheduler-bucket"
+    # Upload to GCS (or leave it to the caller's batched upload stage)
     object_name = path 
-    public_url = upload_to_gcs(path, bucket_name, object_name)
+    if not upload:
+        return public_url_for(object_name)
+
+    public_url = upload_to_gcs(path, BUCKET_NAME, object_name)
 
     print(f"Uploaded to: {public_url}")
     return public_url
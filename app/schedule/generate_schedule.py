@@ -1,9 +1,11 @@
-from typing import List, Dict
+from typing import List
 from datetime import date
 import csv
 
+from config.data_models import Booking, Task
 
-def detect_changeovers(bookings: List[Dict], property_name: str, cleaners: List[str]):
+
+def detect_changeovers(bookings: List[Booking], property_name: str, cleaners: List[str]) -> List[Task]:
     """
     Takes a sorted list of bookings for a property.
     Generates a list of cleaning tasks.
@@ -12,7 +14,7 @@ def detect_changeovers(bookings: List[Dict], property_name: str, cleaners: List[
     tasks = []
 
     for i, booking in enumerate(bookings):
-        checkout_day = booking["end"]
+        checkout_day = booking.end
         task_id = f"{property_name.replace(' ', '')}-{checkout_day.strftime('%d%m%Y')}"
 
 
@@ -22,17 +24,17 @@ def detect_changeovers(bookings: List[Dict], property_name: str, cleaners: List[
         # Check for same-day check-in
         if i + 1 < len(bookings):
             next_booking = bookings[i + 1]
-            if next_booking["start"] == checkout_day:
+            if next_booking.start == checkout_day:
                 task_type = "Cleaning: Checkin Same Day"
 
-        tasks.append({
-            "id": task_id,
-            "date": checkout_day.strftime("%d/%m/%Y"),
-            "property": property_name,
-            "type": task_type,
-            "assigned_cleaner": cleaners[0] if cleaners else None,
-            #"booking_summary": booking["summary"],
-        })
+        tasks.append(Task(
+            id=task_id,
+            date=checkout_day,
+            property=property_name,
+            type=task_type,
+            assigned_cleaner=cleaners[0] if cleaners else None,
+            #booking_summary=booking.summary,
+        ))
 
     return tasks
 
@@ -46,4 +48,4 @@ def save_schedule_csv(tasks, path="schedule.csv"):
     with open(path, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(tasks)
+        writer.writerows(task.to_row() for task in tasks)
@@ -0,0 +1,110 @@
+import os
+from datetime import date, timedelta
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from calendars.parse_ical import parse_ical
+from config.data_models import Task
+from config.utils import merge_bookings
+from schedule.generate_schedule import detect_changeovers
+
+
+def processing_horizon(horizon_cfg: dict, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Returns the (first, last) dates of the processing horizon from
+    config.yaml's 'horizon' section, or None to process everything.
+    """
+    if not horizon_cfg:
+        return None
+
+    return (
+        today - timedelta(days=horizon_cfg.get("days_back", 14)),
+        today + timedelta(days=horizon_cfg.get("days_ahead", 180)),
+    )
+
+
+def build_property_tasks(property_name: str, cleaners: List[str], calendar_texts: List[str],
+                         parse_backend: str = "icalendar", merge_cfg: dict = None,
+                         horizon: Optional[Tuple[date, date]] = None,
+                         timings: dict = None) -> List[Task]:
+    """
+    Runs the CPU-only part of the pipeline for one property:
+    parse every calendar, merge the bookings and detect cleaning tasks.
+    Kept at module level so it can be sent to a worker process.
+    merge_cfg is config.yaml's 'merge' section (see merge_bookings).
+    horizon: optional (first, last) dates; only bookings overlapping it are
+    parsed and only tasks dated inside it are returned.
+    timings: optional dict filled with the seconds spent in each stage
+    ("parse", "merge", "detect").
+    """
+    merge_cfg = merge_cfg or {}
+    start = perf_counter()
+    bookings_lists = [
+        parse_ical(text, backend=parse_backend, window=horizon) for text in calendar_texts
+    ]
+    parsed = perf_counter()
+    merged_bookings = merge_bookings(
+        bookings_lists,
+        coalesce_overlaps=merge_cfg.get("coalesce_overlaps", False),
+        tolerance_days=merge_cfg.get("tolerance_days", 1),
+    )
+    merged = perf_counter()
+    tasks = detect_changeovers(merged_bookings, property_name, cleaners)
+
+    if timings is not None:
+        timings["parse"] = parsed - start
+        timings["merge"] = merged - parsed
+        timings["detect"] = perf_counter() - merged
+
+    # A booking that starts inside the horizon can still end after it
+    if horizon:
+        tasks = [t for t in tasks if t.date <= horizon[1]]
+
+    return tasks
+
+
+def _build_job(job: tuple) -> Tuple[List[Task], dict]:
+    # The timings come back with the tasks, also from a worker process
+    timings = {}
+    return build_property_tasks(*job, timings=timings), timings
+
+
+def build_all_tasks(jobs: List[tuple], mode: str = "serial", max_workers: int = None,
+                    timings: list = None) -> List[List[Task]]:
+    """
+    Builds the task lists for many properties.
+
+    jobs: [(property_name, cleaners, calendar_texts, parse_backend, merge_cfg, horizon), ...]
+    mode:
+      - "serial": run in this process, one property after another
+      - "process": spread properties over a ProcessPoolExecutor with
+                   'max_workers' processes (default: number of CPUs)
+
+    Returns the task lists in the same order as 'jobs', whatever the mode.
+    With a 'timings' list, each job's stage timings (see build_property_tasks)
+    are appended to it, in the same order.
+    """
+    if mode != "process" or len(jobs) < 2:
+        results = [_build_job(job) for job in jobs]
+    else:
+        results = _build_in_processes(jobs, max_workers)
+
+    if timings is not None:
+        timings.extend(job_timings for _, job_timings in results)
+    return [tasks for tasks, _ in results]
+
+
+def _build_in_processes(jobs: List[tuple], max_workers: int = None) -> list:
+    """
+    Runs _build_job over a ProcessPoolExecutor, keeping the order of 'jobs'.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    chunksize = max(1, len(jobs) // (workers * 4))
+
+    # multiprocessing is only loaded when process mode is actually used
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields results in submission order, so output is deterministic
+        return list(pool.map(_build_job, jobs, chunksize=chunksize))
@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import json
+
+from schedule.generate_ics import BUCKET_NAME, public_url_for
+from utils.gcs import get_client, run_transfers
+from utils.save_ics_index import format_ics_index_line
+
+MANIFEST_OBJECT = "ics_manifest.json"
+INDEX_OBJECT = "all_ics_links.txt"
+
+# Sharded runs: one manifest per shard (one shared by all work-claiming
+# workers) and index fragments to merge
+SHARD_MANIFEST_PREFIX = "ics_manifest/"
+INDEX_FRAGMENT_PREFIX = "ics_index_fragments/"
+
+
+def shard_manifest_object(tag: str) -> str:
+    return f"{SHARD_MANIFEST_PREFIX}{tag}.json"
+
+
+def _bucket():
+    return get_client().bucket(BUCKET_NAME)
+
+
+def load_manifest(object_name: str = MANIFEST_OBJECT) -> dict:
+    """
+    Loads the publishing manifest from GCS.
+    Sharded runs each keep their own (see shard_manifest_object), saved
+    with update_manifest().
+    The manifest records what is already published:
+        objects: { object name: { property, md5, url } }
+        index:   md5 of the published all_ics_links.txt
+    Returns an empty manifest if none exists yet.
+    """
+    from google.api_core.exceptions import NotFound
+
+    try:
+        data = _bucket().blob(object_name).download_as_text()
+        manifest = json.loads(data)
+    except NotFound:
+        manifest = {}
+
+    manifest.setdefault("objects", {})
+    manifest.setdefault("index", None)
+    return manifest
+
+
+def save_manifest(manifest: dict, object_name: str = MANIFEST_OBJECT):
+    """
+    Saves the publishing manifest back to GCS.
+    """
+    _bucket().blob(object_name).upload_from_string(
+        json.dumps(manifest, sort_keys=True),
+        content_type="application/json"
+    )
+
+
+def update_manifest(objects: dict, object_name: str, attempts: int = 5) -> bool:
+    """
+    Merges 'objects' entries into a manifest other workers may be saving
+    too (work-claiming mode), keeping their entries. Read-modify-write with
+    a generation precondition, retried when another worker saved first.
+    Returns True once saved.
+    """
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+
+    for _ in range(attempts):
+        blob = _bucket().blob(object_name)
+        try:
+            manifest = json.loads(blob.download_as_text())
+            generation = blob.generation
+        except NotFound:
+            manifest, generation = {}, 0
+
+        manifest.setdefault("objects", {}).update(objects)
+        manifest.setdefault("index", None)
+        try:
+            blob.upload_from_string(
+                json.dumps(manifest, sort_keys=True),
+                content_type="application/json",
+                if_generation_match=generation,
+            )
+            return True
+        except PreconditionFailed:
+            continue
+
+    print(f"⚠️  {object_name} keeps changing under this worker; manifest not saved this time")
+    return False
+
+
+def _remote_md5(object_name: str):
+    """
+    Returns the hex md5 GCS holds for an object, or None if it does not exist.
+    Only used when the manifest has no entry (e.g. its first run).
+    """
+    blob = _bucket().get_blob(object_name)
+    if blob is None or not blob.md5_hash:
+        return None
+    return base64.b64decode(blob.md5_hash).hex()
+
+
+def publish_file(manifest: dict, property_name: str, local_path: str, object_name: str,
+                 content_type: str = "text/calendar") -> bool:
+    """
+    Uploads a local file to GCS only if its bytes differ from what is published.
+    Updates the manifest entry for the object.
+    Returns True if the object was uploaded.
+    """
+    with open(local_path, "rb") as f:
+        data = f.read()
+    md5 = hashlib.md5(data).hexdigest()
+
+    entry = manifest["objects"].get(object_name)
+    published_md5 = entry["md5"] if entry else _remote_md5(object_name)
+
+    uploaded = published_md5 != md5
+    if uploaded:
+        _bucket().blob(object_name).upload_from_string(data, content_type=content_type)
+        print(f"Uploaded to: {public_url_for(object_name)}")
+
+    manifest["objects"][object_name] = {
+        "property": property_name,
+        "md5": md5,
+        "url": public_url_for(object_name),
+    }
+    return uploaded
+
+
+def publish_index(manifest: dict, index_text: str) -> bool:
+    """
+    Uploads all_ics_links.txt only if its content changed since last published.
+    Returns True if the index was uploaded.
+    """
+    md5 = hashlib.md5(index_text.encode("utf-8")).hexdigest()
+    if manifest.get("index") == md5:
+        return False
+
+    _bucket().blob(INDEX_OBJECT).upload_from_string(index_text, content_type="text/plain")
+    manifest["index"] = md5
+    return True
+
+
+def publish_index_fragment(tag: str, entries: list):
+    """
+    Uploads a sharded run's part of the ICS index:
+    ics_index_fragments/<tag>.json with its (company, property_name, public_url) entries.
+    merge_index_fragments() builds all_ics_links.txt from the fragments.
+    """
+    _bucket().blob(f"{INDEX_FRAGMENT_PREFIX}{tag}.json").upload_from_string(
+        json.dumps({"entries": [list(entry) for entry in entries]}),
+        content_type="application/json"
+    )
+
+
+def merge_index_fragments(properties: list, output_path: str = "ics_index.txt",
+                          max_workers: int = 8) -> bool:
+    """
+    Builds all_ics_links.txt from every shard's index fragment.
+
+    Each property's line is taken from the newest fragment that has it, and
+    lines follow config order. Fragments all of whose properties appear in a
+    newer fragment are deleted. The index is written to 'output_path' and
+    uploaded only if it differs from the published copy.
+    Returns True if the index was uploaded.
+    """
+    blobs = sorted(
+        get_client().list_blobs(BUCKET_NAME, prefix=INDEX_FRAGMENT_PREFIX),
+        key=lambda blob: blob.updated,
+        reverse=True,
+    )
+    fragments = run_transfers(
+        [(blob.download_as_text,) for blob in blobs],
+        max_workers=max_workers,
+    )
+
+    # Newest fragment first: the first entry seen for a property wins
+    entries = {}
+    superseded = []
+    for blob, data in zip(blobs, fragments):
+        fragment_entries = json.loads(data)["entries"]
+        new = [entry for entry in fragment_entries if entry[1] not in entries]
+        if not new:
+            superseded.append(blob)
+        for company, name, url in new:
+            entries[name] = (company, name, url)
+
+    index_text = "".join(
+        format_ics_index_line(*entries[prop["name"]])
+        for prop in properties if prop["name"] in entries
+    )
+    with open(output_path, "w") as f:
+        f.write(index_text)
+
+    if superseded:
+        run_transfers([(blob.delete,) for blob in superseded], max_workers=max_workers)
+        print(f"  → Deleted {len(superseded)} superseded index fragment(s)")
+
+    md5 = hashlib.md5(index_text.encode("utf-8")).hexdigest()
+    if _remote_md5(INDEX_OBJECT) == md5:
+        return False
+
+    _bucket().blob(INDEX_OBJECT).upload_from_string(index_text, content_type="text/plain")
+    return True
@@ -0,0 +1,121 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import List, Tuple
+
+from schedule.generate_ics import BUCKET_NAME
+from utils.gcs import get_client, run_transfers
+
+# Claim objects of work-claiming mode: claims/<tick id>/<property key>
+CLAIMS_PREFIX = "claims/"
+
+# Shard tag of every work-claiming worker: they share one manifest and
+# metrics file name, whatever their (per-process) worker id
+CLAIM_SHARD = "claim"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parses "--shard i/N" into (i, N), with 0 <= i < N.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}, expected i/N (e.g. 0/4)")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec!r}: need 0 <= i < N")
+    return index, count
+
+
+def shard_tag(index: int, count: int) -> str:
+    return f"{index}-of-{count}"
+
+
+def property_key(prop: dict) -> str:
+    """
+    Stable identity of a property for splitting work: its config id (or name).
+    """
+    return str(prop.get("id", prop["name"]))
+
+
+def shard_of(prop: dict, count: int) -> int:
+    """
+    Returns which of 'count' shards a property belongs to.
+    Uses a hash of the property id, so every worker computes the same split
+    without talking to the others, and the split does not depend on the
+    order of config.yaml.
+    """
+    digest = hashlib.sha256(property_key(prop).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(properties: list, index: int, count: int) -> list:
+    """
+    Returns the properties of shard 'index' of 'count', in config order.
+    """
+    return [prop for prop in properties if shard_of(prop, count) == index]
+
+
+def shard_state_config(state_cfg: dict, shard: str) -> dict:
+    """
+    Gives a shard its own SQLite database and GCS snapshot, so shards never
+    share (and overwrite) one state file. The shard imports properties it
+    does not have yet from the other databases named after 'base_path'.
+    Other backends are unchanged: "gcs" keeps one blob per property,
+    written with generation preconditions.
+    """
+    state_cfg = dict(state_cfg or {})
+    if shard and state_cfg.get("backend") == "sqlite":
+        base_path = state_cfg.get("path", "state/state.sqlite3")
+        root, ext = os.path.splitext(base_path)
+        state_cfg["path"] = f"{root}-{shard}{ext}"
+        state_cfg["base_path"] = base_path
+        state_cfg["snapshot_object"] = f"state_snapshot-{shard}.sqlite3"
+    return state_cfg
+
+
+def tick_id(now_utc: datetime, interval_minutes: int = 10) -> str:
+    """
+    Names the tick 'now_utc' falls in, so every worker started by the same
+    cron tick claims from the same set.
+    """
+    minute = now_utc.minute - now_utc.minute % max(1, interval_minutes)
+    return now_utc.strftime("%Y%m%dT%H") + f"{minute:02d}"
+
+
+def claim_properties(properties: list, tick: str, worker_id: str, limit: int = None,
+                     max_workers: int = 8) -> List[dict]:
+    """
+    Work-claiming mode: claims up to 'limit' unclaimed properties for this tick.
+
+    A property is claimed by creating claims/<tick>/<property key> with a
+    "must not exist" precondition (if_generation_match=0), so exactly one
+    worker's create succeeds and no lock is needed. Each worker starts at a
+    different offset, so workers rarely race for the same property.
+    Returns the claimed properties, in config order.
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    bucket = get_client().bucket(BUCKET_NAME)
+    start = int(hashlib.sha256(worker_id.encode("utf-8")).hexdigest(), 16) % max(1, len(properties))
+    order = list(range(start, len(properties))) + list(range(start))
+    limit = len(properties) if limit is None else limit
+
+    def try_claim(i: int) -> bool:
+        blob = bucket.blob(f"{CLAIMS_PREFIX}{tick}/{property_key(properties[i])}")
+        try:
+            blob.upload_from_string(worker_id, content_type="text/plain", if_generation_match=0)
+            return True
+        except PreconditionFailed:
+            # Another worker has it
+            return False
+
+    # Try as many candidates at once as there are claims left to make
+    claimed = []
+    while order and len(claimed) < limit:
+        window, order = order[:limit - len(claimed)], order[limit - len(claimed):]
+        results = run_transfers([(try_claim, i) for i in window], max_workers=max_workers)
+        claimed.extend(i for i, ok in zip(window, results) if ok)
+
+    return [properties[i] for i in sorted(claimed)]
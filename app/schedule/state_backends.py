@@ -0,0 +1,747 @@
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from config.data_models import Event
+from utils.gcs import get_client, run_transfers
+
+BUCKET_NAME = "cleaning-scheduler-bucket"
+
+
+def empty_state() -> dict:
+    """
+    The state of a property that has never been processed.
+    """
+    return {
+        "events": {},              # empty dictionary of events
+        "last_full_message": None  # no weekly message ever sent
+    }
+
+
+def encode_state(state: dict) -> dict:
+    """
+    JSON-ready copy of a state: Events become {date: "dd/mm/yyyy", type, assigned_cleaner}.
+    """
+    return dict(state, events={eid: ev.to_dict() for eid, ev in state.get("events", {}).items()})
+
+
+def decode_state(data: dict) -> dict:
+    """
+    Reverse of encode_state. Also reads older state files.
+    """
+    return dict(data, events={eid: Event.from_dict(ev) for eid, ev in data.get("events", {}).items()})
+
+
+def state_meta(state: dict) -> dict:
+    """
+    Everything in a property's state except its events.
+    """
+    return {k: v for k, v in state.items() if k != "events"}
+
+
+def journal_records(property_name: str, change: dict, ts: str) -> list:
+    """
+    Turns one property's change into compact journal records:
+        added / changed: { op, id, event } (changed also carries 'old')
+        removed:         { op, id }
+        meta:            { op, meta }
+    """
+    records = []
+    diff = change.get("diff")
+
+    if diff:
+        for event_id, event in diff["added"].items():
+            records.append({"op": "added", "id": event_id, "event": event.to_dict()})
+        for event_id in diff["removed"]:
+            records.append({"op": "removed", "id": event_id})
+        for event_id, c in diff["changed"].items():
+            records.append({"op": "changed", "id": event_id,
+                            "event": c["new"].to_dict(), "old": c["old"].to_dict()})
+
+    if change.get("meta_changed"):
+        records.append({"op": "meta", "meta": state_meta(change["state"])})
+
+    for record in records:
+        record["property"] = property_name
+        record["ts"] = ts
+
+    return records
+
+
+def apply_journal_record(state: dict, record: dict):
+    """
+    Replays one journal record onto a property's state (in place).
+    """
+    op = record["op"]
+    if op in ("added", "changed"):
+        state["events"][record["id"]] = Event.from_dict(record["event"])
+    elif op == "removed":
+        state["events"].pop(record["id"], None)
+    elif op == "meta":
+        state.update(record["meta"])
+    elif op == "state":
+        state.clear()
+        state.update(decode_state(record["state"]))
+
+
+def _remove_database(path: str):
+    """
+    Deletes a temporary SQLite file and the WAL files reading it left behind.
+    """
+    for leftover in (path, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+class GCSStateBackend:
+    """
+    One pretty-printed '<name>_state.json' blob per property in GCS.
+    Whole-portfolio loads/saves run as parallel transfers.
+
+    Writes are conditional on the blob generation seen when the state was
+    loaded, so two workers can never overwrite each other's state: if the
+    blob changed in between, the write is skipped and reported as a conflict
+    (the next run reloads it and tries again).
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        # Generation of each blob as last loaded/saved (0 = did not exist)
+        self._generations = {}
+
+    def _blob(self, property_name: str):
+        return get_client().bucket(BUCKET_NAME).blob(f"{property_name}_state.json")
+
+    def load(self, property_name: str) -> dict:
+        from google.api_core.exceptions import NotFound
+
+        blob = self._blob(property_name)
+        try:
+            data = blob.download_as_text()
+            self._generations[property_name] = blob.generation
+            return decode_state(json.loads(data))
+        except NotFound:
+            # No previous state exists yet
+            self._generations[property_name] = 0
+            return empty_state()
+
+    def save(self, property_name: str, state: dict) -> bool:
+        """
+        Returns False if the blob changed since it was loaded (not written).
+        """
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self._blob(property_name)
+        try:
+            blob.upload_from_string(
+                json.dumps(encode_state(state), indent=2),
+                content_type="application/json",
+                if_generation_match=self._generations.get(property_name),
+            )
+        except PreconditionFailed:
+            print(f"⚠️  State of {property_name} was changed by another worker; not overwritten")
+            self._generations.pop(property_name, None)
+            return False
+
+        self._generations[property_name] = blob.generation
+        print(f"Saved state for {property_name} to {blob.name}")
+        return True
+
+    def load_many(self, property_names: list) -> dict:
+        states = run_transfers(
+            [(self.load, name) for name in property_names],
+            max_workers=self.max_workers,
+        )
+        return dict(zip(property_names, states))
+
+    def save_many(self, states: dict) -> list:
+        """
+        Returns the names whose state was not written because of a conflict.
+        """
+        names = list(states)
+        written = run_transfers(
+            [(self.save, name, states[name]) for name in names],
+            max_workers=self.max_workers,
+        )
+        return [name for name, ok in zip(names, written) if not ok]
+
+    def apply_changes(self, changes: dict) -> list:
+        # Blobs cannot be appended to cheaply: rewrite only the changed ones
+        return self.save_many({name: change["state"] for name, change in changes.items()})
+
+
+class FileStateBackend:
+    """
+    The whole portfolio's state in a single compact local JSON file, plus an
+    append-only journal of changes next to it. Needs no cloud access.
+
+    Changes are appended to '<path>.journal.jsonl'. Once the journal holds
+    'compact_every' records it is folded into the snapshot and moved to
+    '<path>.history.jsonl', which is never read on load.
+    """
+
+    def __init__(self, path: str, compact_every: int = 500):
+        self.path = path
+        self.compact_every = compact_every
+        base = os.path.splitext(path)[0]
+        self.journal_path = f"{base}.journal.jsonl"
+        self.history_path = f"{base}.history.jsonl"
+        self._lock = threading.Lock()
+        self._journal_len = None
+        self._known = None
+
+    def _read_journal(self) -> list:
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _read_all(self) -> dict:
+        all_states = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                all_states = {name: decode_state(data) for name, data in json.load(f).items()}
+
+        journal = self._read_journal()
+        for record in journal:
+            state = all_states.setdefault(record["property"], empty_state())
+            apply_journal_record(state, record)
+
+        self._journal_len = len(journal)
+        self._known = set(all_states)
+        return all_states
+
+    def _write_snapshot(self, all_states: dict):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {name: encode_state(state) for name, state in all_states.items()},
+                f, separators=(",", ":"),
+            )
+        os.replace(tmp_path, self.path)
+
+    def _write_folded(self, all_states: dict):
+        """
+        Writes a snapshot that already includes the journal ('all_states'
+        came from _read_all) and moves the journal to the history file, so
+        it is not replayed on top of the snapshot.
+        """
+        self._write_snapshot(all_states)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as src, \
+                    open(self.history_path, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+
+        self._journal_len = 0
+
+    def _compact(self):
+        """
+        Folds the journal into the snapshot and moves it to the history file.
+        """
+        self._write_folded(self._read_all())
+        print(f"Compacted state journal into {self.path}")
+
+    def load(self, property_name: str) -> dict:
+        return self.load_many([property_name])[property_name]
+
+    def save(self, property_name: str, state: dict):
+        self.save_many({property_name: state})
+
+    def load_many(self, property_names: list) -> dict:
+        with self._lock:
+            all_states = self._read_all()
+        return {name: all_states.get(name) or empty_state() for name in property_names}
+
+    def save_many(self, states: dict):
+        with self._lock:
+            all_states = self._read_all()
+            all_states.update(states)
+            self._write_folded(all_states)
+            self._known = set(all_states)
+
+        print(f"Saved state for {len(states)} property(ies) to {self.path}")
+
+    def apply_changes(self, changes: dict):
+        ts = datetime.now(timezone.utc).isoformat()
+
+        with self._lock:
+            if self._known is None:
+                self._read_all()
+
+            records = []
+            for name, change in changes.items():
+                if name in self._known:
+                    records.extend(journal_records(name, change, ts))
+                else:
+                    # First write for this property: record its full state
+                    records.append({"op": "state", "property": name, "ts": ts,
+                                    "state": encode_state(change["state"])})
+                    self._known.add(name)
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+            self._journal_len += len(records)
+
+            print(f"Journaled {len(records)} change(s) for {len(changes)} property(ies)")
+
+            if self._journal_len >= self.compact_every:
+                self._compact()
+
+    def history(self, property_name: str) -> list:
+        records = []
+        with self._lock:
+            for path in (self.history_path, self.journal_path):
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        records.extend(json.loads(line) for line in f if line.strip())
+        return [r for r in records if r["property"] == property_name]
+
+
+class SQLiteStateBackend:
+    """
+    Local SQLite database holding every property's state.
+    Events are rows indexed by (property, event date); everything else in a
+    property's state is kept as a small JSON document.
+
+    Incremental changes update only the affected event rows and are appended
+    to a 'journal' table; journal rows older than 'journal_retention_days'
+    are dropped so the database stays bounded.
+
+    With 'gcs_snapshot', the database file is copied to GCS after saving
+    (every save, or at most every 'snapshot_interval_minutes'), and restored
+    from that snapshot when the local file is missing.
+
+    Properties missing from the database are imported from the other state
+    databases named after 'base_path' (shards write state-<tag>.sqlite3 next
+    to state.sqlite3, and their own snapshots), taking each property's
+    highest revision, so resharding carries the state over. Only before any
+    state database existed are they imported from the legacy per-property
+    GCS blobs. Snapshot uploads are conditional on the generation restored or last
+    uploaded, so a second process writing the same snapshot object is
+    detected instead of silently overwritten: its newer property states are
+    merged in and the upload retried.
+    """
+
+    SNAPSHOT_OBJECT = "state_snapshot.sqlite3"
+
+    def __init__(self, path: str, gcs_snapshot: bool = False, snapshot_interval_minutes: int = 0,
+                 max_workers: int = 8, journal_retention_days: int = 90, snapshot_object: str = None,
+                 base_path: str = None):
+        self.path = path
+        self.base_path = base_path or path
+        self.journal_retention_days = journal_retention_days
+        self.gcs_snapshot = gcs_snapshot
+        self.snapshot_interval_minutes = snapshot_interval_minutes
+        self.snapshot_object = snapshot_object or self.SNAPSHOT_OBJECT
+        self.legacy = GCSStateBackend(max_workers=max_workers) if gcs_snapshot else None
+        self._lock = threading.Lock()
+        self._snapshot_generation = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if gcs_snapshot:
+            if os.path.exists(path):
+                blob = get_client().bucket(BUCKET_NAME).get_blob(self.snapshot_object)
+                self._snapshot_generation = blob.generation if blob else 0
+            else:
+                self._restore_snapshot()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS properties (
+                name TEXT PRIMARY KEY,
+                meta TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                property TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                event_date INTEGER NOT NULL,
+                type TEXT,
+                assigned_cleaner TEXT,
+                PRIMARY KEY (property, event_id)
+            );
+            CREATE INDEX IF NOT EXISTS events_by_date ON events (property, event_date);
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                property TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                op TEXT NOT NULL,
+                event_id TEXT,
+                payload TEXT
+            );
+            CREATE INDEX IF NOT EXISTS journal_by_property ON journal (property, seq);
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+
+    # -- Event row <-> Event ----------------------------------------------
+
+    @staticmethod
+    def _event_to_row(property_name: str, event_id: str, event: Event) -> tuple:
+        return (property_name, event_id, event.date.toordinal(),
+                event.type, event.assigned_cleaner)
+
+    @staticmethod
+    def _row_to_event(row: tuple) -> Event:
+        event_date, event_type, assigned_cleaner = row
+        return Event(date.fromordinal(event_date), event_type, assigned_cleaner)
+
+    # -- Backend API -------------------------------------------------------
+
+    def load(self, property_name: str) -> dict:
+        return self.load_many([property_name])[property_name]
+
+    def save(self, property_name: str, state: dict):
+        self.save_many({property_name: state})
+
+    @classmethod
+    def _read_states(cls, conn: sqlite3.Connection, wanted: set = None) -> dict:
+        """
+        Reads the states of 'wanted' properties (all if None) from a state database.
+        """
+        states = {}
+        for name, meta in conn.execute("SELECT name, meta FROM properties"):
+            if wanted is None or name in wanted:
+                states[name] = dict(json.loads(meta), events={})
+
+        event_rows = conn.execute(
+            "SELECT property, event_id, event_date, type, assigned_cleaner "
+            "FROM events ORDER BY property, event_date"
+        )
+        for row in event_rows:
+            if row[0] in states:
+                states[row[0]]["events"][row[1]] = cls._row_to_event(row[2:])
+        return states
+
+    def load_many(self, property_names: list) -> dict:
+        # One read transaction for the whole portfolio
+        with self._lock, self._conn:
+            states = self._read_states(self._conn, set(property_names))
+            has_states = self._conn.execute("SELECT 1 FROM properties LIMIT 1").fetchone() is not None
+
+        missing = [name for name in property_names if name not in states]
+        if missing:
+            # New to this database (a new shard, or resharded): take them
+            # from the other state databases, and keep them
+            imported, found_databases = self._import_from_other_databases(missing)
+            if imported:
+                self._write_states(imported)
+                states.update(imported)
+                print(f"Imported state for {len(imported)} property(ies) from other state databases")
+
+            # Before any state database existed: import the legacy GCS blobs.
+            # Afterwards they are stale, as nothing updates them.
+            missing = [name for name in missing if name not in states]
+            migrated = has_states or found_databases or self._snapshot_generation
+            if missing and self.legacy and not migrated:
+                states.update(self.legacy.load_many(missing))
+
+        return {name: states.get(name) or empty_state() for name in property_names}
+
+    def _other_databases(self) -> list:
+        """
+        The other state databases named after base_path, as [(local path,
+        temporary)]: GCS snapshots (newest first, downloaded to temporary
+        files) when gcs_snapshot is on, then local files (newest first).
+        """
+        databases = []
+        if self.gcs_snapshot:
+            snapshot_prefix = os.path.splitext(self.SNAPSHOT_OBJECT)[0]
+            blobs = sorted(
+                (blob for blob in get_client().list_blobs(BUCKET_NAME, prefix=snapshot_prefix)
+                 if blob.name != self.snapshot_object),
+                key=lambda blob: blob.updated,
+                reverse=True,
+            )
+            for blob in blobs:
+                fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+                os.close(fd)
+                blob.download_to_filename(tmp_path)
+                databases.append((tmp_path, True))
+
+        root, ext = os.path.splitext(os.path.abspath(self.base_path))
+        local = [
+            path for path in glob.glob(f"{glob.escape(root)}*{ext}")
+            if os.path.abspath(path) != os.path.abspath(self.path)
+        ]
+        databases.extend((path, False) for path in sorted(local, key=os.path.getmtime, reverse=True))
+        return databases
+
+    def _import_from_other_databases(self, property_names: list) -> tuple:
+        """
+        Returns ({ name: state } found in the other state databases, keeping
+        each property's highest revision, and whether any database was found).
+        """
+        wanted = set(property_names)
+        found = {}
+        databases = self._other_databases()
+
+        for path, temporary in databases:
+            try:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    states = self._read_states(conn, wanted)
+                finally:
+                    conn.close()
+            except sqlite3.DatabaseError as e:
+                print(f"⚠️  Could not read state database {path}: {e}")
+                continue
+            finally:
+                if temporary:
+                    _remove_database(path)
+
+            for name, state in states.items():
+                if name not in found or state.get("revision", 0) > found[name].get("revision", 0):
+                    found[name] = state
+
+        return found, bool(databases)
+
+    def _write_states(self, states: dict):
+        with self._lock, self._conn:
+            for name, state in states.items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO properties (name, meta) VALUES (?, ?)",
+                    (name, json.dumps(state_meta(state))),
+                )
+                self._conn.execute("DELETE FROM events WHERE property = ?", (name,))
+                self._conn.executemany(
+                    "INSERT INTO events (property, event_id, event_date, type, assigned_cleaner) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [self._event_to_row(name, eid, ev) for eid, ev in state.get("events", {}).items()],
+                )
+
+    def save_many(self, states: dict):
+        if not states:
+            return
+
+        self._write_states(states)
+        print(f"Saved state for {len(states)} property(ies) to {self.path}")
+
+        if self.gcs_snapshot and self._snapshot_due():
+            self.snapshot_to_gcs()
+
+    def apply_changes(self, changes: dict):
+        now = datetime.now(timezone.utc)
+        ts = now.isoformat()
+        full_saves = {}
+
+        with self._lock, self._conn:
+            known = {row[0] for row in self._conn.execute("SELECT name FROM properties")}
+
+            for name, change in changes.items():
+                if name not in known:
+                    # First write for this property: store its full state
+                    full_saves[name] = change["state"]
+                    continue
+
+                diff = change.get("diff")
+                if diff:
+                    upserts = list(diff["added"].items()) + [
+                        (eid, c["new"]) for eid, c in diff["changed"].items()
+                    ]
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO events "
+                        "(property, event_id, event_date, type, assigned_cleaner) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [self._event_to_row(name, eid, ev) for eid, ev in upserts],
+                    )
+                    self._conn.executemany(
+                        "DELETE FROM events WHERE property = ? AND event_id = ?",
+                        [(name, eid) for eid in diff["removed"]],
+                    )
+
+                if change.get("meta_changed"):
+                    self._conn.execute(
+                        "UPDATE properties SET meta = ? WHERE name = ?",
+                        (json.dumps(state_meta(change["state"])), name),
+                    )
+
+                records = journal_records(name, change, ts)
+                self._conn.executemany(
+                    "INSERT INTO journal (property, ts, op, event_id, payload) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (name, ts, r["op"], r.get("id"),
+                         json.dumps({k: r[k] for k in ("event", "old", "meta") if k in r}))
+                        for r in records
+                    ],
+                )
+
+            # Compaction: the events table is the snapshot, old journal rows go
+            cutoff = (now - timedelta(days=self.journal_retention_days)).isoformat()
+            self._conn.execute("DELETE FROM journal WHERE ts < ?", (cutoff,))
+
+        if len(changes) > len(full_saves):
+            print(f"Applied changes for {len(changes) - len(full_saves)} property(ies) to {self.path}")
+
+        if full_saves:
+            # save_many also takes care of the GCS snapshot
+            self.save_many(full_saves)
+        elif self.gcs_snapshot and self._snapshot_due():
+            self.snapshot_to_gcs()
+
+    def history(self, property_name: str) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, op, event_id, payload FROM journal WHERE property = ? ORDER BY seq",
+                (property_name,),
+            ).fetchall()
+        return [
+            dict(json.loads(payload), property=property_name, ts=ts, op=op, id=event_id)
+            for ts, op, event_id, payload in rows
+        ]
+
+    # -- GCS snapshot ------------------------------------------------------
+
+    def _snapshot_due(self) -> bool:
+        if not self.snapshot_interval_minutes:
+            return True
+
+        row = self._conn.execute(
+            "SELECT value FROM settings WHERE key = 'last_snapshot'"
+        ).fetchone()
+        if not row:
+            return True
+
+        elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(row[0])
+        return elapsed.total_seconds() >= self.snapshot_interval_minutes * 60
+
+    def snapshot_to_gcs(self) -> bool:
+        """
+        Copies a consistent snapshot of the database to GCS.
+
+        If another process uploaded the snapshot since this one restored or
+        last uploaded it, the property states it has at a higher revision
+        are merged in first and the upload is retried.
+        Returns True if the snapshot was uploaded.
+        """
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = get_client().bucket(BUCKET_NAME).blob(self.snapshot_object)
+        for _ in range(3):
+            fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(fd)
+            try:
+                with self._lock:
+                    backup = sqlite3.connect(tmp_path)
+                    self._conn.backup(backup)
+                    backup.close()
+
+                blob.upload_from_filename(
+                    tmp_path,
+                    content_type="application/x-sqlite3",
+                    if_generation_match=self._snapshot_generation,
+                )
+            except PreconditionFailed:
+                print(f"⚠️  {blob.name} was written by another process; merging its newer states")
+                self._merge_snapshot()
+                continue
+            finally:
+                os.remove(tmp_path)
+
+            self._snapshot_generation = blob.generation
+            # Only an uploaded snapshot counts towards snapshot_interval_minutes
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES ('last_snapshot', ?)",
+                    (datetime.now(timezone.utc).isoformat(),),
+                )
+            print(f"Snapshot of state database uploaded to {blob.name}")
+            return True
+
+        print(f"❌ {blob.name} keeps changing under this process; state snapshot NOT uploaded")
+        return False
+
+    def _merge_snapshot(self):
+        """
+        Takes the property states the GCS snapshot holds at a higher
+        revision than this database, and its generation.
+        """
+        from google.api_core.exceptions import NotFound
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        blob = get_client().bucket(BUCKET_NAME).blob(self.snapshot_object)
+        try:
+            try:
+                blob.download_to_filename(tmp_path)
+            except NotFound:
+                self._snapshot_generation = 0
+                return
+
+            conn = sqlite3.connect(f"file:{tmp_path}?mode=ro", uri=True)
+            try:
+                remote = self._read_states(conn)
+            finally:
+                conn.close()
+
+            with self._lock:
+                local = {
+                    name: json.loads(meta).get("revision", 0)
+                    for name, meta in self._conn.execute("SELECT name, meta FROM properties")
+                }
+            newer = {
+                name: state for name, state in remote.items()
+                if name not in local or state.get("revision", 0) > local[name]
+            }
+            if newer:
+                self._write_states(newer)
+                print(f"  → Merged {len(newer)} newer property state(s) from {blob.name}")
+            self._snapshot_generation = blob.generation
+        finally:
+            _remove_database(tmp_path)
+
+    def _restore_snapshot(self):
+        from google.api_core.exceptions import NotFound
+
+        blob = get_client().bucket(BUCKET_NAME).blob(self.snapshot_object)
+        try:
+            blob.download_to_filename(self.path)
+            self._snapshot_generation = blob.generation
+            print(f"Restored state database from {blob.name}")
+        except NotFound:
+            # No snapshot yet; start from an empty database
+            self._snapshot_generation = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def create_state_backend(state_cfg: dict = None, max_workers: int = 8):
+    """
+    Builds the state backend selected in config.yaml's 'state' section.
+    Defaults to the original one-blob-per-property GCS layout.
+    """
+    state_cfg = state_cfg or {}
+    backend = state_cfg.get("backend", "gcs")
+
+    if backend == "gcs":
+        return GCSStateBackend(max_workers=max_workers)
+
+    if backend == "file":
+        return FileStateBackend(
+            state_cfg.get("path", "state/state.json"),
+            compact_every=state_cfg.get("compact_every", 500),
+        )
+
+    if backend == "sqlite":
+        return SQLiteStateBackend(
+            state_cfg.get("path", "state/state.sqlite3"),
+            gcs_snapshot=state_cfg.get("gcs_snapshot", False),
+            snapshot_interval_minutes=state_cfg.get("snapshot_interval_minutes", 0),
+            max_workers=max_workers,
+            journal_retention_days=state_cfg.get("journal_retention_days", 90),
+            snapshot_object=state_cfg.get("snapshot_object"),
+            base_path=state_cfg.get("base_path"),
+        )
+
+    raise ValueError(f"Unknown state backend: {backend}")
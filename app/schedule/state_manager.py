@@ -1,45 +1,162 @@
 import json
-from google.cloud import storage
-from google.api_core.exceptions import NotFound
+import os
+from datetime import datetime, timezone
 
-BUCKET_NAME = "cleaning-scheduler-bucket"
+from schedule.state_backends import create_state_backend, state_meta, GCSStateBackend
 
+# Backend used by the functions below; replaced by configure_state_backend()
+_backend = GCSStateBackend()
+_backend_key = None
 
-def _get_blob(property_name: str):
+# In-memory copy of the last loaded/saved states ({ name: state }), or None.
+# Only enabled by long-running processes (daemon mode), which are the only
+# writer of the state between ticks.
+_cache = None
+
+
+def configure_state_backend(state_cfg: dict = None, max_workers: int = 8, cache: bool = False):
     """
-    Returns the GCS blob object for the property’s state file.
+    Selects where state lives, from config.yaml's 'state' section:
+    "gcs" (one JSON blob per property), "sqlite" (local database with an
+    optional GCS snapshot) or "file" (single local JSON file).
+
+    Calling it again with the same settings keeps the current backend
+    (and its open connections). cache=True keeps states in memory so
+    later loads skip the backend.
     """
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-    filename = f"{property_name}_state.json"
-    return bucket.blob(filename)
+    global _backend, _backend_key, _cache
+    key = (json.dumps(state_cfg, sort_keys=True, default=str), max_workers)
+
+    if key != _backend_key:
+        _backend = create_state_backend(state_cfg, max_workers=max_workers)
+        _backend_key = key
+        _cache = None
+
+    if not cache:
+        _cache = None
+    elif _cache is None:
+        _cache = {}
+
+    return _backend
 
 
 def load_previous_state(property_name: str) -> dict:
     """
-    Loads the previous state for a property from GCS.
-    If the file does not exist, returns an empty default structure.
+    Loads the previous state for a property.
+    If none exists, returns an empty default structure.
+    """
+    if _cache is not None:
+        return load_previous_states([property_name])[property_name]
+    return _backend.load(property_name)
+
+
+def load_previous_states(property_names: list) -> dict:
+    """
+    Loads the previous state of many properties in one go.
+    Returns { property name: state }.
     """
-    blob = _get_blob(property_name)
+    if _cache is None:
+        return _backend.load_many(property_names)
 
-    try:
-        data = blob.download_as_text()
-        return json.loads(data)
-    except NotFound:
-        # No previous state exists yet
-        return {
-            "events": {},              # empty dictionary of events
-            "last_full_message": None  # no weekly message ever sent
-        }
+    missing = [name for name in property_names if name not in _cache]
+    if missing:
+        _cache.update(_backend.load_many(missing))
+    return {name: _cache[name] for name in property_names}
 
 
 def save_state(property_name: str, state: dict):
     """
-    Saves the given state dictionary to GCS as JSON.
+    Saves the given state dictionary for one property.
     """
-    blob = _get_blob(property_name)
-    blob.upload_from_string(
-        json.dumps(state, indent=2),
-        content_type="application/json"
-    )
-    print(f"Saved state for {property_name} to {blob.name}")
+    _backend.save(property_name, state)
+    if _cache is not None:
+        _cache[property_name] = state
+
+
+def save_states(states: dict):
+    """
+    Saves the state of many properties in one go ({ property name: state }).
+    """
+    _backend.save_many(states)
+    if _cache is not None:
+        _cache.update(states)
+
+
+def _meta_without_revision(state: dict) -> dict:
+    meta = state_meta(state)
+    meta.pop("revision", None)
+    return meta
+
+
+def save_state_changes(changes: dict) -> int:
+    """
+    Persists only what actually changed.
+
+    changes: { property name: (previous state, new state, diff) }
+
+    A property whose diff is empty and whose other fields (last_full_message,
+    fingerprint, ...) are unchanged is not written at all. Otherwise the
+    backend records the added/removed/changed events and any new fields
+    (as journal records where the backend supports it).
+
+    Every write also moves the state's 'revision' on by one, so the
+    revision only changes once a state is actually saved.
+
+    Returns the number of properties written.
+    """
+    to_write = {}
+
+    for name, (prev_state, new_state, diff) in changes.items():
+        events_changed = bool(diff["added"] or diff["removed"] or diff["changed"])
+        meta_changed = _meta_without_revision(prev_state) != _meta_without_revision(new_state)
+
+        if events_changed or meta_changed:
+            to_write[name] = {
+                "state": dict(new_state, revision=prev_state.get("revision", 0) + 1),
+                "diff": diff if events_changed else None,
+                # The revision is part of the meta, so it always changes
+                "meta_changed": True,
+            }
+
+    if not to_write:
+        return 0
+
+    # Backends guarding against concurrent writers return the properties
+    # they did not write because another worker changed them first
+    conflicts = set(_backend.apply_changes(to_write) or ())
+
+    if _cache is not None:
+        _cache.update({
+            name: change["state"] for name, change in to_write.items() if name not in conflicts
+        })
+        for name in conflicts:
+            # Reload it next time
+            _cache.pop(name, None)
+
+    return len(to_write) - len(conflicts)
+
+
+def load_change_history(property_name: str) -> list:
+    """
+    Returns the journaled changes of a property, oldest first.
+    Only the "file" and "sqlite" backends keep a journal.
+    """
+    history = getattr(_backend, "history", None)
+    return history(property_name) if history else []
+
+
+def archive_events(property_name: str, events: dict, path: str = "state/archive.jsonl"):
+    """
+    Appends events pruned from a property's state to a local JSON-lines archive.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    archived_at = datetime.now(timezone.utc).isoformat()
+
+    with open(path, "a", encoding="utf-8") as f:
+        for event_id, event in events.items():
+            f.write(json.dumps({
+                "property": property_name,
+                "id": event_id,
+                "archived_at": archived_at,
+                **event.to_dict(),
+            }) + "\n")
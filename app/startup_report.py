@@ -0,0 +1,102 @@
+"""
+Cold-start budget for run.py.
+
+Imports run.py in a fresh interpreter under `python -X importtime` and
+reports where the import time goes. Exits with status 1 if importing it
+takes longer than the budget, or if a heavy dependency is loaded at import
+time, so it can gate CI or a deploy; tests/test_startup.py runs it under pytest.
+
+    python app/startup_report.py
+    python app/startup_report.py --budget-ms 150 --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only the code paths that need these may import them
+HEAVY_MODULES = (
+    "google.cloud.storage",
+    "google.api_core",
+    "icalendar",
+    "requests",
+    "smtplib",
+    "multiprocessing",
+)
+
+DEFAULT_BUDGET_MS = 150
+
+
+def measure_import(module: str = "run"):
+    """
+    Imports 'module' in a new interpreter (from app/).
+    Returns (rows, heavy modules loaded), where rows are
+    (self µs, cumulative µs, depth, module name) for the module's import
+    tree, in the order -X importtime prints them (children first).
+    """
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    # Keep the module's own tree: everything after the previous top-level import
+    end = max(i for i, row in enumerate(rows) if row[2] == 0 and row[3] == module)
+    start = max((i for i in range(end) if rows[i][2] == 0), default=-1) + 1
+
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return rows[start:end + 1], loaded
+
+
+def print_report(rows: list, top: int):
+    total_us = rows[-1][1]
+    print(f"Import of {rows[-1][3]}: {total_us / 1000:.1f} ms")
+    print(f"\nTop {top} by cumulative time:")
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+    for self_us, cumulative_us, _, name in sorted(rows[:-1], key=lambda r: -r[1])[:top]:
+        print(f"{cumulative_us / 1000:>14.1f}  {self_us / 1000:>8.1f}  {name}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report run.py import time and check it against a budget")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"maximum import time of run.py (default {DEFAULT_BUDGET_MS} ms)")
+    parser.add_argument("--top", type=int, default=15,
+                        help="number of slowest imports to list")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="measure this many cold starts and keep the fastest")
+    args = parser.parse_args(argv)
+
+    measurements = [measure_import("run") for _ in range(max(1, args.runs))]
+    rows, loaded = min(measurements, key=lambda m: m[0][-1][1])
+    print_report(rows, args.top)
+
+    ok = True
+    total_ms = rows[-1][1] / 1000
+    if total_ms > args.budget_ms:
+        print(f"\n❌ Import took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        ok = False
+    if loaded:
+        print(f"\n❌ Heavy modules loaded at import time: {', '.join(loaded)}")
+        ok = False
+    if ok:
+        print(f"\n✅ Within the {args.budget_ms:.0f} ms budget, no heavy modules loaded at import time")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
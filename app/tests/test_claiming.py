@@ -0,0 +1,72 @@
+"""
+Work-claiming workers share one manifest and metrics file name, and
+saving the manifest keeps the entries other workers saved meanwhile.
+
+    cd app && python -m pytest tests
+"""
+import json
+
+import pytest
+
+import run
+from benchmarks.gcs_standin import LocalStorageClient
+from schedule.generate_ics import BUCKET_NAME
+from schedule.publisher import load_manifest, shard_manifest_object, update_manifest
+from schedule.sharding import CLAIM_SHARD
+from utils.gcs import set_client
+from utils.metrics import _shard_path
+
+
+@pytest.fixture
+def gcs():
+    client = LocalStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+def _entry(name):
+    return {"property": name, "md5": "0" * 32, "url": f"https://example/{name}.ics"}
+
+
+def test_claim_workers_share_one_tag(gcs, monkeypatch):
+    runs = []
+    monkeypatch.setattr(run, "main", lambda config, **kwargs: runs.append(kwargs))
+    config = {
+        "properties": [{"id": i, "name": f"P{i}"} for i in range(5)],
+        "state": {"backend": "gcs"},
+        "sharding": {"claim_batch": 2},
+    }
+
+    run.run_claiming(config, "host-a-101")
+    run.run_claiming(config, "host-b-202")
+
+    assert sorted(p["name"] for kwargs in runs for p in kwargs["properties"]) == [f"P{i}" for i in range(5)]
+    assert {kwargs["shard"] for kwargs in runs} == {CLAIM_SHARD}
+    # Index fragments stay per worker and batch, so none overwrites another
+    assert len({kwargs["index_fragment"] for kwargs in runs}) == len(runs)
+    assert _shard_path("metrics/cleaning_scheduler.prom", CLAIM_SHARD) == "metrics/cleaning_scheduler-claim.prom"
+
+
+def test_update_manifest_keeps_concurrent_entries(gcs, monkeypatch):
+    object_name = shard_manifest_object(CLAIM_SHARD)
+    update_manifest({"A.ics": _entry("A")}, object_name)
+
+    # Another worker saves B between this worker's read and its write
+    put = gcs._put
+    raced = []
+
+    def racing_put(bucket, name, data, if_generation_match=None):
+        if not raced:
+            raced.append(name)
+            manifest = json.loads(gcs._get(bucket, name)[0])
+            manifest["objects"]["B.ics"] = _entry("B")
+            put(bucket, name, json.dumps(manifest).encode("utf-8"))
+        return put(bucket, name, data, if_generation_match)
+
+    monkeypatch.setattr(gcs, "_put", racing_put)
+    assert update_manifest({"C.ics": _entry("C")}, object_name)
+
+    assert raced == [object_name]
+    assert sorted(load_manifest(object_name)["objects"]) == ["A.ics", "B.ics", "C.ics"]
+    assert [blob.name for blob in gcs.list_blobs(BUCKET_NAME, prefix="ics_manifest/")] == [object_name]
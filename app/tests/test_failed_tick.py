@@ -0,0 +1,74 @@
+"""
+A tick that fails after queuing its change emails is redone by the next
+tick without sending them again.
+
+    cd app && python -m pytest tests
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import run
+from benchmarks.feed_server import FeedServer
+from benchmarks.gcs_standin import LocalStorageClient
+from benchmarks.load_harness import fresh_container, harness_config
+from benchmarks.smtp_sink import SMTPSink
+from messaging import outbox
+from utils.gcs import set_client
+
+# A Wednesday morning: change emails, no weekly summary
+START = datetime(2026, 10, 14, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["gcs", "sqlite"])
+def harness(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EMAIL_SENDER", "scheduler@load-test.invalid")
+    monkeypatch.setenv("EMAIL_APP_PASSWORD", "load-test")
+    set_client(LocalStorageClient())
+    feeds = FeedServer(str(tmp_path / "feeds")).start()
+    sink = SMTPSink().start()
+    fresh_container()
+
+    properties = feeds.publish_portfolio(6, today=START.date())
+    args = SimpleNamespace(state_backend=request.param, no_polling=True, mode="serial")
+    config = harness_config(args, properties, sink.port)
+    config["state"]["gcs_snapshot"] = request.param == "sqlite"
+
+    yield SimpleNamespace(config=config, properties=properties, feeds=feeds, sink=sink)
+
+    fresh_container()
+    set_client(None)
+    feeds.stop()
+    sink.stop()
+
+
+def _sent_change_keys() -> list:
+    rows = outbox.get_outbox()._conn.execute(
+        "SELECT key FROM outbox WHERE status = 'sent' AND key LIKE 'change:%'"
+    )
+    return sorted(key for key, in rows)
+
+
+def test_failed_tick_does_not_resend_change_emails(harness, monkeypatch):
+    run.main(harness.config, now_utc=START, weekly_summary=False)
+    harness.feeds.change_feeds(harness.properties, 1.0, START.date())
+
+    def failing_publish(*args, **kwargs):
+        raise RuntimeError("GCS unavailable")
+
+    # The emails are queued (and delivered) before the upload fails
+    with monkeypatch.context() as patched:
+        patched.setattr(run, "publish_file", failing_publish)
+        with pytest.raises(RuntimeError):
+            run.main(harness.config, now_utc=START + timedelta(minutes=10), weekly_summary=False)
+    sent_by_failed_tick = _sent_change_keys()
+    emails_by_failed_tick = harness.sink.counters_snapshot()["emails"]
+
+    # The state was not saved, so this tick finds the same changes again
+    run.main(harness.config, now_utc=START + timedelta(minutes=20), weekly_summary=False)
+
+    assert sent_by_failed_tick
+    assert _sent_change_keys() == sent_by_failed_tick
+    assert harness.sink.counters_snapshot()["emails"] == emails_by_failed_tick
@@ -0,0 +1,114 @@
+"""
+The fast scanner (parse_ical backend="fast") must return exactly the
+Bookings of the icalendar path.
+
+    cd app && python -m pytest tests
+"""
+import os
+import random
+from datetime import date
+
+import pytest
+
+from benchmarks.feeds import airbnb_feed, booking_feed, synthetic_property, synthetic_stays
+from calendars.ical_scanner import scan_vevents
+from calendars.parse_ical import parse_ical
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data", "sample1.ics")
+
+EDGE_CASES = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VTIMEZONE\r
+TZID:Europe/London\r
+BEGIN:STANDARD\r
+DTSTART:19701025T020000\r
+TZOFFSETFROM:+0100\r
+TZOFFSETTO:+0000\r
+END:STANDARD\r
+END:VTIMEZONE\r
+BEGIN:VEVENT\r
+DTSTART;TZID=Europe/London:20251126T150000\r
+DTEND;TZID="Europe/London":20251128T100000\r
+SUMMARY;LANGUAGE=en:CLOSED - Not available\\, sorry\\; \\\\ x\\nline\r
+UID:abc\r
+BEGIN:VALARM\r
+ACTION:DISPLAY\r
+DESCRIPTION:x\r
+TRIGGER:-PT15M\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART:20251201T230000Z\r
+DTEND:20251203T010000Z\r
+SUMMARY:Airbnb (Not available)\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART:20251201T230000\r
+DTEND;VALUE=DATE:20251203\r
+SUMMARY: Airbnb (Not available) x\r
+ y folded\r
+UID:1418fb94e984-99e83df8b04164c82849b836f2f442c5@airbnb.co\r
+ m\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART;VALUE=DATE:20260101\r
+DTEND;VALUE=DATE:20260102\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+def _synthetic_feeds():
+    rng = random.Random(7)
+    stays = synthetic_stays(rng, date(2025, 1, 1), date(2026, 12, 31), 0.7)
+    feeds = [
+        ("airbnb", airbnb_feed(rng, stays[::2], stays[1::2], "20251126T225518Z")),
+        ("booking", booking_feed(rng, stays[::2], stays[1::2])),
+    ]
+    for index in range(3):
+        prop = synthetic_property(index, density=0.8, years=1, seed=3, today=date(2025, 11, 26))
+        feeds += [(f"property{index}-feed{n}", text) for n, text in enumerate(prop["calendar_texts"])]
+    return feeds
+
+
+def _feeds():
+    with open(SAMPLE, "r", encoding="utf-8", newline="") as f:
+        sample = f.read()
+    return [
+        ("sample1", sample),
+        ("edge-cases", EDGE_CASES),
+        ("edge-cases-lf-only", EDGE_CASES.replace("\r\n", "\n")),
+    ] + _synthetic_feeds()
+
+
+FEEDS = _feeds()
+
+
+@pytest.mark.parametrize("text", [text for _, text in FEEDS], ids=[label for label, _ in FEEDS])
+def test_fast_scanner_matches_icalendar(text):
+    expected = parse_ical(text)
+    assert expected
+    # Straight to the scanner, so a silent fallback to icalendar cannot pass
+    assert scan_vevents(text) == expected
+    assert parse_ical(text, backend="fast") == expected
+
+
+@pytest.mark.parametrize("text", [text for _, text in FEEDS], ids=[label for label, _ in FEEDS])
+def test_fast_scanner_matches_icalendar_in_window(text):
+    window = (date(2025, 11, 1), date(2026, 1, 31))
+    assert scan_vevents(text, window) == parse_ical(text, window=window)
+
+
+def test_edge_cases_are_parsed():
+    bookings = scan_vevents(EDGE_CASES)
+    # The exact "Airbnb (Not available)" block is dropped, the longer summary is not
+    assert [b.start for b in bookings] == [date(2025, 11, 26), date(2025, 12, 1), date(2026, 1, 1)]
+    assert bookings[0].summary == "CLOSED - Not available, sorry; \\ x\nline"
+    assert bookings[1].summary == " Airbnb (Not available) xy folded"
+    assert bookings[1].uid.endswith("@airbnb.com")
+
+
+def test_scanner_rejects_unbalanced_components():
+    text = EDGE_CASES.replace("END:VALARM\r\n", "")
+    with pytest.raises(ValueError):
+        scan_vevents(text)
@@ -0,0 +1,114 @@
+"""
+Outbox delivery: retries only go to the recipients a message has not reached.
+
+    cd app && python -m pytest tests
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from messaging import emailer
+from messaging.outbox import Outbox, deliver_due
+
+NOW = datetime(2026, 10, 14, 9, 0, tzinfo=timezone.utc)
+
+
+class SentLog(list):
+    """
+    Emails sent through the fake mailer, as (recipients, subject).
+    Emails to an address in 'down' fail.
+    """
+    down = frozenset()
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    log = SentLog()
+
+    class FakeMailer:
+        _smtp = object()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+        def send(self, recipients, subject, body):
+            if log.down & set(recipients):
+                raise Exception("Failed to send email: 451 try later")
+            log.append((tuple(recipients), subject))
+            return {}
+
+    monkeypatch.setattr(emailer.SMTPMailer, "from_env", classmethod(lambda cls, cfg=None: FakeMailer()))
+    return log
+
+
+def test_digest_retries_only_failed_recipients(tmp_path, sent):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), backoff_base_seconds=60)
+    outbox.enqueue("weekly:A:2026-W42", "A", ["a@x", "b@x"], "Cleaning Update – A", "A body", now=NOW)
+    outbox.enqueue("weekly:B:2026-W42", "B", ["a@x"], "Cleaning Update – B", "B body", now=NOW)
+
+    sent.down = {"b@x"}
+    assert deliver_due(outbox, {"digest": True}, now=NOW) == 1
+    assert sent == [(("a@x",), "Cleaning Updates – 2 properties")]
+    assert outbox.counts() == {"pending": 1, "sent": 1}
+
+    sent.down = frozenset()
+    sent.clear()
+    assert deliver_due(outbox, {"digest": True}, now=NOW + timedelta(hours=1)) == 1
+    # a@x already had A's message in the digest: only b@x gets it again
+    assert sent == [(("b@x",), "Cleaning Update – A")]
+    assert outbox.counts() == {"sent": 2}
+
+
+def test_failed_message_keeps_all_recipients_without_digest(tmp_path, sent):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("change:A:1", "A", ["a@x", "b@x"], "Cleaning Update – A", "A body", now=NOW)
+
+    sent.down = {"b@x"}
+    assert deliver_due(outbox, {}, now=NOW) == 0
+    assert outbox.due(NOW + timedelta(hours=1))[0]["recipients"] == ["a@x", "b@x"]
+
+
+@pytest.fixture
+def gcs():
+    from benchmarks.gcs_standin import LocalStorageClient
+    from utils.gcs import set_client
+
+    client = LocalStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+def test_outbox_restores_from_gcs_without_resending(tmp_path, gcs, sent):
+    first = Outbox(str(tmp_path / "a" / "outbox.sqlite3"), gcs_object="outbox.sqlite3")
+    first.enqueue("weekly:A:2026-W42", "A", ["a@x"], "Cleaning Update – A", "A body", now=NOW)
+    assert first.sync()
+    assert deliver_due(first, {}, now=NOW) == 1
+
+    # A new container: no local file, the GCS copy knows A was delivered
+    fresh = Outbox(str(tmp_path / "b" / "outbox.sqlite3"), gcs_object="outbox.sqlite3")
+    assert fresh.counts() == {"sent": 1}
+    assert deliver_due(fresh, {}, now=NOW) == 0
+    assert len(sent) == 1
+
+
+def test_concurrent_outboxes_merge_on_sync(tmp_path, gcs, sent):
+    one = Outbox(str(tmp_path / "one.sqlite3"), gcs_object="outbox.sqlite3")
+    one.enqueue("change:A:1", "A", ["a@x"], "Cleaning Update – A", "A body", now=NOW)
+    one.sync()
+    two = Outbox(str(tmp_path / "two.sqlite3"), gcs_object="outbox.sqlite3")
+
+    # Each delivers its own property, then uploads
+    two.enqueue("change:B:1", "B", ["b@x"], "Cleaning Update – B", "B body", now=NOW)
+    assert deliver_due(one, {}, now=NOW, properties={"A"}) == 1
+    assert deliver_due(two, {}, now=NOW, properties={"B"}) == 1
+    assert sorted(sent) == [(("a@x",), "Cleaning Update – A"), (("b@x",), "Cleaning Update – B")]
+
+    # two's upload found one's newer copy and merged it: nothing is lost or resent
+    assert two.counts() == {"sent": 2}
+    one.refresh()
+    assert one.counts() == {"sent": 2}
+    assert deliver_due(one, {}, now=NOW) == 0
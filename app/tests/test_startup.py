@@ -0,0 +1,11 @@
+"""
+Cold start of run.py stays within the startup budget, with no heavy
+dependency imported at module level (see startup_report.py).
+
+    cd app && python -m pytest tests
+"""
+import startup_report
+
+
+def test_run_imports_within_budget():
+    assert startup_report.main(["--budget-ms", str(startup_report.DEFAULT_BUDGET_MS), "--top", "5"]) == 0
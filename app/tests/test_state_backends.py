@@ -0,0 +1,128 @@
+"""
+State backends: journals, snapshots and what a fresh database starts from.
+
+    cd app && python -m pytest tests
+"""
+from datetime import date
+
+import pytest
+
+from config.data_models import Event
+from schedule import state_manager
+from schedule.state_manager import (
+    configure_state_backend, load_previous_state, save_state, save_state_changes
+)
+
+
+@pytest.fixture
+def gcs():
+    from benchmarks.gcs_standin import LocalStorageClient
+    from utils.gcs import set_client
+
+    client = LocalStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+def _state(fingerprint, day=1):
+    return {
+        "events": {f"e{day}": Event(date(2026, 10, day), "Check-out", None)},
+        "last_full_message": None,
+        "fingerprint": fingerprint,
+    }
+
+
+def _added(state):
+    return {"added": state["events"], "removed": [], "changed": {}}
+
+
+def _isolate_backend(monkeypatch):
+    # configure_state_backend() swaps these module globals; restore them after the test
+    for name in ("_backend", "_backend_key", "_cache"):
+        monkeypatch.setattr(state_manager, name, getattr(state_manager, name))
+    state_manager._backend_key = None
+
+
+def test_file_full_save_after_journaled_changes(tmp_path, monkeypatch):
+    _isolate_backend(monkeypatch)
+    configure_state_backend({"backend": "file", "path": str(tmp_path / "state.json")})
+
+    save_state_changes({"A": ({"events": {}}, _state("x"), _added(_state("x")))})
+    save_state_changes({"A": (load_previous_state("A"), _state("x", 2), _added(_state("x", 2)))})
+    save_state("A", _state("y", 3))
+
+    # The journal written before the full save is not replayed over it
+    state = load_previous_state("A")
+    assert state["fingerprint"] == "y"
+    assert list(state["events"]) == ["e3"]
+
+
+def _sqlite(path, **kwargs):
+    from schedule.state_backends import SQLiteStateBackend
+    return SQLiteStateBackend(str(path), gcs_snapshot=True, **kwargs)
+
+
+def test_new_shard_starts_from_the_unsharded_snapshot(tmp_path, gcs):
+    from schedule.state_backends import GCSStateBackend
+    from schedule.sharding import shard_state_config
+
+    # Legacy blob, not updated since the sqlite backend took over
+    GCSStateBackend().save("A", _state("legacy"))
+    unsharded = _sqlite(tmp_path / "old" / "state.sqlite3")
+    assert unsharded.load("A")["fingerprint"] == "legacy"
+    unsharded.save("A", dict(_state("current"), revision=4))
+
+    # A new container running shard 0 of 2: no local files at all
+    cfg = shard_state_config({"backend": "sqlite", "path": str(tmp_path / "new" / "state.sqlite3")}, "0-of-2")
+    shard = _sqlite(cfg["path"], snapshot_object=cfg["snapshot_object"], base_path=cfg["base_path"])
+    assert shard.load("A")["fingerprint"] == "current"
+    # New properties start empty instead of reading legacy blobs
+    GCSStateBackend().save("B", _state("legacy"))
+    assert shard.load("B") == {"events": {}, "last_full_message": None}
+
+
+def test_reshard_takes_the_highest_revision(tmp_path, gcs):
+    _sqlite(tmp_path / "state.sqlite3").save("A", dict(_state("unsharded"), revision=2))
+    two = _sqlite(tmp_path / "state-1-of-2.sqlite3", snapshot_object="state_snapshot-1-of-2.sqlite3",
+                  base_path=str(tmp_path / "state.sqlite3"))
+    assert two.load("A")["fingerprint"] == "unsharded"
+    two.save("A", dict(_state("sharded"), revision=3))
+
+    four = _sqlite(tmp_path / "state-3-of-4.sqlite3", snapshot_object="state_snapshot-3-of-4.sqlite3",
+                   base_path=str(tmp_path / "state.sqlite3"))
+    assert four.load("A")["fingerprint"] == "sharded"
+    assert four.load("A")["revision"] == 3
+
+
+def test_snapshot_conflict_merges_and_recovers(tmp_path, gcs):
+    one = _sqlite(tmp_path / "one.sqlite3")
+    one.save("A", dict(_state("a"), revision=1))
+    two = _sqlite(tmp_path / "two.sqlite3")
+    two.save("B", dict(_state("b"), revision=1))
+
+    # one's generation is stale: it merges two's states and uploads both
+    one.save("A", dict(_state("a2"), revision=2))
+    one.save("A", dict(_state("a3"), revision=3))
+    restored = _sqlite(tmp_path / "restored.sqlite3")
+    assert restored.load("A")["fingerprint"] == "a3"
+    assert restored.load("B")["fingerprint"] == "b"
+
+
+def test_failed_snapshot_is_not_recorded(tmp_path, gcs, monkeypatch):
+    from google.api_core.exceptions import PreconditionFailed
+    from benchmarks.gcs_standin import LocalBlob
+
+    backend = _sqlite(tmp_path / "state.sqlite3", snapshot_interval_minutes=60)
+
+    def conflict(self, *args, **kwargs):
+        raise PreconditionFailed("generation does not match")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(LocalBlob, "upload_from_filename", conflict)
+        backend.save("A", _state("a"))
+    assert backend._snapshot_due()
+
+    backend.save("A", _state("a"))
+    assert not backend._snapshot_due()
+    assert _sqlite(tmp_path / "restored.sqlite3").load("A")["fingerprint"] == "a"
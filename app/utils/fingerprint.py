@@ -0,0 +1,52 @@
+import hashlib
+import json
+
+# Bump when the pipeline's output format changes, so stored fingerprints
+# no longer match and every property is rebuilt once.
+FINGERPRINT_VERSION = 2
+
+
+def _normalise_ical(ical_text: str) -> str:
+    """
+    Drops lines that change on every export without changing any booking.
+    Airbnb stamps every VEVENT with the export time (DTSTAMP), which would
+    otherwise make every fetch look like a change.
+    """
+    return "\n".join(
+        line for line in ical_text.splitlines()
+        if not line.startswith("DTSTAMP")
+    )
+
+
+def calendar_digest(ical_text: str) -> str:
+    """
+    Returns a hex digest of one calendar's content, ignoring DTSTAMP lines.
+    Equal digests mean the feed did not change between two downloads.
+    """
+    return hashlib.sha256(_normalise_ical(ical_text).encode("utf-8")).hexdigest()
+
+
+def property_fingerprint(prop: dict, calendar_texts: list, settings: dict = None) -> str:
+    """
+    Returns a hex digest identifying everything the per-property pipeline
+    depends on: the property's config entry, its raw calendar texts and any
+    global 'settings' that change the output (e.g. the merge options).
+    Equal fingerprints mean the generated tasks/CSV/ICS would be identical.
+    """
+    h = hashlib.sha256()
+
+    config_part = {
+        "version": FINGERPRINT_VERSION,
+        "name": prop["name"],
+        "cleaners": prop.get("cleaners", []),
+        "company": prop.get("property_management_company"),
+        "calendars": prop.get("calendars", []),
+        "settings": settings or {},
+    }
+    h.update(json.dumps(config_part, sort_keys=True).encode("utf-8"))
+
+    for text in calendar_texts:
+        h.update(b"\0")
+        h.update(_normalise_ical(text).encode("utf-8"))
+
+    return h.hexdigest()
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep enough pooled connections for every parallel transfer worker
+POOL_MAXSIZE = 16
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide storage.Client, creating it on first use.
+    Auth, discovery and the HTTP connection pool are set up once and shared
+    by every upload/download for the rest of the process.
+    google.cloud.storage is only imported here, so runs that never touch
+    GCS do not pay for loading it.
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            from google.cloud import storage
+            from requests.adapters import HTTPAdapter
+
+            client = storage.Client()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            client._http.mount("https://", adapter)
+            _client = client
+
+    return _client
+
+
+def set_client(client):
+    """
+    Replaces the process-wide client, e.g. with a local stand-in for load
+    tests (see benchmarks.gcs_standin). None goes back to a real client
+    on next use.
+    """
+    global _client
+
+    with _client_lock:
+        _client = client
+
+
+def run_transfers(jobs: list, max_workers: int = 8) -> list:
+    """
+    Runs GCS transfer jobs in parallel through a bounded thread pool.
+
+    jobs: [(function, args...), ...]
+    Returns each job's result in the same order as 'jobs'.
+    The first failing job's exception is re-raised once all jobs have finished.
+    """
+    if not jobs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        futures = [pool.submit(job[0], *job[1:]) for job in jobs]
+        return [f.result() for f in futures]
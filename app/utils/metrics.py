@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = "cleaning_scheduler"
+
+
+class RunMetrics:
+    """
+    Timings and counters of one run, for the whole run and per property.
+
+    Stage timings and counters add up. A property's timings and counters
+    also count towards the run's, except timings recorded with
+    run_total=False: stages that run concurrently (fetch, upload) are timed
+    per property that way and get one wall-clock timing for the run.
+    Safe to use from the transfer threads.
+
+    With a 'profiler' (utils.profiling.RunProfiler), every timed block is
+    also profiled; without one, timing is all a block costs.
+    """
+
+    def __init__(self, started: datetime = None, shard: str = None):
+        self.started = started or datetime.now(timezone.utc)
+        self.shard = shard
+        self._start = perf_counter()
+        self.duration_seconds = None
+        self.stages = {}
+        self.counters = {}
+        self.properties = {}
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def _entry(self, property_name: str) -> dict:
+        if property_name is None:
+            return {"stages": self.stages, "counters": self.counters}
+        return self.properties.setdefault(property_name, {"stages": {}, "counters": {}})
+
+    def record(self, stage: str, seconds: float, property_name: str = None, run_total: bool = True):
+        """
+        Adds 'seconds' to a stage of the property (if given) and of the run.
+        """
+        names = [property_name] if property_name else []
+        if run_total or not property_name:
+            names.append(None)
+
+        with self._lock:
+            for name in names:
+                stages = self._entry(name)["stages"]
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def add(self, counter: str, value: int = 1, property_name: str = None):
+        """
+        Adds to a counter of the property, and of the run as a whole.
+        """
+        with self._lock:
+            for name in ((None, property_name) if property_name else (None,)):
+                counters = self._entry(name)["counters"]
+                counters[counter] = counters.get(counter, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str, property_name: str = None, run_total: bool = True):
+        """
+        Times the enclosed block as one run of 'stage':
+            with metrics.timer("csv", name):
+                save_schedule_csv(...)
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(stage, property_name)
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, perf_counter() - start, property_name, run_total)
+            if profiler is not None:
+                profiler.stop()
+
+    def timed(self, fn, stage: str, property_name: str = None, run_total: bool = True):
+        """
+        Wraps fn so each call is timed as 'stage', e.g. for run_transfers jobs.
+        """
+        def wrapper(*args, **kwargs):
+            with self.timer(stage, property_name, run_total):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def finish(self):
+        self.duration_seconds = perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started.isoformat(),
+            "shard": self.shard,
+            "duration_seconds": round(self.duration_seconds or 0.0, 6),
+            "stages": _rounded(self.stages),
+            "counters": self.counters,
+            "properties": {
+                name: {"stages": _rounded(entry["stages"]), "counters": entry["counters"]}
+                for name, entry in self.properties.items()
+            },
+        }
+
+
+def _rounded(stages: dict) -> dict:
+    return {stage: round(seconds, 6) for stage, seconds in stages.items()}
+
+
+def _shard_path(path: str, shard: str) -> str:
+    # Shards running side by side each get their own file
+    if not shard:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{shard}{ext}"
+
+
+def append_run_report(metrics: RunMetrics, path: str, budget_seconds: float = None):
+    """
+    Appends the run as one JSON line to the run report.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    record = metrics.to_dict()
+    record["budget_seconds"] = budget_seconds
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    pairs = [f'{key}="{_label_value(value)}"' for key, value in labels.items() if value is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def prometheus_text(metrics: RunMetrics, budget_seconds: float = None, per_property: bool = False) -> str:
+    """
+    Renders the run in the Prometheus text exposition format (all gauges,
+    describing the last run).
+    """
+    shard = metrics.shard
+    lines = []
+
+    def gauge(name: str, help_text: str, samples: list):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{_labels(**labels)} {value}")
+
+    gauge("last_run_timestamp_seconds", "Start time of the last run (Unix time).",
+          [({"shard": shard}, f"{metrics.started.timestamp():.3f}")])
+    gauge("run_duration_seconds", "Wall time of the last run.",
+          [({"shard": shard}, f"{metrics.duration_seconds or 0.0:.6f}")])
+    if budget_seconds:
+        gauge("run_budget_seconds", "Time between ticks; runs longer than this overlap.",
+              [({"shard": shard}, f"{budget_seconds:g}")])
+
+    gauge("stage_seconds", "Seconds spent in each stage in the last run.",
+          [({"shard": shard, "stage": stage}, f"{seconds:.6f}")
+           for stage, seconds in sorted(metrics.stages.items())])
+    gauge("run_counter", "Counters of the last run (cache hits, bytes, events, changes, emails, ...).",
+          [({"shard": shard, "counter": counter}, value)
+           for counter, value in sorted(metrics.counters.items())])
+
+    if per_property:
+        gauge("property_stage_seconds", "Time each property spent in each stage in the last run.",
+              [({"shard": shard, "property": name, "stage": stage}, f"{seconds:.6f}")
+               for name, entry in sorted(metrics.properties.items())
+               for stage, seconds in sorted(entry["stages"].items())])
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(metrics: RunMetrics, path: str, budget_seconds: float = None,
+                              per_property: bool = False):
+    """
+    Writes the node_exporter textfile-collector file, atomically so the
+    collector never reads half a file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(metrics, budget_seconds, per_property))
+    os.replace(tmp_path, path)
+
+
+def write_metrics(metrics: RunMetrics, metrics_cfg: dict = None):
+    """
+    Writes the run report line and the Prometheus textfile configured in
+    config.yaml's 'metrics' section.
+    """
+    cfg = metrics_cfg or {}
+    if not cfg.get("enabled", True):
+        return
+
+    budget = cfg.get("budget_seconds")
+    if cfg.get("report_path"):
+        append_run_report(metrics, _shard_path(cfg["report_path"], metrics.shard), budget)
+    if cfg.get("textfile_path"):
+        write_prometheus_textfile(metrics, _shard_path(cfg["textfile_path"], metrics.shard),
+                                  budget, cfg.get("per_property_prometheus", False))
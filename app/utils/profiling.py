@@ -0,0 +1,269 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+# Stacks below this are left out of the collapsed stack files
+MIN_STACK_SECONDS = 1e-6
+
+
+def _frame(func: tuple) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        # Built-in functions have no file
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
+
+
+def _profiler_internal(func: tuple) -> bool:
+    return "_lsprof.Profiler" in func[2]
+
+
+def collapsed_stacks(stats: dict, root: str) -> dict:
+    """
+    Turns cProfile stats into collapsed stacks ("root;f;g;h" -> microseconds),
+    the input format of flamegraph.pl and speedscope.
+
+    cProfile only keeps caller -> callee totals, not whole stacks, so a
+    function's time is split between its call paths in proportion to what
+    each caller spent in it (the same approximation gprof2dot and
+    flameprof make). Recursive calls are cut at the first repeat.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+
+    roots = [
+        func for func, (_, _, _, _, callers) in stats.items()
+        if not _profiler_internal(func) and not any(caller in stats for caller in callers)
+    ]
+
+    stacks = {}
+
+    def visit(func, path, names, share):
+        _, _, own_time, _, _ = stats[func]
+        names = names + (_frame(func),)
+        own = own_time * share
+        if own >= MIN_STACK_SECONDS:
+            stack = ";".join(names)
+            stacks[stack] = stacks.get(stack, 0) + own
+
+        for callee in callees.get(func, ()):
+            if callee in path or _profiler_internal(callee):
+                continue
+            callee_total = stats[callee][3]
+            edge_total = stats[callee][4][func][3]
+            if callee_total <= 0 or edge_total * share < MIN_STACK_SECONDS:
+                continue
+            visit(callee, path | {callee}, names, share * edge_total / callee_total)
+
+    for func in roots:
+        visit(func, {func}, (root,), 1.0)
+
+    return {stack: int(seconds * 1_000_000) for stack, seconds in stacks.items() if seconds * 1_000_000 >= 1}
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "property"
+
+
+class RunProfiler:
+    """
+    Profiles a run's stages: each stage block (see RunMetrics.timer) runs
+    under its own cProfile.Profile and, in the main thread, records its
+    peak traced memory. A tracemalloc snapshot taken at the start is
+    compared with the heap at write() to find the lines that kept memory.
+
+    Scopes belong to a property or to the run as a whole. Nested scopes
+    pause the outer one, so every call is counted once. write() produces,
+    for the run and the 'top_properties' slowest properties:
+      <name>.pstats     for pstats / snakeviz
+      <name>.collapsed  collapsed stacks rooted at the stage, for flamegraph.pl
+      <name>.cpu.txt    top functions by cumulative time
+      <name>.alloc.txt  peak memory per stage block (and, for the run, top net allocations by line)
+    plus profile.json summarising every property.
+
+    Only imported by runs with profiling on (run.py --profile).
+    """
+
+    def __init__(self, output_dir: str = "profiles", top_properties: int = 20,
+                 top_allocations: int = 25, trace_memory: bool = True):
+        self.output_dir = output_dir
+        self.top_properties = top_properties
+        self.top_allocations = top_allocations
+        self.trace_memory = trace_memory
+        self._scopes = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._snapshot = None
+
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            # Diffing snapshots walks every traced block, which takes seconds
+            # on a full heap: stages only record their peak, and one diff
+            # over the whole run finds the lines that kept memory
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _traces_memory(self) -> bool:
+        # The heap is shared: only the main thread's scopes get memory figures
+        return self.trace_memory and threading.current_thread() is threading.main_thread()
+
+    def start(self, stage: str, property_name: str = None):
+        stack = self._stack()
+        scope = {"owner": property_name, "stage": stage, "profile": cProfile.Profile(), "peak_bytes": 0}
+
+        if stack:
+            outer = stack[-1]
+            outer["profile"].disable()
+            if "base" in outer:
+                # The outer scope's peak so far; reset_peak() below starts over
+                outer["peak_bytes"] = max(outer["peak_bytes"], tracemalloc.get_traced_memory()[1] - outer["base"])
+
+        if self._traces_memory():
+            tracemalloc.reset_peak()
+            scope["base"] = tracemalloc.get_traced_memory()[0]
+
+        stack.append(scope)
+        scope["start"] = perf_counter()
+        scope["profile"].enable()
+
+    def stop(self):
+        stack = self._stack()
+        scope = stack.pop()
+        scope["profile"].disable()
+        scope["seconds"] = perf_counter() - scope.pop("start")
+
+        if "base" in scope:
+            scope["peak_bytes"] = max(scope["peak_bytes"], tracemalloc.get_traced_memory()[1] - scope.pop("base"))
+
+        scope["profile"].create_stats()
+        with self._lock:
+            self._scopes.append(scope)
+
+        if stack:
+            outer = stack[-1]
+            if "base" in outer:
+                tracemalloc.reset_peak()
+            outer["profile"].enable()
+
+    @contextmanager
+    def scope(self, stage: str, property_name: str = None):
+        """
+        Profiles one stage block outside RunMetrics.timer.
+        """
+        self.start(stage, property_name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def summary(self) -> dict:
+        """
+        Returns { owner: { seconds, peak_bytes, stages: { stage: seconds } } },
+        where owner is a property name or "run".
+        """
+        owners = {}
+        for scope in self._scopes:
+            entry = owners.setdefault(scope["owner"] or "run", {"seconds": 0.0, "peak_bytes": 0, "stages": {}})
+            entry["seconds"] += scope["seconds"]
+            entry["peak_bytes"] = max(entry["peak_bytes"], scope["peak_bytes"])
+            entry["stages"][scope["stage"]] = entry["stages"].get(scope["stage"], 0.0) + scope["seconds"]
+        return owners
+
+    def write(self, label: str) -> str:
+        """
+        Writes the reports to <output_dir>/<label>/ and returns that directory.
+        """
+        run_dir = os.path.join(self.output_dir, label)
+        os.makedirs(run_dir, exist_ok=True)
+
+        summary = self.summary()
+        properties = sorted((o for o in summary if o != "run"), key=lambda o: -summary[o]["seconds"])
+        detailed = (["run"] if "run" in summary else []) + properties[:self.top_properties]
+
+        allocations = self._allocations()
+        for owner in detailed:
+            scopes = [s for s in self._scopes if (s["owner"] or "run") == owner]
+            self._write_owner(os.path.join(run_dir, _slug(owner)), owner, scopes, summary[owner], allocations)
+
+        with open(os.path.join(run_dir, "profile.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "detailed": detailed,
+                "owners": {
+                    owner: {
+                        "seconds": round(entry["seconds"], 6),
+                        "peak_bytes": entry["peak_bytes"],
+                        "stages": {stage: round(s, 6) for stage, s in entry["stages"].items()},
+                    }
+                    for owner, entry in sorted(summary.items(), key=lambda item: -item[1]["seconds"])
+                },
+            }, f, indent=2)
+
+        return run_dir
+
+    def _write_owner(self, path: str, owner: str, scopes: list, entry: dict, allocations: list):
+        # Before pstats.Stats, which takes over (and empties) profile.stats
+        stacks = {}
+        for scope in scopes:
+            for stack, micros in collapsed_stacks(scope["profile"].stats, scope["stage"]).items():
+                stacks[stack] = stacks.get(stack, 0) + micros
+        with open(f"{path}.collapsed", "w", encoding="utf-8") as f:
+            for stack, micros in sorted(stacks.items()):
+                f.write(f"{stack} {micros}\n")
+
+        stats = pstats.Stats(*[s["profile"] for s in scopes])
+        stats.dump_stats(f"{path}.pstats")
+
+        with open(f"{path}.cpu.txt", "w", encoding="utf-8") as f:
+            f.write(f"{owner}: {entry['seconds']:.3f}s in {len(scopes)} stage block(s)\n\n")
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(40)
+
+        with open(f"{path}.alloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"{owner}: peak memory per stage block\n")
+            for scope in scopes:
+                f.write(f"  {scope['stage']:<16} {scope['peak_bytes'] / 1024:>10,.1f} KiB\n")
+            if owner == "run" and allocations:
+                f.write(f"\nTop {self.top_allocations} net allocations by line (still held at the end of the run)\n")
+                for line, size, count in allocations:
+                    f.write(f"  {size / 1024:>10,.1f} KiB {count:>8} blocks  {line}\n")
+
+    def _allocations(self) -> list:
+        """
+        Returns [(file:line, bytes, blocks)] of the lines whose allocations
+        grew most since the profiler started.
+        """
+        if self._snapshot is None:
+            return []
+        # Leave out the profilers' own bookkeeping
+        ignored = (tracemalloc.__file__, cProfile.__file__, pstats.__file__, __file__)
+        allocations = []
+        for diff in tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno"):
+            frame = diff.traceback[0]
+            if diff.size_diff <= 0 or frame.filename in ignored:
+                continue
+            allocations.append((f"{frame.filename}:{frame.lineno}", diff.size_diff, diff.count_diff))
+            if len(allocations) == self.top_allocations:
+                break
+        return allocations
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
@@ -1,6 +1,18 @@
 from pathlib import Path
 
+def format_ics_index_line(company: str, property_name: str, public_url: str) -> str:
+    return f"{company} | {property_name} | {public_url}\n"
+
 def append_ics_index(company: str, property_name: str, public_url: str, output_path="ics_index.txt"):
-    line = f"{company} | {property_name} | {public_url}\n"
+    line = format_ics_index_line(company, property_name, public_url)
     with open(output_path, "a") as f:
         f.write(line)
+
+def write_ics_index(entries, output_path="ics_index.txt") -> str:
+    """
+    Writes the whole index in one go from (company, property_name, public_url)
+    entries and returns its text.
+    """
+    text = "".join(format_ics_index_line(*entry) for entry in entries)
+    Path(output_path).write_text(text)
+    return text